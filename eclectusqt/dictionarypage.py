@@ -45,6 +45,7 @@ from eclectusqt import util
 
 from libeclectus.dictionaryview import DictionaryView
 from libeclectus.util import encodeBase64, decodeBase64, getCJKScriptClass
+from libeclectus.util import decodePageKey
 from libeclectus.dictionary import (getDictionaryLanguage,
     getDictionaryCompatibleLanguages)
 
@@ -224,6 +225,20 @@ class DictionaryPage(QWebView):
         ('ja', 'Kana'): [u'東京', u'とうきょう']}
     """Examples for the help page."""
 
+    PREWARM_HEADWORD_COUNT = 200
+    """Number of frequent headwords rendered in advance while idle."""
+
+    PREFETCH_LINK_COUNT = 10
+    """Maximum number of linked pages prefetched for a rendered page."""
+
+    PREFETCH_FULL_PAGE_COUNT = 3
+    """Number of linked pages prefetched with all their sections."""
+
+    PREFETCH_SECTIONS = ['getGeneralCharacterSection',
+        'getMiniGeneralCharacterSection', 'getGeneralWordSection',
+        'getMiniGeneralWordSection', 'getMeaningSection']
+    """Cheap sections prefetched first for linked pages."""
+
     WELCOME_PAGE = 'about:help'
 
     WELCOME_TEXT = {'ja': u'ようこそ', 'ko': u'환영합니다', 'zh-cmn-Hans': u'欢迎',
@@ -260,6 +275,9 @@ function _go() { }
         self.findHistory = []
         self.startPage = 'welcome'
         currentString = self.WELCOME_PAGE
+        self.prewarmCount = self.PREWARM_HEADWORD_COUNT
+        self.prewarmHeadwords = []
+        self.prefetchLinks = True
 
         if self.pluginConfig:
             dictionaryViewSettings = DictionaryView.readSettings(
@@ -277,6 +295,11 @@ function _go() { }
             if findHistory:
                 self.findHistory = findHistory.split(',')
 
+            self.prewarmCount = util.readConfigInt(self.pluginConfig,
+                "Dictionary prewarm count", self.PREWARM_HEADWORD_COUNT)
+            self.prefetchLinks = util.readConfigString(self.pluginConfig,
+                "Dictionary prefetch links", 'True') == 'True'
+
             self.startPage = util.readConfigString(self.pluginConfig,
                 "Dictionary start page", "welcome")
             if self.startPage == 'last':
@@ -317,6 +340,9 @@ function _go() { }
         self.sectionContentVisible \
             = self.DEFAULT_SECTION_CONTENT_VISIBILITY.copy()
         self.currentJobs = []
+        self.morePages = {}
+        self.prefetchJobs = []
+        self.prefetchPending = False
         self.scrollValues = {}
         self.mediaObject = None
         self.findDialog = None
@@ -367,6 +393,36 @@ function _go() { }
 
         self.emit(SIGNAL("settingsChanged()"))
 
+        # cache got cleared, render frequent pages again
+        self.prewarm()
+
+    def prewarm(self):
+        """
+        Renders the pages of the most frequent headwords and of the given
+        vocabulary in the background, so that a first lookup can be answered
+        from the cache. Low priority jobs make way for any user request.
+        """
+        self._enqueueBackgroundPages(self.prewarmHeadwords)
+        if self.prewarmCount > 0:
+            self.renderThread.enqueueBackground(DictionaryView,
+                'getFrequentHeadwords', limit=self.prewarmCount)
+
+    def setPrewarmHeadwords(self, headwords):
+        """Sets headwords, e.g. the user's vocabulary, to render in advance."""
+        self.prewarmHeadwords = headwords
+        self._enqueueBackgroundPages(self.prewarmHeadwords)
+
+    def _enqueueBackgroundPages(self, headwords):
+        for headword in headwords:
+            pageType, value = self.getPageName(headword).split(':', 1)
+            if pageType not in ('character', 'word') \
+                or not self.isValidPageType(pageType):
+                continue
+            for method, visible in self._getSections(pageType):
+                if visible:
+                    self.renderThread.enqueueBackground(DictionaryView,
+                        method, value)
+
     def settings(self):
         settings = {}
         for attr in 'language', 'characterDomain', 'dictionary', 'reading':
@@ -882,6 +938,19 @@ function _go() { }
             self.emit(
                 SIGNAL("vocabularyAdded(const QString &, const QString &, const QString &, const QString &)"),
                 headword, reading, translation, audio)
+        elif cmd.startswith('more'):
+            params = re.match('more\(([^\)]+)\)', cmd).group(1)
+            method, value, key = params.split(';')
+            value = decodeBase64(value)
+
+            # append the next page of a paged section
+            pageKeys = self.morePages.setdefault((method, value), [])
+            if key not in pageKeys:
+                pageKeys.append(key)
+                self.scrollValues[self.history.current()] \
+                    = self.page().mainFrame().scrollBarValue(Qt.Vertical)
+                self.renderThread.enqueue(DictionaryView, method, value,
+                    decodePageKey(key))
         elif cmd.startswith('http://'):
             #os.spawnlp(os.P_NOWAIT, 'xdg-open', 'xdg-open', cmd)
             QDesktopServices.openUrl(url)
@@ -1136,6 +1205,9 @@ function _go() { }
         assert type(pageName) in [type(u''), type('')]
         pageType, value = pageName.split(':', 1)
 
+        # user navigated, drop guesses for the last page
+        self.cancelPrefetch()
+
         if pageType == 'about':
             if value == 'help':
                 self.setHtml(self.getHelpPage(), QUrl('file:///'))
@@ -1155,27 +1227,120 @@ function _go() { }
         self._backwardAction.setEnabled(self.history.canGoBack())
         self.emit(SIGNAL('pageChanged(const QString &)'), pageName)
 
-    def requestSections(self, pageType, value):
+    def _getSections(self, pageType):
+        """
+        Gets the sections shown for the given page type together with a flag
+        telling if the section's content is visible and needs rendering.
+        """
         if self.miniMode:
             sections = self.DEFAULT_MINI_VIEW_SECTIONS[pageType]
         else:
             sections = self.DEFAULT_VIEW_SECTIONS[pageType]
 
-        self.currentJobs = []
+        sectionList = []
         for method in sections:
             if ((not self.dictionary.startswith('PSEUDO_')
                 or not DictionaryView.needsDictionary(method))
                 and method not in self.hiddenSections):
 
-                if (method not in self.sectionContentVisible
-                    or self.sectionContentVisible[method]):
-                    # render only if visible
-                    self.renderThread.enqueue(DictionaryView, method, value)
-                    self.currentJobs.append((method, value))
-                else:
-                    self.currentJobs.append((method, None))
+                visible = (method not in self.sectionContentVisible
+                    or self.sectionContentVisible[method])
+                sectionList.append((method, visible))
 
+        return sectionList
+
+    def requestSections(self, pageType, value):
+        self.currentJobs = []
+        for method, visible in self._getSections(pageType):
+            if visible:
+                # render only if visible
+                self.renderThread.enqueue(DictionaryView, method, value)
+                self.currentJobs.append((method, value))
+            else:
+                self.currentJobs.append((method, None))
+
+        # keep additional pages of sections still shown
+        for methodValue in self.morePages.keys():
+            if methodValue not in self.currentJobs:
+                del self.morePages[methodValue]
+
+        self.prefetchPending = self.prefetchLinks
         self.setHtml(self.renderPage())
+        self._checkPrefetch()
+
+    def _checkPrefetch(self):
+        """Starts prefetching once all sections of the page are rendered."""
+        if not self.prefetchPending:
+            return
+
+        for method, value in self.currentJobs:
+            if value != None and not self.renderThread.hasCachedContent(
+                DictionaryView, method, value):
+                return
+
+        self.prefetchPending = False
+        self.prefetchLinkedPages()
+
+    def prefetchLinkedPages(self):
+        """
+        Speculatively renders pages linked from the current page with lowest
+        priority. Cheap sections of all linked pages are rendered first, then
+        the full content of the first pages.
+        """
+        currentPage = self.history.current()
+        pageNames = []
+        for method, value in self.currentJobs:
+            if value == None:
+                continue
+            content = self.renderThread.getCachedContent(DictionaryView,
+                method, value)
+            for link in re.findall('#lookup\(([^\)]+)\)', unicode(content)):
+                pageName = self.getPageName(decodeBase64(link))
+                if pageName != currentPage and pageName not in pageNames:
+                    pageNames.append(pageName)
+
+        pageSections = []
+        for pageName in pageNames[:self.PREFETCH_LINK_COUNT]:
+            pageType, value = pageName.split(':', 1)
+            if pageType not in ('character', 'word') \
+                or not self.isValidPageType(pageType):
+                continue
+            sections = [method for method, visible
+                in self._getSections(pageType) if visible]
+            pageSections.append((value, sections))
+
+        requests = []
+        for value, sections in pageSections:
+            requests.extend([(method, value) for method in sections
+                if method in self.PREFETCH_SECTIONS])
+        for value, sections in pageSections[:self.PREFETCH_FULL_PAGE_COUNT]:
+            requests.extend([(method, value) for method in sections
+                if method not in self.PREFETCH_SECTIONS])
+
+        jobIds = []
+        prefetchJobs = []
+        for method, value in requests:
+            # jobs already queued, e.g. for pre-rendering, are not ours to
+            #   cancel
+            queuedJobId = self.renderThread.getBackgroundJob(DictionaryView,
+                method, value)
+            jobId = self.renderThread.enqueueBackground(DictionaryView, method,
+                value)
+            if jobId != None:
+                jobIds.append(jobId)
+                if jobId != queuedJobId:
+                    prefetchJobs.append(jobId)
+
+        # guesses for the current page go before pre-rendering
+        self.renderThread.prioritizeBackground(jobIds)
+        self.prefetchJobs = prefetchJobs
+
+    def cancelPrefetch(self):
+        """Removes all prefetch jobs not yet rendered."""
+        self.prefetchPending = False
+        if self.prefetchJobs:
+            self.renderThread.dequeueBackground(self.prefetchJobs)
+        self.prefetchJobs = []
 
     def isValidPageType(self, pageType):
         if self.miniMode:
@@ -1244,7 +1409,8 @@ function _go() { }
                     value):
                     content = self.renderThread.getCachedContent(
                         DictionaryView, method, value)
-                    htmlList.append(unicode(content))
+                    htmlList.append(self._getPagedContent(method, value,
+                        unicode(content)))
 
         return '<html><head><title>Dictionary</title>' \
             + '<link rel="StyleSheet" href="file://%s" type="text/css" />' \
@@ -1253,6 +1419,25 @@ function _go() { }
             + '<body class="dictionary">%s</body>' % '\n'.join(htmlList) \
             + '</html>'
 
+    def _getPagedContent(self, method, value, content):
+        """
+        Appends all additional pages requested for the given section. The link
+        to a page is replaced by the page once it is rendered.
+        """
+        contentList = [content]
+        for key in self.morePages.get((method, value), []):
+            if not self.renderThread.hasCachedContent(DictionaryView, method,
+                value, decodePageKey(key)):
+                break
+            contentList[-1] = re.sub(
+                '<a class="meta more" href="#more\(%s;[^;]*;%s\)">[^<]*</a>' \
+                    % (re.escape(method), re.escape(key)),
+                '', contentList[-1])
+            contentList.append(unicode(self.renderThread.getCachedContent(
+                DictionaryView, method, value, decodePageKey(key))))
+
+        return '\n'.join(contentList)
+
     def constructHeading(self, tag, text):
         return '<a class="headingLink" href="#toggleVisibility(' + tag + ')">' \
             + '<h2>' + text + '</h2></a>'
@@ -1271,6 +1456,10 @@ function _go() { }
 
             self.pluginConfig.writeEntry("Dictionary start page",
                 self.startPage)
+            self.pluginConfig.writeEntry("Dictionary prewarm count",
+                str(self.prewarmCount))
+            self.pluginConfig.writeEntry("Dictionary prefetch links",
+                str(self.prefetchLinks))
             if self.startPage == 'last':
                 self.pluginConfig.writeEntry("Dictionary last page",
                     unicode(self.history.current()))
@@ -1297,6 +1486,10 @@ function _go() { }
         if classObject == DictionaryView \
             and args and (method, args[0]) in self.currentJobs:
             self.setHtml(self.renderPage())
+            self._checkPrefetch()
+        elif classObject == DictionaryView \
+            and method == 'getFrequentHeadwords':
+            self._enqueueBackgroundPages(content)
         elif classObject == DictionaryView \
             and method == 'getRandomDictionaryEntry':
             if content and self.title() == 'One word a day':
@@ -176,6 +176,11 @@ class MainWindow(KXmlGuiWindow):
 
             self.plugins.append(page)
 
+        # render the user's vocabulary in advance
+        if self.vocabularyPlugin != None:
+            self.dictionaryPage.setPrewarmHeadwords(
+                self.plugins[self.vocabularyPlugin].getVocabularyHeadwords())
+
         self.splitterFrame.setVisible(False)
         self.setCentralWidget(QLabel(i18n('Installing basic tables...')))
 
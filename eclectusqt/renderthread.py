@@ -49,6 +49,9 @@ class RenderThread(QThread):
                                               #   lock on the latter can be hold
         self.queueHasJobsCondition = QWaitCondition()
         self.renderQueue = []                 # contains all render requests
+        self.backgroundQueue = []             # low priority requests, only
+                                              #   rendered if renderQueue is
+                                              #   empty
         self.newestId = 0                     # newest job Id
 
         self.renderingLock = QMutex(QMutex.Recursive)
@@ -57,6 +60,7 @@ class RenderThread(QThread):
                                               #   lock on the latter can be hold
         self.renderingFinishedCondition = QWaitCondition()
         self.currentlyRenderingJob = None
+        self.renderingBackgroundJob = False
 
     def quit(self):
         self.dequeueAll()
@@ -123,7 +127,8 @@ class RenderThread(QThread):
         """
         Removes the given object's instance from the render thread, removing all
         affiliated jobs from the queue and canceling an eventually current
-        rendered method.
+        rendered method. The instance's C{close()} method is called if
+        available.
         """
         self.classObjectLock.lock()
         self.queueHasJobsLock.lock()
@@ -139,6 +144,9 @@ class RenderThread(QThread):
 
         self.renderQueue = newQueue
 
+        self.backgroundQueue = [entry for entry in self.backgroundQueue
+            if entry[1] != classObject]
+
         # interrupt currently rendering
         self.renderingLock.lock()
         if self.currentlyRenderingJob:
@@ -148,12 +156,16 @@ class RenderThread(QThread):
         self.renderingLock.unlock()
 
         del self.classParamDict[classObject]
-        del self.classInstanceDict[classObject]
+        instance = self.classInstanceDict.pop(classObject)
 
         self.queueHasJobsLock.unlock()
         self.queueLock.unlock()
         self.classObjectLock.unlock()
 
+        # release resources held by the instance, e.g. threads
+        if hasattr(instance, 'close'):
+            instance.close()
+
     def enqueue(self, classObject, method, *args, **param):
         self.classObjectLock.lock()
         if classObject and classObject not in self.classParamDict:
@@ -168,6 +180,15 @@ class RenderThread(QThread):
         jobId = self.newestId
         self.renderQueue.append((jobId, classObject, method, args, param))
 
+        # make a low priority job yield to the new one, it will be rendered
+        #   again later
+        self.renderingLock.lock()
+        if self.currentlyRenderingJob and self.renderingBackgroundJob:
+            backgroundJob = self.currentlyRenderingJob
+            if self.cancelCurrentJob():
+                self.backgroundQueue.insert(0, backgroundJob)
+        self.renderingLock.unlock()
+
         self.queueLock.unlock()
 
         self.queueHasJobsCondition.wakeAll()
@@ -178,6 +199,34 @@ class RenderThread(QThread):
             self.emit(SIGNAL("jobEnqueued"), jobId)
             return jobId
 
+    def enqueueBackground(self, classObject, method, *args, **param):
+        """
+        Enqueues a job with low priority. Background jobs are only rendered
+        once no other job is waiting and get canceled as soon as a new job is
+        enqueued. No signal is emitted for enqueueing, so that busy indicators
+        stay untouched.
+        """
+        self.classObjectLock.lock()
+        if classObject not in self.classParamDict:
+            self.classObjectLock.unlock()
+            raise Exception("Object not set")
+
+        self.queueHasJobsLock.lock()
+        self.queueLock.lock()
+
+        self.newestId = (self.newestId + 1) % sys.maxint
+
+        jobId = self.newestId
+        self.backgroundQueue.append((jobId, classObject, method, args, param))
+
+        self.queueLock.unlock()
+
+        self.queueHasJobsCondition.wakeAll()
+        self.queueHasJobsLock.unlock()
+        self.classObjectLock.unlock()
+
+        return jobId
+
     def enqueueWait(self, classObject, method, *args, **param):
         """Enqueues a job and waits until it finishes."""
         def inQueue(jobId):
@@ -253,6 +302,9 @@ class RenderThread(QThread):
 
         self.renderQueue = newQueue
 
+        self.backgroundQueue = [entry for entry in self.backgroundQueue
+            if classObject != entry[1] or method != entry[2]]
+
         # interrupt currently rendering
         self.renderingLock.lock()
         if self.currentlyRenderingJob:
@@ -272,6 +324,7 @@ class RenderThread(QThread):
             self.emit(SIGNAL("jobDequeued"), jobId)
 
         self.renderQueue = []
+        self.backgroundQueue = []
 
         # interrupt currently rendering
         self.renderingLock.lock()
@@ -282,11 +335,57 @@ class RenderThread(QThread):
         self.queueLock.unlock()
         self.queueHasJobsLock.unlock()
 
+    def dequeueBackground(self, jobIds=None):
+        """
+        Removes low priority jobs from the queue and cancels the current job
+        if it is one of them.
+
+        @type jobIds: list of int
+        @param jobIds: ids of jobs to remove, if C{None} all low priority jobs
+            are removed
+        """
+        self.queueHasJobsLock.lock()
+        self.queueLock.lock()
+
+        if jobIds == None:
+            self.backgroundQueue = []
+        else:
+            self.backgroundQueue = [entry for entry in self.backgroundQueue
+                if entry[0] not in jobIds]
+
+        # interrupt currently rendering
+        self.renderingLock.lock()
+        if self.currentlyRenderingJob and self.renderingBackgroundJob \
+            and (jobIds == None or self.currentlyRenderingJob[0] in jobIds):
+            self.cancelCurrentJob()
+
+        self.renderingLock.unlock()
+        self.queueLock.unlock()
+        self.queueHasJobsLock.unlock()
+
+    def prioritizeBackground(self, jobIds):
+        """
+        Moves the given low priority jobs to the front of the background
+        queue keeping their order.
+
+        @type jobIds: list of int
+        @param jobIds: ids of jobs to render before other low priority jobs
+        """
+        self.queueLock.lock()
+        entryLookup = dict((entry[0], entry) for entry in self.backgroundQueue)
+        prioritized = [entryLookup[jobId] for jobId in jobIds
+            if jobId in entryLookup]
+        self.backgroundQueue = prioritized + [entry for entry
+            in self.backgroundQueue if entry[0] not in jobIds]
+        self.queueLock.unlock()
+
     def isRendering(self):
+        """Checks if jobs are pending, ignoring those of low priority."""
         self.queueLock.lock()
         self.renderingLock.lock()
         rendering = len(self.renderQueue) > 0 \
-            or self.currentlyRenderingJob != None
+            or (self.currentlyRenderingJob != None
+                and not self.renderingBackgroundJob)
         self.renderingLock.unlock()
         self.queueLock.unlock()
         return rendering
@@ -307,21 +406,41 @@ class RenderThread(QThread):
         """
         self.renderingLock.lock()
         self.currentlyRenderingJob = None
+        self.renderingBackgroundJob = False
         self.renderingLock.unlock()
 
+    def hasRenderedContent(self, classObject, method, args, param):
+        """
+        Checks if the result of the given job is already available. Low
+        priority jobs are skipped in this case. The default implementation
+        keeps no results and returns False.
+        """
+        return False
+
     def run(self):
+        queueEmptySignaled = False
         while True:
             self.queueHasJobsLock.lock()
 
             hasJobWaiting = len(self.renderQueue) > 0
-            while not hasJobWaiting:
+            if not hasJobWaiting and not queueEmptySignaled:
+                # background jobs don't count as work for the user
                 self.emit(SIGNAL("queueEmpty"))
+                queueEmptySignaled = True
+            while not hasJobWaiting and not self.backgroundQueue:
                 self.queueHasJobsCondition.wait(self.queueHasJobsLock)
                 hasJobWaiting = len(self.renderQueue) > 0
 
             self.queueLock.lock()
             self.renderingLock.lock()
-            self.currentlyRenderingJob = self.renderQueue.pop(0)
+            if hasJobWaiting:
+                self.currentlyRenderingJob = self.renderQueue.pop(0)
+                self.renderingBackgroundJob = False
+                queueEmptySignaled = False
+            else:
+                self.currentlyRenderingJob = self.backgroundQueue.pop(0)
+                self.renderingBackgroundJob = True
+            isBackgroundJob = self.renderingBackgroundJob
             jobId, entryClassObject, method, args, param \
                 = self.currentlyRenderingJob
 
@@ -329,7 +448,11 @@ class RenderThread(QThread):
             self.queueLock.unlock()
             self.queueHasJobsLock.unlock()
 
-            if entryClassObject != None:
+            if isBackgroundJob and self.hasRenderedContent(entryClassObject,
+                method, args, param):
+                # already rendered on request of the user
+                pass
+            elif entryClassObject != None:
                 if method == '__init__':
                     classInstance = entryClassObject(*args, **param)
                     self.classInstanceDict[entryClassObject] = classInstance
@@ -474,6 +597,9 @@ class CachedRenderThread(RenderThread):
         self.cacheLock.unlock()
         return hasContent
 
+    def hasRenderedContent(self, classObject, method, args, param):
+        return self.hasCachedContent(classObject, method, *args, **param)
+
     def getCachedContent(self, classObject, method, *args, **param):
         """
         Gets the cached content for the given request, returns None if None.
@@ -542,6 +668,44 @@ class CachedRenderThread(RenderThread):
 
         return RenderThread.enqueue(self, classObject, method, *args, **param)
 
+    def getBackgroundJob(self, classObject, method, *args, **param):
+        """
+        Returns the id of the low priority job queued for the given request,
+        None if no such job is queued.
+        """
+        request = (classObject, method,
+            CachedRenderThread._getHashableCopy(args),
+            CachedRenderThread._getHashableCopy(param))
+        self.queueLock.lock()
+        queuedJobId = None
+        for jobId, entryClassObject, entryMethod, entryArgs, entryParam \
+            in self.backgroundQueue:
+            if request == (entryClassObject, entryMethod,
+                CachedRenderThread._getHashableCopy(entryArgs),
+                CachedRenderThread._getHashableCopy(entryParam)):
+                queuedJobId = jobId
+                break
+        self.queueLock.unlock()
+
+        return queuedJobId
+
+    def enqueueBackground(self, classObject, method, *args, **param):
+        """
+        Enqueues a low priority job, e.g. to fill the cache in advance.
+        Returns None if the content is already cached and the id of the
+        existing job if the same request is already queued.
+        """
+        if self.hasCachedContent(classObject, method, *args, **param):
+            return
+
+        queuedJobId = self.getBackgroundJob(classObject, method, *args,
+            **param)
+        if queuedJobId != None:
+            return queuedJobId
+
+        return RenderThread.enqueueBackground(self, classObject, method,
+            *args, **param)
+
     def finishJob(self, jobId, classObject, method, args, param, content):
         if method != '__init__':
             self.cacheLock.lock()
@@ -611,6 +775,22 @@ class SQLRenderThread(CachedRenderThread):
         self.dbObject[classObject] = db
         self.dbObjectLock.unlock()
 
+    def reloadDatabaseObjects(self):
+        """
+        Reloads all objects with database access, e.g. after the database was
+        replaced.
+        """
+        self.classObjectLock.lock()
+        self.dbObjectLock.lock()
+        classObjects = [classObject for classObject, classObjectInst \
+            in self.classInstanceDict.items() \
+            if classObject in self.dbObject or hasattr(classObjectInst, 'db')]
+        self.dbObjectLock.unlock()
+
+        for classObject in classObjects:
+            self.reloadObject(classObject)
+        self.classObjectLock.unlock()
+
     def cancelCurrentJob(self):
         QMutexLocker(self.renderingLock)
         if self.currentlyRenderingJob:
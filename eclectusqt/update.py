@@ -26,12 +26,13 @@ import codecs
 import urlparse
 import sys
 import os
+import Queue
 from datetime import date, time, datetime
 
 from sqlalchemy import select
 from sqlalchemy.exceptions import OperationalError
 
-from PyQt4.QtCore import Qt, SIGNAL
+from PyQt4.QtCore import Qt, SIGNAL, QObject
 from PyQt4.QtGui import QWidget, QApplication, QCursor
 
 from PyKDE4.kdecore import ki18n, i18n, KTemporaryFile, KUrl
@@ -39,15 +40,16 @@ from PyKDE4.kio import KIO
 from PyKDE4.kdeui import KIcon, KMessageBox, KStandardGuiItem, KDialog
 from PyKDE4.kdeui import KAction, KActionCollection
 
-from cjklib import build
 from cjklib.dbconnector import getDBConnector
 
 from eclectusqt import util
+from eclectusqt import renderthread
 from eclectusqt.forms import UpdateUI
 
 from libeclectus.buildtables import EclectusCommandLineBuilder
+from libeclectus.buildtables import ShadowDatabaseBuilder
 from libeclectus.dictionary import getAvailableDictionaryNames
-from libeclectus.util import getDatabaseConfiguration
+from libeclectus.util import getDatabaseConfiguration, resetDatabaseConnector
 
 class DictionaryInfo(object):
     def __init__(self, dbConnectInst=None, databaseUrl=None):
@@ -88,23 +90,34 @@ class UpdateDialog(KDialog):
         self.renderThread.setObject(DictionaryInfo,
             databaseUrl=self.databaseUrl)
 
+        # build in a separate thread, lookups are served meanwhile from the
+        #   current database
+        self.buildThread = renderthread.SQLRenderThread(
+            QApplication.instance())
+        self.connect(QApplication.instance(), SIGNAL("aboutToQuit()"),
+            self.buildThread.quit)
+        self.buildThread.start()
+
         self.setCaption(i18n("Install/Update Dictionaries"))
         self.setButtons(KDialog.ButtonCode(KDialog.Close))
         self.enableButton(KDialog.Cancel, False)
 
         # TODO can we defer the creation of the update widget until the dialog is shown?
-        self.updateWidget = UpdateWidget(mainWindow, renderThread, pluginConfig)
+        self.updateWidget = UpdateWidget(mainWindow, renderThread,
+            self.buildThread, pluginConfig)
         self.connect(self.updateWidget, SIGNAL("working(bool)"),
             self.slotUpdateWorking)
+        self.connect(self.updateWidget, SIGNAL("databaseChanged()"),
+            self.slotDatabaseChanged)
         self.setMainWidget(self.updateWidget)
 
         self.connect(self, SIGNAL("finished()"), self.slotFinish)
 
         self.initialised = False
 
-        self.connect(self.renderThread, SIGNAL("jobFinished"),
+        self.connect(self.buildThread, SIGNAL("jobFinished"),
             self.contentRendered)
-        self.connect(self.renderThread, SIGNAL("jobErrorneous"),
+        self.connect(self.buildThread, SIGNAL("jobErrorneous"),
             self.renderingFailed)
 
         self.actionCollection = KActionCollection(self)
@@ -153,13 +166,21 @@ class UpdateDialog(KDialog):
         else:
             self.setButtons(KDialog.ButtonCode(KDialog.Close))
 
+    def slotDatabaseChanged(self):
+        # database file was replaced, reopen connections before anyone else
+        #   gets notified
+        resetDatabaseConnector()
+        self.renderThread.reloadDatabaseObjects()
+
+        self.emit(SIGNAL("databaseChanged()"))
+
     def slotFinish(self):
         if self.updateWidget.isWorking():
             self.updateWidget.cancel()
 
     def slotOptimiseDatabase(self):
         self.loadDatabaseBuilder()
-        dbBuild = self.renderThread.getObjectInstance(build.DatabaseBuilder)
+        dbBuild = self.buildThread.getObjectInstance(ShadowDatabaseBuilder)
         if dbBuild.isOptimizable():
             if KMessageBox.warningContinueCancel(self,
                 i18n("This operation might take some time."),
@@ -167,25 +188,23 @@ class UpdateDialog(KDialog):
                 KStandardGuiItem.cancel(), 'database_optimise') \
                     == KMessageBox.Continue:
                 QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
-                self.currentJob = self.renderThread.enqueue(
-                    build.DatabaseBuilder, 'optimize')
+                self.currentJob = self.buildThread.enqueue(
+                    ShadowDatabaseBuilder, 'optimize')
 
     def loadDatabaseBuilder(self):
-        if not self.renderThread.hasObject(build.DatabaseBuilder):
+        if not self.buildThread.hasObject(ShadowDatabaseBuilder):
             options = EclectusCommandLineBuilder.getDefaultOptions()
 
-            db = getDBConnector(getDatabaseConfiguration(self.databaseUrl))
-
-            self.renderThread.setObject(build.DatabaseBuilder, dbConnectInst=db,
-                **options)
+            self.buildThread.setObject(ShadowDatabaseBuilder,
+                databaseUrl=self.databaseUrl, **options)
 
     def contentRendered(self, id, classObject, method, args, param, content):
-        if classObject == build.DatabaseBuilder and method == 'optimize':
+        if classObject == ShadowDatabaseBuilder and method == 'optimize':
             QApplication.restoreOverrideCursor()
 
     def renderingFailed(self, id, classObject, method, args, param, e,
             stacktrace):
-        if classObject == build.DatabaseBuilder and method == 'optimize':
+        if classObject == ShadowDatabaseBuilder and method == 'optimize':
             print >>sys.stderr, stacktrace
             QApplication.restoreOverrideCursor()
 
@@ -197,10 +216,12 @@ class UpdateWidget(QWidget, UpdateUI.Ui_Form):
         'CFDICT': ki18n('French-Chinese (CFDICT)'),
         'EDICT': ki18n('English-Japanese (EDICT)')}
 
-    def __init__(self, mainWindow, renderThread, pluginConfig=None):
+    def __init__(self, mainWindow, renderThread, buildThread,
+        pluginConfig=None):
         QWidget.__init__(self, mainWindow)
 
         self.renderThread = renderThread
+        self.buildThread = buildThread
         # set up UI
         self.setupUi(self)
 
@@ -238,17 +259,18 @@ class UpdateWidget(QWidget, UpdateUI.Ui_Form):
         self.working = False
         self.currentJob = None
 
-        self.connect(self.renderThread, SIGNAL("jobFinished"),
-            self.contentRendered)
-        self.connect(self.renderThread, SIGNAL("jobErrorneous"),
-            self.renderingFailed)
+        for thread in (self.renderThread, self.buildThread):
+            self.connect(thread, SIGNAL("jobFinished"), self.contentRendered)
+            self.connect(thread, SIGNAL("jobErrorneous"), self.renderingFailed)
 
     def setup(self):
         self.renderThread.enqueue(DictionaryInfo, 'getDictionaryVersions')
 
     def cancel(self):
         if self.currentJob:
-            self.renderThread.dequeue(self.currentJob)
+            # a build reading from a download blocks until data arrives
+            self.getDownloader(self.currentDictionary).cancel()
+            self.buildThread.dequeue(self.currentJob)
 
     def getDownloader(self, dictionaryName):
         if dictionaryName not in self.downloader:
@@ -317,15 +339,26 @@ class UpdateWidget(QWidget, UpdateUI.Ui_Form):
         self.installButton.setEnabled(False)
         self.setWorking(True)
 
-        filePath, fileType = downloader.download()
+        dbBuild = self.buildThread.getObjectInstance(ShadowDatabaseBuilder)
+        builderClass = dbBuild.getTableBuilder(self.currentDictionary)
+        if 'fileOpener' in builderClass.getDefaultOptions():
+            # reset an earlier cancelled transfer
+            downloader.cleanUp()
+            # entries are parsed while the download is running
+            dbBuild.setBuilderOptions(builderClass, {'filePath': None,
+                'fileOpener': downloader.openStream,
+                'fileType': downloader.getFileType()})
+            filePath = link
+        else:
+            filePath, fileType = downloader.download()
+            if filePath:
+                dbBuild.setBuilderOptions(builderClass,
+                    {'filePath': unicode(filePath),
+                        'fileType': unicode(fileType)})
+
         if filePath:
             self.statusLabel.setText(i18n('Installing...', link))
 
-            dbBuild = self.renderThread.getObjectInstance(build.DatabaseBuilder)
-            builderClass = dbBuild.getTableBuilder(self.currentDictionary)
-            dbBuild.setBuilderOptions(builderClass, 
-                {'filePath': unicode(filePath), 'fileType': unicode(fileType)})
-
             tables = [self.currentDictionary]
 
             # look for related tables and install them, too
@@ -337,8 +370,9 @@ class UpdateWidget(QWidget, UpdateUI.Ui_Form):
             # TODO if for the first time a new language is installed check if
             #  tables in BUILD_GROUPS (zh-cmn, ja) need to be installed
 
-            self.currentJob = self.renderThread.enqueue(build.DatabaseBuilder,
-                'build', tables)
+            # existing dictionaries are updated with only the changed entries
+            self.currentJob = self.buildThread.enqueue(
+                ShadowDatabaseBuilder, 'update', tables)
         else:
             self.statusLabel.setText(i18n('Error downloading from "%1": "%2"',
                 link, downloader.lastError))
@@ -354,8 +388,17 @@ class UpdateWidget(QWidget, UpdateUI.Ui_Form):
         self.installButton.setEnabled(False)
         self.setWorking(True)
 
-        self.currentJob = self.renderThread.enqueue(build.DatabaseBuilder,
-            'remove', [self.currentDictionary])
+        tables = [self.currentDictionary]
+        # lookup tables built only from the dictionary are removed with it
+        dbBuild = self.buildThread.getObjectInstance(ShadowDatabaseBuilder)
+        for table in dbBuild.getRebuiltDependingTables(
+            [self.currentDictionary]):
+            if dbBuild.getTableBuilder(table).DEPENDS \
+                == [self.currentDictionary]:
+                tables.append(table)
+
+        self.currentJob = self.buildThread.enqueue(
+            ShadowDatabaseBuilder, 'remove', tables)
 
     def setWorking(self, working):
         if self.working != working:
@@ -478,11 +521,12 @@ class UpdateWidget(QWidget, UpdateUI.Ui_Form):
         if classObject == DictionaryInfo and method == 'getDictionaryVersions':
             self.setDictionaryVersions(content)
 
-        elif classObject == build.DatabaseBuilder and method == 'build':
+        elif classObject == ShadowDatabaseBuilder \
+            and method in ('build', 'update'):
             self.emit(SIGNAL("databaseChanged()"))
 
             self.installFinished(True)
-        elif classObject == build.DatabaseBuilder and method == 'remove':
+        elif classObject == ShadowDatabaseBuilder and method == 'remove':
             self.emit(SIGNAL("databaseChanged()"))
 
             # update menu
@@ -490,14 +534,116 @@ class UpdateWidget(QWidget, UpdateUI.Ui_Form):
 
     def renderingFailed(self, id, classObject, method, args, param, e,
             stacktrace):
-        if classObject == build.DatabaseBuilder \
-            and method == 'build':
+        if classObject == ShadowDatabaseBuilder \
+            and method in ('build', 'update'):
             self.installFinished(False)
-        elif classObject == build.DatabaseBuilder \
+        elif classObject == ShadowDatabaseBuilder \
             and method == 'remove':
             self.removeFinished(False)
 
 
+class KIOStream(QObject):
+    """
+    File-like object reading from a URL through KIO, so the user's proxy and
+    authentication settings apply. Data can be read as soon as it arrives.
+    The transfer runs in the main thread, reading works from any thread.
+    """
+    QUEUE_SIZE = 64
+    """Number of received chunks buffered before the transfer is suspended."""
+
+    def __init__(self, url, parentWidget=None):
+        QObject.__init__(self)
+        self.url = url
+        self.parentWidget = parentWidget
+        self.job = None
+        self.suspended = False
+        self.closed = False
+        self.queue = Queue.Queue()
+        self.buffer = ''
+        self.eof = False
+
+        # KIO jobs need the event loop of the main thread
+        self.moveToThread(QApplication.instance().thread())
+        self.connect(self, SIGNAL("startTransfer()"), self.startTransfer,
+            Qt.QueuedConnection)
+        self.connect(self, SIGNAL("resumeTransfer()"), self.resumeTransfer,
+            Qt.QueuedConnection)
+        self.connect(self, SIGNAL("stopTransfer()"), self.stopTransfer,
+            Qt.QueuedConnection)
+        self.emit(SIGNAL("startTransfer()"))
+
+    def startTransfer(self):
+        if self.closed:
+            return
+        self.job = KIO.get(KUrl(self.url), KIO.NoReload,
+            KIO.HideProgressInfo)
+        if self.parentWidget:
+            # window for authentication dialogs
+            self.job.ui().setWindow(self.parentWidget)
+        self.connect(self.job, SIGNAL("data(KIO::Job *, const QByteArray &)"),
+            self.transferData)
+        self.connect(self.job, SIGNAL("result(KJob *)"), self.transferResult)
+
+    def resumeTransfer(self):
+        if self.job and self.suspended:
+            self.suspended = False
+            self.job.resume()
+
+    def stopTransfer(self):
+        # a killed job doesn't report a result
+        if self.job:
+            self.job.kill()
+            self.job = None
+
+    def transferData(self, job, data):
+        if not data.isEmpty():
+            self.queue.put(str(data))
+        # don't receive faster than the data is read
+        if not self.suspended and self.queue.qsize() >= self.QUEUE_SIZE:
+            self.suspended = True
+            job.suspend()
+
+    def transferResult(self, job):
+        if job.error():
+            self.queue.put(IOError(unicode(job.errorString())))
+        self.queue.put(None)
+        self.job = None
+
+    def read(self, size=-1):
+        while not self.eof and (size < 0 or len(self.buffer) < size):
+            if self.closed:
+                raise IOError("Transfer cancelled")
+
+            data = self.queue.get()
+            if self.suspended and self.queue.qsize() < self.QUEUE_SIZE / 2:
+                self.emit(SIGNAL("resumeTransfer()"))
+
+            if data is None:
+                self.eof = True
+            elif isinstance(data, IOError):
+                self.eof = True
+                raise data
+            else:
+                self.buffer += data
+
+        if size < 0:
+            content, self.buffer = self.buffer, ''
+        else:
+            content, self.buffer = self.buffer[:size], self.buffer[size:]
+        return content
+
+    def close(self):
+        """
+        Stops the transfer. Can be called from any thread, a blocked reader
+        gets an C{IOError}.
+        """
+        if not self.closed:
+            self.closed = True
+            # wake up the reader
+            self.queue.put(IOError("Transfer cancelled"))
+            self.emit(SIGNAL("stopTransfer()"))
+
+
 class DictionaryDownloader:
     DOWNLOADER_NAME = 'default'
     DEFAULT_DOWNLOAD_PAGE = None
@@ -515,6 +661,8 @@ class DictionaryDownloader:
         self.lastError = None
 
         self.temporaryFiles = []
+        self.streams = []
+        self.cancelled = False
 
     def getDownloadPageContent(self):
         if self.downloadPageContent == None:
@@ -573,20 +721,40 @@ class DictionaryDownloader:
             self.parentWidget):
             self.lastError = None
 
-            _, _, onlinePath, _, _ = urlparse.urlsplit(
-                self.getDownloadLink())
-            fileType = None
-            matchObj = re.search('\.(zip|tar|tar\.bz2|tar\.gz|gz|txt)$',
-                onlinePath)
-            if matchObj:
-                fileType = matchObj.group(0)
-
-            return tempFileName, fileType
+            return tempFileName, self.getFileType()
         else:
             self.lastError = unicode(KIO.NetAccess.lastErrorString())
             return None, None
 
+    def getFileType(self):
+        _, _, onlinePath, _, _ = urlparse.urlsplit(self.getDownloadLink())
+        matchObj = re.search('\.(zip|tar|tar\.bz2|tar\.gz|gz|txt)$',
+            onlinePath)
+        if matchObj:
+            return matchObj.group(0)
+
+    def openStream(self):
+        """
+        Opens the dictionary file for reading while it is downloaded. Used by
+        the table builder, the content is parsed as it arrives.
+        """
+        if self.cancelled:
+            raise IOError("Transfer cancelled")
+        stream = KIOStream(self.getDownloadLink(), self.parentWidget)
+        self.streams.append(stream)
+        return stream
+
+    def cancel(self):
+        """Stops all transfers of streams opened and any further ones."""
+        self.cancelled = True
+        for stream in self.streams:
+            stream.close()
+
     def cleanUp(self):
+        while self.streams:
+            self.streams.pop().close()
+        self.cancelled = False
+
         while len(self.temporaryFiles) > 0:
             filePath = self.temporaryFiles.pop()
             if os.path.exists(filePath):
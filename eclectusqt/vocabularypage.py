@@ -552,6 +552,12 @@ class VocabularyPage(QWidget, VocabularyPageUI.Ui_Form):
 
             self.vocabularyChanged = False
 
+    def getVocabularyHeadwords(self):
+        """Returns the headwords of all vocabulary entries."""
+        self.loadVocabulary()
+        return [entry['Headword'] for entry
+            in self.vocabularyModel.getVocabulary() if entry]
+
     def slotDataChanged(self, modelIndexS, modelIndexE):
         self.vocabularyChanged = True
 
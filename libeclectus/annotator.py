@@ -0,0 +1,181 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+u"""
+Annotates whole texts with dictionary entries.
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+
+from itertools import islice
+
+from libeclectus import util
+
+class Annotator(object):
+    """
+    Annotates text with the entries of a dictionary. Text is segmented from
+    left to right, taking the longest headword of the dictionary at each
+    position. Text not covered by any headword forms segments without
+    entries.
+
+    Lines are annotated in batches, looking up the entries for all words of a
+    batch together. Memory use doesn't grow with the length of the input.
+    """
+    BATCH_SIZE = 100
+    """Number of lines annotated together."""
+
+    LOOKUP_SIZE = 128
+    """
+    Maximum number of words looked up in one query. Dictionaries reusing
+    compiled statements only for a smaller number of values lower it, see
+    C{CACHED_STATEMENT_MAX_VALUES}.
+    """
+
+    CACHE_SIZE = 5000
+    """Number of words whose entries are kept between batches."""
+
+    def __init__(self, dictionary, orderBy=None, batchSize=None):
+        """
+        Initialises the Annotator instance and reads the headwords of the
+        given dictionary.
+
+        @param dictionary: dictionary instance
+        @type orderBy: list
+        @param orderBy: order of entries of a word, by default most frequent
+            first
+        @type batchSize: int
+        @param batchSize: number of lines annotated together
+        """
+        if not hasattr(dictionary, 'getForHeadwords'):
+            raise ValueError("Dictionary '%s' doesn't support annotation"
+                % dictionary.PROVIDES)
+
+        self._dictionary = dictionary
+        if orderBy is None:
+            orderBy = ['Weight']
+        self.orderBy = orderBy
+        self.batchSize = batchSize or self.BATCH_SIZE
+        self.lookupSize = min(self.LOOKUP_SIZE, getattr(dictionary,
+            'CACHED_STATEMENT_MAX_VALUES', self.LOOKUP_SIZE))
+
+        self._headwords = dictionary.getHeadwords()
+        if self._headwords:
+            self._maxLength = max([len(headword)
+                for headword in self._headwords])
+        else:
+            self._maxLength = 0
+        self._cache = util.LRUCache(self.CACHE_SIZE)
+
+    def segment(self, text):
+        """
+        Segments the given text into headwords of the dictionary.
+
+        @type text: str
+        @param text: text
+        @rtype: list of tuple
+        @return: pairs of segment and C{True} if it is a headword
+        """
+        segments = []
+        unmatched = []
+        idx = 0
+        while idx < len(text):
+            for length in range(min(self._maxLength, len(text) - idx), 0, -1):
+                if text[idx:idx + length] in self._headwords:
+                    break
+            else:
+                unmatched.append(text[idx])
+                idx += 1
+                continue
+
+            if unmatched:
+                segments.append((''.join(unmatched), False))
+                unmatched = []
+            segments.append((text[idx:idx + length], True))
+            idx += length
+
+        if unmatched:
+            segments.append((''.join(unmatched), False))
+
+        return segments
+
+    def _lookup(self, words):
+        """
+        Gets the entries of the given words, looking up words not cached.
+
+        @type words: set of str
+        @param words: words
+        @rtype: dict
+        @return: entries per word
+        """
+        entries = {}
+        missing = []
+        for word in words:
+            wordEntries = self._cache.get(word)
+            if wordEntries is None:
+                missing.append(word)
+            else:
+                entries[word] = wordEntries
+
+        for idx in range(0, len(missing), self.lookupSize):
+            found = dict([(word, [])
+                for word in missing[idx:idx + self.lookupSize]])
+            for entry in self._dictionary.getForHeadwords(found.keys(),
+                orderBy=self.orderBy):
+                # the headword searched might be the alternative one
+                for headword in set(entry[:2]):
+                    if headword in found:
+                        found[headword].append(entry)
+
+            for word, wordEntries in found.items():
+                self._cache[word] = wordEntries
+            entries.update(found)
+
+        return entries
+
+    def iterAnnotate(self, lines):
+        """
+        Annotates the given lines, reading lines only as needed.
+
+        @param lines: iterable of lines, e.g. a file opened with
+            C{codecs.open()}
+        @return: iterator giving for each line a list of pairs of segment and
+            its entries, text not found in the dictionary has no entries
+        """
+        lines = iter(lines)
+        while True:
+            batch = [self.segment(line)
+                for line in islice(lines, self.batchSize)]
+            if not batch:
+                break
+
+            entries = self._lookup(set([segment for segments in batch
+                for segment, isHeadword in segments if isHeadword]))
+
+            for segments in batch:
+                yield [(segment, isHeadword and entries[segment] or [])
+                    for segment, isHeadword in segments]
+
+    def annotate(self, text):
+        """
+        Annotates the given text.
+
+        @type text: str
+        @param text: text
+        @rtype: list of tuple
+        @return: pairs of segment and its entries
+        """
+        annotation = []
+        for segments in self.iterAnnotate(text.splitlines(True)):
+            annotation.extend(segments)
+        return annotation
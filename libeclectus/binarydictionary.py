@@ -0,0 +1,302 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+u"""
+Compact binary dictionary files, read through a memory map.
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+A file starts with a header giving the magic string, format version, flags,
+entry count and the offsets of all sections. Sections follow in a fixed order:
+    - a string pool with the dictionary version and the column names
+    - a string pool per column, holding the values of all entries
+    - an array of sort weights, empty if the dictionary has no weights
+    - the headword, headword character, plain reading and translation word
+      indexes, each given as a string pool of sorted keys, an array of
+      offsets into the postings and an array of postings (entry ids)
+
+A string pool holds the item count, the offsets of all items and the UTF-8
+encoded items, each prefixed by a byte telling if the item is C{None}. Arrays
+hold the item count and the items. All numbers are stored little-endian.
+"""
+
+import os
+import sys
+import mmap
+import struct
+import bisect
+
+from libeclectus.memorydictionary import MemoryDictionary
+
+MAGIC = 'ECLD'
+"""Magic string at the start of a binary dictionary file."""
+FORMAT_VERSION = 1
+"""Version of the file format."""
+
+_HEADER_FORMAT = '<4sHHII'
+_HAS_WEIGHT = 1
+_HAS_PLAIN_READING = 2
+
+_INDEXES = ['_headwordIndex', '_characterIndex', '_plainReadingIndex',
+    '_wordIndex']
+
+def _getVersionString(dictionary):
+    version = dictionary._getVersion()
+    if version is None:
+        return u''
+    return unicode(version)
+
+# writing
+
+def _packStringPool(strings):
+    offsets = [0]
+    data = []
+    for string in strings:
+        if string is None:
+            item = '\x00'
+        else:
+            item = '\x01' + string.encode('utf8')
+        data.append(item)
+        offsets.append(offsets[-1] + len(item))
+
+    return (struct.pack('<I', len(strings))
+        + struct.pack('<%dI' % len(offsets), *offsets) + ''.join(data))
+
+def _packArray(values, typeCode):
+    return (struct.pack('<I', len(values))
+        + struct.pack('<%d%s' % (len(values), typeCode), *values))
+
+def _packIndex(index):
+    keys = sorted(index.keys())
+    offsets = [0]
+    postings = []
+    for key in keys:
+        postings.extend(index[key])
+        offsets.append(len(postings))
+
+    return [_packStringPool(keys), _packArray(offsets, 'I'),
+        _packArray(postings, 'I')]
+
+def exportDictionary(dictionary, filePath):
+    """
+    Writes the entries and indexes of the given dictionary to a binary
+    dictionary file. The file is written to a temporary path first and then
+    moved, so readers never see a partly written file.
+
+    @param dictionary: dictionary instance, either using the SQL or the
+        memory engine
+    @type filePath: str
+    @param filePath: path of the file to write
+    """
+    if not isinstance(dictionary, MemoryDictionary):
+        dictionary = MemoryDictionary(dictionary)
+
+    sections = [_packStringPool([_getVersionString(dictionary)]
+        + dictionary._columnNames)]
+    sections.extend([_packStringPool(values)
+        for values in dictionary._columns])
+    sections.append(_packArray(dictionary._sortWeights, 'i'))
+    for indexName in _INDEXES:
+        sections.extend(_packIndex(getattr(dictionary, indexName)))
+
+    flags = 0
+    if dictionary._hasWeight:
+        flags |= _HAS_WEIGHT
+    if dictionary._hasPlainReading:
+        flags |= _HAS_PLAIN_READING
+
+    offset = struct.calcsize(_HEADER_FORMAT) + 8 * len(sections)
+    offsets = []
+    for section in sections:
+        offsets.append(offset)
+        offset += len(section)
+
+    tempPath = filePath + '.tmp'
+    f = open(tempPath, 'wb')
+    try:
+        f.write(struct.pack(_HEADER_FORMAT, MAGIC, FORMAT_VERSION, flags,
+            dictionary._count, len(sections)))
+        f.write(struct.pack('<%dQ' % len(offsets), *offsets))
+        for section in sections:
+            f.write(section)
+    finally:
+        f.close()
+    os.rename(tempPath, filePath)
+
+# reading
+
+class _MappedArray(object):
+    """Array of numbers read from a memory map."""
+    def __init__(self, buf, offset, typeCode):
+        self._buf = buf
+        self._count, = struct.unpack_from('<I', buf, offset)
+        self._offset = offset + 4
+        self._typeCode = typeCode
+        self._itemSize = struct.calcsize('<' + typeCode)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += self._count
+        if not 0 <= idx < self._count:
+            raise IndexError('array index out of range')
+        return struct.unpack_from('<' + self._typeCode, self._buf,
+            self._offset + idx * self._itemSize)[0]
+
+    def getRange(self, start, end):
+        """Gets the items from C{start} up to but not including C{end}."""
+        return struct.unpack_from('<%d%s' % (end - start, self._typeCode),
+            self._buf, self._offset + start * self._itemSize)
+
+
+class _MappedStringPool(object):
+    """String pool read from a memory map."""
+    def __init__(self, buf, offset):
+        self._buf = buf
+        self._count, = struct.unpack_from('<I', buf, offset)
+        self._offsetsOffset = offset + 4
+        self._dataOffset = self._offsetsOffset + 4 * (self._count + 1)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += self._count
+        if not 0 <= idx < self._count:
+            raise IndexError('string pool index out of range')
+        start, end = struct.unpack_from('<II', self._buf,
+            self._offsetsOffset + 4 * idx)
+        item = self._buf[self._dataOffset + start:self._dataOffset + end]
+        if item[0] == '\x00':
+            return None
+        return item[1:].decode('utf8')
+
+
+class _MappedIndex(object):
+    """
+    Index mapping keys to entry ids read from a memory map. Provides the
+    parts of the dictionary interface used by L{MemoryDictionary}.
+    """
+    def __init__(self, keys, offsets, postings):
+        self.keys = keys
+        self._offsets = offsets
+        self._postings = postings
+
+    def get(self, key, default=None):
+        idx = bisect.bisect_left(self.keys, key)
+        if idx < len(self.keys) and self.keys[idx] == key:
+            start, end = self._offsets.getRange(idx, idx + 2)
+            return self._postings.getRange(start, end)
+        return default
+
+    def __getitem__(self, key):
+        postings = self.get(key)
+        if postings is None:
+            raise KeyError(key)
+        return postings
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+
+class BinaryDictionary(MemoryDictionary):
+    """
+    Dictionary engine reading entries from a binary dictionary file written by
+    L{exportDictionary()}. The file is memory mapped, so opening it is cheap
+    and several processes share the pages cached by the operating system.
+    Searches work as for L{MemoryDictionary}.
+
+    The underlying dictionary instance still provides search strategies and
+    formatting.
+    """
+    def __init__(self, dictionary, filePath):
+        """
+        Initialises the BinaryDictionary instance.
+
+        @param dictionary: SQL dictionary instance
+        @type filePath: str
+        @param filePath: path of the binary dictionary file
+        @raise ValueError: if the file is no binary dictionary file or is
+            outdated
+        """
+        self._filePath = filePath
+        MemoryDictionary.__init__(self, dictionary)
+
+    def _load(self):
+        f = open(self._filePath, 'rb')
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+
+        headerSize = struct.calcsize(_HEADER_FORMAT)
+        if len(buf) < headerSize:
+            raise ValueError("Not a binary dictionary file '%s'"
+                % self._filePath)
+        magic, formatVersion, flags, count, sectionCount \
+            = struct.unpack_from(_HEADER_FORMAT, buf, 0)
+        if magic != MAGIC or formatVersion != FORMAT_VERSION:
+            raise ValueError("Not a binary dictionary file '%s'"
+                % self._filePath)
+        offsets = iter(struct.unpack_from('<%dQ' % sectionCount, buf,
+            headerSize))
+
+        meta = _MappedStringPool(buf, offsets.next())
+        if list(meta)[1:] != self._columnNames:
+            raise ValueError("Binary dictionary file '%s' holds other columns"
+                % self._filePath)
+        if meta[0] != _getVersionString(self._dictionary):
+            raise ValueError("Binary dictionary file '%s' is outdated"
+                % self._filePath)
+
+        self._buffer = buf
+        self._count = count
+        self._hasWeight = bool(flags & _HAS_WEIGHT)
+        self._hasPlainReading = bool(flags & _HAS_PLAIN_READING)
+
+        self._columns = [_MappedStringPool(buf, offsets.next())
+            for _ in self._columnNames]
+        self._sortWeights = _MappedArray(buf, offsets.next(), 'i')
+        for indexName in _INDEXES:
+            setattr(self, indexName, _MappedIndex(
+                _MappedStringPool(buf, offsets.next()),
+                _MappedArray(buf, offsets.next(), 'I'),
+                _MappedArray(buf, offsets.next(), 'I')))
+
+        self._sortedHeadwords = self._headwordIndex.keys
+        self._sortedPlainReadings = self._plainReadingIndex.keys
+
+
+def main():
+    if len(sys.argv) != 3:
+        print >> sys.stderr, "Usage: %s DICTIONARY FILE" % sys.argv[0]
+        return False
+
+    from libeclectus.dictionary import getDictionary
+    dictionaryName, filePath = sys.argv[1:]
+    dictionary = getDictionary(dictionaryName, engine='memory')
+    if dictionary is None:
+        print >> sys.stderr, "Error: dictionary '%s' not available" \
+            % dictionaryName
+        return False
+
+    exportDictionary(dictionary, filePath)
+    return True
+
+if __name__ == '__main__':
+    if not main():
+        sys.exit(1)
@@ -28,20 +28,98 @@ import re
 import itertools
 import xml.sax
 import bz2
+import time
+import tempfile
+import multiprocessing
+import shutil
+import warnings
 from datetime import datetime
 
+import sqlalchemy
 from sqlalchemy import Table, Column, Integer, String, Text, DateTime, Index
 from sqlalchemy.sql import and_, or_, not_
-from sqlalchemy import select
+from sqlalchemy import select, bindparam, func
+from sqlalchemy.exceptions import OperationalError
 
 from cjklib import characterlookup
 from cjklib.reading import ReadingFactory
-from cjklib.build import builder, cli, warn
+from cjklib.build import builder, cli, warn, DatabaseBuilder
 from cjklib import exception
 from cjklib.util import UnicodeCSVFileIterator, CharacterRangeIterator
+from cjklib.util import getCharacterList
+from cjklib.dbconnector import getDBConnector, DatabaseConnector
+from cjklib.dbconnector import getDefaultConfiguration
 
 from libeclectus import util
 
+class BulkInsertBuilder(object):
+    """
+    Provides loading of table content in chunks of several rows per statement
+    inside of one transaction, avoiding a round trip and commit per row.
+    """
+    INSERT_CHUNK_SIZE = 1000
+    """Number of entries written with one statement."""
+
+    def insertEntries(self, table, entries):
+        """
+        Inserts the given entries into the table using one transaction.
+
+        @type table: object
+        @param table: SQLAlchemy table object
+        @type entries: iterable of dict
+        @param entries: entries given as mappings of column name to value
+        """
+        transaction = self.db.connection.begin()
+        try:
+            chunk = []
+            for entry in entries:
+                chunk.append(entry)
+                if len(chunk) >= self.INSERT_CHUNK_SIZE:
+                    self.db.execute(table.insert(), chunk)
+                    chunk = []
+            if chunk:
+                self.db.execute(table.insert(), chunk)
+        except sqlalchemy.exceptions.IntegrityError, e:
+            transaction.rollback()
+            warn(unicode(e))
+            raise
+        except:
+            transaction.rollback()
+            raise
+
+        transaction.commit()
+
+
+class BulkEntryGeneratorBuilder(BulkInsertBuilder,
+    builder.EntryGeneratorBuilder):
+    """
+    Builds a table from the entries of a generator using bulk inserts. Indices
+    are created after all content is loaded.
+    """
+    def getEntryDicts(self, generator):
+        """
+        Converts entries given as tuples to dicts. Entries given as dicts are
+        copied as generators might reuse them.
+        """
+        for entry in generator:
+            if type(entry) == type({}):
+                yield entry.copy()
+            else:
+                yield dict(zip(self.COLUMNS, entry))
+
+    def build(self):
+        generator = self.getGenerator()
+
+        table = self.buildTableObject(self.PROVIDES, self.COLUMNS,
+            self.COLUMN_TYPES, self.PRIMARY_KEYS)
+        table.create()
+
+        self.insertEntries(table, self.getEntryDicts(generator))
+
+        for index in self.buildIndexObjects(self.PROVIDES, self.INDEX_KEYS):
+            index.create()
+
+
 class UpdateVersionBuilder(builder.EntryGeneratorBuilder):
     """Table for keeping track of which date the release was."""
     PROVIDES = 'UpdateVersion'
@@ -107,7 +185,7 @@ class RadicalNamesZHCMNBuilder(builder.CSVFileLoader):
     TABLE_DECLARATION_FILE_MAPPING = 'radicalnames_zh-cmn.sql'
 
 
-class BeidaHSKVocabularyBuilder(builder.CSVFileLoader):
+class BeidaHSKVocabularyBuilder(BulkInsertBuilder, builder.CSVFileLoader):
     """
     Builds a table of HSK (Hanyu Shuiping Kaoshi, Chinese proficiency test) by
     loading its data from a list of comma separated values (CSV) provided in the
@@ -133,6 +211,10 @@ class BeidaHSKVocabularyBuilder(builder.CSVFileLoader):
         table.create()
 
         # write table content
+        self.insertEntries(table, self.getEntries(fileHandle))
+
+    def getEntries(self, fileHandle):
+        """Reads the HSK entries from the given file."""
         currentLevel = None     # current level 1-4
         seenHeadwords = set()   # already saved headwords
         doubleEntryCount = 0    # double/tripple entries
@@ -177,14 +259,7 @@ class BeidaHSKVocabularyBuilder(builder.CSVFileLoader):
                 else:
                     seenHeadwords.add(headword)
 
-                entry = {'Headword': headword, 'Level': currentLevel}
-
-                try:
-                    self.db.execute(table.insert().values(**entry))
-                except sqlalchemy.exceptions.IntegrityError, e:
-                    warn(unicode(e))
-                    #warn(unicode(insertStatement))
-                    raise
+                yield {'Headword': headword, 'Level': currentLevel}
 
         if not self.quiet:
             if doubleEntryCount:
@@ -194,7 +269,8 @@ class BeidaHSKVocabularyBuilder(builder.CSVFileLoader):
                     + " lines with multiple entries")
 
 
-class WiktionaryHSKVocabularyBuilder(builder.CSVFileLoader):
+class WiktionaryHSKVocabularyBuilder(BulkInsertBuilder,
+    builder.CSVFileLoader):
     """
     Builds a table of HSK (Hanyu Shuiping Kaoshi, Chinese proficiency test) by
     loading its data from a list of comma separated values (CSV) provided from
@@ -239,17 +315,13 @@ class WiktionaryHSKVocabularyBuilder(builder.CSVFileLoader):
                 tradSimpHeadwordDict[headwordTrad] = headwordSimp
 
         # write table content
+        entries = []
         for headwordTrad in traditionalHeadwordLevelDict:
             headwordSimp = tradSimpHeadwordDict[headwordTrad]
             level = self.LEVELS[traditionalHeadwordLevelDict[headwordTrad]]
-            try:
-                self.db.execute(table.insert().values(
-                    HeadwordTraditional=headwordTrad,
-                    HeadwordSimplified=headwordSimp, Level=level))
-            except sqlalchemy.exceptions.IntegrityError, e:
-                warn(unicode(e))
-                #warn(unicode(insertStatement))
-                raise
+            entries.append({'HeadwordTraditional': headwordTrad,
+                'HeadwordSimplified': headwordSimp, 'Level': level})
+        self.insertEntries(table, entries)
 
         # get create index statement
         for index in self.buildIndexObjects(self.PROVIDES,
@@ -262,7 +334,73 @@ class WiktionaryHSKVocabularyBuilder(builder.CSVFileLoader):
                     + " repeated entries")
 
 
-class WeightedEDICTFormatBuilder(builder.EDICTFormatBuilder):
+class DecompressingStream(object):
+    """
+    File-like object decompressing the content of a compressed stream while
+    it is read, without the need to have the whole content available.
+    """
+    BLOCK_SIZE = 64 * 1024
+    """Number of bytes read from the compressed stream at once."""
+
+    def __init__(self, fileObj, decompressor):
+        """
+        Initialises the DecompressingStream.
+
+        @type fileObj: file
+        @param fileObj: file-like object providing compressed data
+        @param decompressor: decompressor object as provided by module C{zlib}
+            or C{bz2}
+        """
+        self.fileObj = fileObj
+        self.decompressor = decompressor
+        self.buffer = ''
+        self.eof = False
+
+    def read(self, size=-1):
+        while not self.eof and (size < 0 or len(self.buffer) < size):
+            data = self.fileObj.read(self.BLOCK_SIZE)
+            if data:
+                self.buffer += self.decompressor.decompress(data)
+            else:
+                self.eof = True
+                if hasattr(self.decompressor, 'flush'):
+                    self.buffer += self.decompressor.flush()
+
+        if size < 0:
+            content, self.buffer = self.buffer, ''
+        else:
+            content, self.buffer = self.buffer[:size], self.buffer[size:]
+        return content
+
+    def close(self):
+        self.fileObj.close()
+
+
+class PrependedStream(object):
+    """
+    File-like object giving data already read from a stream before the rest
+    of the stream.
+    """
+    def __init__(self, data, fileObj):
+        self.data = data
+        self.fileObj = fileObj
+
+    def read(self, size=-1):
+        if size < 0:
+            content, self.data = self.data + self.fileObj.read(), ''
+        elif len(self.data) >= size:
+            content, self.data = self.data[:size], self.data[size:]
+        else:
+            content, self.data = self.data, ''
+            content += self.fileObj.read(size - len(content))
+        return content
+
+    def close(self):
+        self.fileObj.close()
+
+
+class WeightedEDICTFormatBuilder(BulkInsertBuilder,
+    builder.EDICTFormatBuilder):
     """
     Provides an abstract class for loading EDICT formatted dictionaries together
     with a weight attached to each entry provided by an additional.
@@ -273,7 +411,8 @@ class WeightedEDICTFormatBuilder(builder.EDICTFormatBuilder):
     class WeightedEntryGenerator:
         """Generates the dictionary entries."""
 
-        def __init__(self, dictionaryEntryGenerator, weightFunc):
+        def __init__(self, dictionaryEntryGenerator, weightFunc,
+            derivedFunc=None):
             """
             Initialises the TableGenerator.
 
@@ -281,14 +420,20 @@ class WeightedEDICTFormatBuilder(builder.EDICTFormatBuilder):
             @param fileHandle: handle of file to read from
             @type weightFunc: func
             @param weightFunc: columns from dictionary used to get weights
+            @type derivedFunc: func
+            @param derivedFunc: function returning a dict of further columns
+                computed from the entry
             """
             self.dictionaryEntryGenerator = dictionaryEntryGenerator
             self.weightFunc = weightFunc
+            self.derivedFunc = derivedFunc
 
         def generator(self):
             """Provides the weighted dictionary entries."""
             for entry in self.dictionaryEntryGenerator:
                 entry['Weight'] = self.weightFunc(entry)
+                if self.derivedFunc:
+                    entry.update(self.derivedFunc(entry))
 
                 yield entry
 
@@ -315,10 +460,13 @@ class WeightedEDICTFormatBuilder(builder.EDICTFormatBuilder):
             else:
                 return self.data.readline()
 
-    COLUMNS = ['Headword', 'Reading', 'Translation', 'Weight']
-    INDEX_KEYS = [['Headword'], ['Reading'], ['Weight']]
+    COLUMNS = ['Headword', 'Reading', 'Translation', 'Weight', 'HeadwordLength',
+        'SortWeight']
+    INDEX_KEYS = [['Headword', 'SortWeight'], ['Reading', 'SortWeight'],
+        ['Weight'], ['HeadwordLength']]
     COLUMN_TYPES = {'Headword': String(255), 'Reading': String(255),
-        'Translation': Integer(), 'Weight': Integer()}
+        'Translation': Integer(), 'Weight': Integer(),
+        'HeadwordLength': Integer(), 'SortWeight': Integer()}
 
     WEIGHT_TABLE = None
     """The table from which the weight will be deduced."""
@@ -329,9 +477,69 @@ class WeightedEDICTFormatBuilder(builder.EDICTFormatBuilder):
     Dict of column pairs used in joining of dictionary and weight table, e.g.
     {dictCol1: weightCol1, dictCol2: weightCol2}
     """
+    DERIVED_COLUMNS = ['HeadwordLength', 'SortWeight']
+    """
+    Columns computed from the entry's content by L{getDerivedColumns()} to
+    support indexed searching.
+    """
+    DEFAULT_SORT_WEIGHT = 100
+    """Sort weight of entries without weight, placing them last."""
+
+    @classmethod
+    def getDefaultOptions(cls):
+        options = super(WeightedEDICTFormatBuilder, cls).getDefaultOptions()
+        options['fileOpener'] = None
+        options['sqlWeightJoin'] = True
+
+        return options
+
+    @classmethod
+    def getOptionMetaData(cls, option):
+        optionsMetaData = {'sqlWeightJoin': {'type': 'bool',
+            'description': "join weights inside the database after loading"}}
+
+        if option in optionsMetaData:
+            return optionsMetaData[option]
+        else:
+            return super(WeightedEDICTFormatBuilder, cls).getOptionMetaData(
+                option)
+
+    def build(self):
+        super(WeightedEDICTFormatBuilder, self).build()
+
+        if self.WEIGHT_TABLE and self.sqlWeightJoin:
+            self.updateWeights()
+
+    def updateWeights(self, changedOnly=False):
+        """
+        Sets the weight of all entries with one correlated update against the
+        weight table. Other than the lookup done in L{getGenerator()} the
+        weight table is not held in memory.
+
+        @type changedOnly: bool
+        @param changedOnly: if C{True} only entries whose weight differs from
+            the weight table are written, e.g. newly inserted ones
+        """
+        if self.db.mainHasTable(self.PROVIDES + '_Text'):
+            # weights are stored in the non-FTS3 part
+            table = self.db.tables[self.PROVIDES + '_Normal']
+        else:
+            table = self.db.tables[self.PROVIDES]
+        weightTable = self.db.tables[self.WEIGHT_TABLE]
+
+        weight = select([func.min(weightTable.c[self.WEIGHT_COLUMN])],
+            and_(*[weightTable.c[weightColumn] == table.c[column]
+                for column, weightColumn in self.JOIN_COLUMNS.items()]))\
+            .as_scalar()
+        statement = table.update().values(Weight=weight,
+            SortWeight=func.coalesce(weight, self.DEFAULT_SORT_WEIGHT))
+        if changedOnly:
+            # IS NOT compares NULL values, too
+            statement = statement.where(table.c.Weight.op('IS NOT')(weight))
+        self.db.execute(statement)
 
     def getGenerator(self):
-        if self.WEIGHT_TABLE:
+        if self.WEIGHT_TABLE and not self.sqlWeightJoin:
             # get weight entries
             dictionaryColumns = self.JOIN_COLUMNS.keys()
             weightColumns = [self.JOIN_COLUMNS[c] for c in dictionaryColumns]
@@ -350,13 +558,160 @@ class WeightedEDICTFormatBuilder(builder.EDICTFormatBuilder):
         else:
             weightFunc = lambda entry: None
 
+        if self.fileOpener:
+            entryGenerator = self.getStreamGenerator()
+        else:
+            entryGenerator = builder.EDICTFormatBuilder.getGenerator(self)
+
         # create generator, and put on top of the super init method's generator
         return WeightedEDICTFormatBuilder.WeightedEntryGenerator(
-            builder.EDICTFormatBuilder.getGenerator(self), weightFunc)\
-                .generator()
+            entryGenerator, weightFunc, self.getDerivedColumns).generator()
+
+    def getDerivedColumns(self, entry):
+        """
+        Gets the values of the columns given in L{DERIVED_COLUMNS} for the
+        given entry.
+
+        @type entry: dict
+        @param entry: dictionary entry
+        @rtype: dict
+        @return: mapping of derived column to value
+        """
+        return {'HeadwordLength': self.getHeadwordLength(entry),
+            'SortWeight': self.getSortWeight(entry['Weight'])}
+
+    def getHeadwordLength(self, entry):
+        """
+        Gets the count of characters of the entry's headword.
+
+        @type entry: dict
+        @param entry: dictionary entry
+        @rtype: int
+        @return: headword length
+        """
+        return len(getCharacterList(entry['Headword']))
+
+    def getSortWeight(self, weight):
+        """
+        Gets the non-null key used for ordering entries by weight.
+
+        @type weight: int
+        @param weight: weight of the entry, C{None} if not given
+        @rtype: int
+        @return: sort weight
+        """
+        if weight is None:
+            return self.DEFAULT_SORT_WEIGHT
+        else:
+            return weight
+
+    def getStreamGenerator(self):
+        """
+        Gets a generator reading entries from the stream given by option
+        C{fileOpener}, parsing entries as soon as data arrives.
+        """
+        handle = self.getFileHandle(None)
+        if not self.quiet:
+            warn("Reading table from stream")
+
+        # ignore starting lines
+        for _ in range(0, self.IGNORE_LINES):
+            handle.readline()
+        # create generator
+        return builder.EDICTFormatBuilder.TableGenerator(handle, self.quiet,
+            self.ENTRY_REGEX, self.COLUMNS, self.FILTER).generator()
+
+    def getStreamHandle(self, fileObj):
+        """
+        Returns a handle to the decompressed and decoded content of the given
+        stream. Only zip archives need to be read completely before, as their
+        index is stored at the end.
+
+        @type fileObj: file
+        @param fileObj: file-like object, only needs to support C{read()}
+        @rtype: file
+        @return: handle to the stream's content
+        """
+        import codecs
+        import zlib
+        import tarfile
+
+        fileType = self.fileType
+        if not fileType:
+            fileObj, fileType = self.guessStreamType(fileObj)
+
+        if fileType in ('.tar', '.tar.bz2', '.tar.gz'):
+            mode = 'r|' + fileType[len('.tar.'):]
+            z = tarfile.open(fileobj=fileObj, mode=mode)
+            for member in z:
+                if member.isfile() and member.name \
+                    == self.getArchiveContentName([member.name], ''):
+                    fileObj = z.extractfile(member)
+                    break
+            else:
+                raise IOError("No dictionary found in archive")
+        elif fileType == '.gz':
+            # offset tells zlib to expect a gzip header
+            fileObj = DecompressingStream(fileObj,
+                zlib.decompressobj(16 + zlib.MAX_WBITS))
+        elif fileType == '.zip':
+            import zipfile
+            import StringIO
+            z = zipfile.ZipFile(StringIO.StringIO(fileObj.read()), 'r')
+            archiveContent = self.getArchiveContentName(z.namelist(), '')
+            return StringIO.StringIO(z.read(archiveContent)\
+                .decode(self.ENCODING))
+
+        return codecs.getreader(self.ENCODING)(fileObj)
+
+    @staticmethod
+    def guessStreamType(fileObj):
+        """
+        Guesses the type of the given stream from its content, as done for
+        files if no file type is given. Compressed content is decompressed to
+        look for a tar archive.
+
+        @type fileObj: file
+        @param fileObj: file-like object, only needs to support C{read()}
+        @rtype: tuple
+        @return: stream positioned at its start and its file type
+        """
+        import zlib
+
+        def readHeader(fileObj):
+            # streams might return less than requested before the end
+            header = ''
+            while len(header) < 512:
+                data = fileObj.read(512 - len(header))
+                if not data:
+                    break
+                header += data
+            return header, PrependedStream(header, fileObj)
+
+        header, fileObj = readHeader(fileObj)
+        if header.startswith('PK\x03\x04'):
+            return fileObj, '.zip'
+        elif header.startswith('\x1f\x8b'):
+            # offset tells zlib to expect a gzip header
+            fileObj = DecompressingStream(fileObj,
+                zlib.decompressobj(16 + zlib.MAX_WBITS))
+            header, fileObj = readHeader(fileObj)
+        elif header.startswith('BZh'):
+            fileObj = DecompressingStream(fileObj, bz2.BZ2Decompressor())
+            header, fileObj = readHeader(fileObj)
+
+        # compressed content is returned decompressed
+        if header[257:262] == 'ustar':
+            return fileObj, '.tar'
+        else:
+            return fileObj, '.txt'
 
     def getFileHandle(self, filePath):
-        handle = super(WeightedEDICTFormatBuilder, self).getFileHandle(filePath)
+        if self.fileOpener:
+            handle = self.getStreamHandle(self.fileOpener())
+        else:
+            handle = super(WeightedEDICTFormatBuilder, self).getFileHandle(
+                filePath)
 
         readLines = []
         # find version
@@ -398,6 +753,112 @@ class WeightedEDICTFormatBuilder(builder.EDICTFormatBuilder):
 
         self.removeVersion()
 
+    def supportsUpdate(self):
+        """
+        Checks if the existing table can be updated incrementally. Tables
+        built with FTS3 or with an older set of columns need a full rebuild.
+
+        @rtype: bool
+        @return: C{True} if L{update()} can be used on the existing table
+        """
+        if not self.db.mainHasTable(self.PROVIDES) \
+            or self.db.mainHasTable(self.PROVIDES + '_Text'):
+            return False
+
+        table = self.db.tables[self.PROVIDES]
+        return all(column in table.columns for column in self.COLUMNS)
+
+    def update(self):
+        """
+        Updates the existing table with the content of the new source. Entries
+        are compared by all columns but the weight, only entries that were
+        added or removed are written, weights are updated in place.
+        """
+        # primary keys are assigned by the database
+        keyColumns = [column for column in self.COLUMNS if column != 'Weight'
+            and column not in self.DERIVED_COLUMNS
+            and column not in self.PRIMARY_KEYS]
+
+        table = self.db.tables[self.PROVIDES]
+
+        # count of stored entries and their weight, per key
+        existing = {}
+        for row in self.db.selectRows(select(
+            [table.c[column] for column in keyColumns] + [table.c.Weight])):
+            key = tuple(row[:-1])
+            if key in existing:
+                existing[key][1] += 1
+            else:
+                existing[key] = [row[-1], 1]
+
+        newEntries = {}
+        for entry in self.getGenerator():
+            key = tuple([entry[column] for column in keyColumns])
+            if key in newEntries:
+                newEntries[key][1] += 1
+            else:
+                newEntries[key] = [entry['Weight'], 1]
+
+        deleteKeys = []
+        insertEntries = []
+        weightUpdates = []
+        # weights are set afterwards when joined inside the database
+        sqlWeightJoin = self.WEIGHT_TABLE and self.sqlWeightJoin
+        for key, (weight, count) in newEntries.iteritems():
+            if key in existing and existing[key][1] == count:
+                if not sqlWeightJoin and existing[key][0] != weight:
+                    weightUpdates.append((key, weight))
+                continue
+            elif key in existing:
+                deleteKeys.append(key)
+
+            entry = dict(zip(keyColumns, key))
+            entry['Weight'] = weight
+            entry.update(self.getDerivedColumns(entry))
+            insertEntries.extend([entry] * count)
+
+        deleteKeys.extend([key for key in existing if key not in newEntries])
+
+        if not self.quiet:
+            warn("Updating table '%s': %d inserted, %d removed, %d reweighted"
+                % (self.PROVIDES, len(insertEntries), len(deleteKeys),
+                    len(weightUpdates)))
+
+        # bind parameters must not collide with column names, NULL values
+        #   need to match, too
+        keyClause = and_(*[or_(table.c[column] == bindparam('key' + column),
+                and_(table.c[column] == None,
+                    bindparam('key' + column) == None))
+            for column in keyColumns])
+
+        transaction = self.db.connection.begin()
+        try:
+            if deleteKeys:
+                self.db.execute(table.delete().where(keyClause),
+                    [dict(zip(['key' + column for column in keyColumns], key))
+                        for key in deleteKeys])
+            if weightUpdates:
+                params = []
+                for key, weight in weightUpdates:
+                    param = dict(zip(['key' + column for column in keyColumns],
+                        key))
+                    param['keyWeight'] = weight
+                    param['keySortWeight'] = self.getSortWeight(weight)
+                    params.append(param)
+                self.db.execute(table.update().where(keyClause)\
+                    .values(Weight=bindparam('keyWeight'),
+                        SortWeight=bindparam('keySortWeight')), params)
+
+            self.insertEntries(table, insertEntries)
+
+            if sqlWeightJoin:
+                # inserted entries have no weight yet
+                self.updateWeights(changedOnly=True)
+        except:
+            transaction.rollback()
+            raise
+        transaction.commit()
+
     def removeVersion(self):
         if not self.db.mainHasTable('UpdateVersion'):
             return
@@ -480,30 +941,60 @@ class WeightedCEDICTFormatBuilder(WeightedEDICTFormatBuilder):
 
     Two column will be provided for the headword (one for traditional and
     simplified writings each), one for the reading (e.g. in CEDICT Pinyin) and
-    one for the translation.
+    one for the translation. Entries are identified by an id assigned by the
+    database.
     @todo Impl: Proper collation for Translation and Reading columns.
     """
     COLUMNS = ['HeadwordTraditional', 'HeadwordSimplified', 'Reading',
-        'Translation', 'Weight']
-    INDEX_KEYS = [['HeadwordTraditional'], ['HeadwordSimplified'], ['Reading'],
-        ['Weight']]
+        'Translation', 'Weight', 'HeadwordLength', 'SortWeight', 'EntryId']
+    PRIMARY_KEYS = ['EntryId']
+    INDEX_KEYS = [['HeadwordTraditional', 'SortWeight'],
+        ['HeadwordSimplified', 'SortWeight'], ['Reading', 'SortWeight'],
+        ['Weight'], ['HeadwordLength']]
     COLUMN_TYPES = {'HeadwordTraditional': String(255),
         'HeadwordSimplified': String(255), 'Reading': String(255),
-        'Translation': Text(), 'Weight': Integer()}
+        'Translation': Text(), 'Weight': Integer(),
+        'HeadwordLength': Integer(), 'SortWeight': Integer(),
+        'EntryId': Integer()}
 
     def __init__(self, **options):
         self.ENTRY_REGEX = \
             re.compile(r'\s*(\S+)(?:\s+(\S+))?\s*\[([^\]]*)\]\s*(/.*/)\s*$')
         super(WeightedCEDICTFormatBuilder, self).__init__(**options)
 
+    def getHeadwordLength(self, entry):
+        # traditional and simplified headwords map character by character
+        return len(getCharacterList(entry['HeadwordTraditional']))
+
 
 class WeightedMandarinCEDICTFormatBuilder(WeightedCEDICTFormatBuilder):
+    """
+    Provides an abstract class for loading CEDICT formatted dictionaries with
+    Pinyin readings. The reading is additionally stored without tones and
+    together with its syllable count for indexed toneless searching.
+    """
     DEPENDS = ['HSKVocabulary']
 
+    COLUMNS = WeightedCEDICTFormatBuilder.COLUMNS \
+        + ['ReadingPlain', 'ReadingSyllables']
+    INDEX_KEYS = WeightedCEDICTFormatBuilder.INDEX_KEYS \
+        + [['ReadingPlain', 'SortWeight'], ['ReadingSyllables']]
+    COLUMN_TYPES = dict(WeightedCEDICTFormatBuilder.COLUMN_TYPES,
+        ReadingPlain=String(255), ReadingSyllables=Integer())
+    DERIVED_COLUMNS = WeightedCEDICTFormatBuilder.DERIVED_COLUMNS \
+        + ['ReadingPlain', 'ReadingSyllables']
+
     WEIGHT_TABLE = 'HSKVocabulary' # TODO 'Level' ascending while 'Weight' should be descending
     WEIGHT_COLUMN = 'Level'
     JOIN_COLUMNS = {'HeadwordTraditional': 'HeadwordTraditional'}
 
+    def getDerivedColumns(self, entry):
+        derived = super(WeightedMandarinCEDICTFormatBuilder,
+            self).getDerivedColumns(entry)
+        derived.update({'ReadingPlain': util.getPlainReading(entry['Reading']),
+            'ReadingSyllables': len(entry['Reading'].split(' '))})
+        return derived
+
 
 class WeightedCEDICTBuilder(WeightedMandarinCEDICTFormatBuilder,
     builder.CEDICTBuilder):
@@ -568,7 +1059,57 @@ class WeightedCFDictBuilder(WeightedTimestampedCEDICTFormatBuilder,
     EXTRACT_HEADER_TIMESTAMP = ur'# CFDICT ([^\;]+); Copyright'
 
 
-class HanDeDictRadicalTableBuilder(builder.EntryGeneratorBuilder):
+class CEDICTFormatHeadwordIndexBuilder(BulkEntryGeneratorBuilder):
+    """
+    Provides an abstract class for building a lookup table of headwords for
+    CEDICT formatted dictionaries. Simplified and traditional headwords are
+    stored in one column, so that a search in both scripts needs a single
+    index lookup. The headword's length is stored for narrowing down searches
+    of fixed length.
+    """
+    COLUMNS = ['Headword', 'EntryId', 'Script', 'HeadwordLength']
+    INDEX_KEYS = [['Headword', 'Script'], ['HeadwordLength']]
+    COLUMN_TYPES = {'Headword': String(255), 'EntryId': Integer(),
+        'Script': String(1), 'HeadwordLength': Integer()}
+
+    DICTIONARY = None
+    """Dictionary table the headwords are taken from."""
+
+    def getGenerator(self):
+        table = self.db.tables[self.DICTIONARY]
+        for entryId, simplified, traditional in self.db.iterRows(
+            select([table.c.EntryId, table.c.HeadwordSimplified,
+                table.c.HeadwordTraditional])):
+            # traditional and simplified headwords map character by character
+            length = len(getCharacterList(traditional))
+            yield {'Headword': simplified, 'EntryId': entryId, 'Script': 's',
+                'HeadwordLength': length}
+            yield {'Headword': traditional, 'EntryId': entryId, 'Script': 't',
+                'HeadwordLength': length}
+
+
+class CEDICTHeadwordIndexBuilder(CEDICTFormatHeadwordIndexBuilder):
+    """Builds the headword lookup table for CEDICT."""
+    PROVIDES = 'HeadwordIndex_CEDICT'
+    DEPENDS = ['CEDICT']
+    DICTIONARY = 'CEDICT'
+
+
+class HanDeDictHeadwordIndexBuilder(CEDICTFormatHeadwordIndexBuilder):
+    """Builds the headword lookup table for HanDeDict."""
+    PROVIDES = 'HeadwordIndex_HanDeDict'
+    DEPENDS = ['HanDeDict']
+    DICTIONARY = 'HanDeDict'
+
+
+class CFDICTHeadwordIndexBuilder(CEDICTFormatHeadwordIndexBuilder):
+    """Builds the headword lookup table for CFDICT."""
+    PROVIDES = 'HeadwordIndex_CFDICT'
+    DEPENDS = ['CFDICT']
+    DICTIONARY = 'CFDICT'
+
+
+class HanDeDictRadicalTableBuilder(BulkEntryGeneratorBuilder):
     """
     Builds a radical table with index, reading and meaning using the dictionary
     HanDeDict.
@@ -636,7 +1177,7 @@ class EnglishCSVRadicalTableBuilder(builder.CSVFileLoader):
 
 
 class CombinedEnglishRadicalTableBuilder(EnglishCSVRadicalTableBuilder,
-    builder.EntryGeneratorBuilder):
+    BulkEntryGeneratorBuilder):
     """
     Builds a radical table with index, reading using a CSV source, adding
     names as defined by Unicode.
@@ -649,7 +1190,7 @@ class CombinedEnglishRadicalTableBuilder(EnglishCSVRadicalTableBuilder,
         'Meaning': Text()}
 
     def build(self):
-        return builder.EntryGeneratorBuilder.build(self)
+        return BulkEntryGeneratorBuilder.build(self)
 
     def getGenerator(self):
         contentFile = self.findFile([self.TABLE_CSV_FILE_MAPPING], "table")
@@ -690,7 +1231,7 @@ class CombinedEnglishRadicalTableBuilder(EnglishCSVRadicalTableBuilder,
                     'Meaning': ', '.join(meanings)})
 
 
-class KanjidicEnRadicalTableBuilder(builder.EntryGeneratorBuilder):
+class KanjidicEnRadicalTableBuilder(BulkEntryGeneratorBuilder):
     """
     Builds a radical table with index, radical name and meaning using Kanjidic.
     """
@@ -755,7 +1296,7 @@ class KanjidicFrRadicalTableBuilder(KanjidicEnRadicalTableBuilder):
     REMOVE_PARTS = re.compile('radical (variant )?')
 
 
-class KangxiRadicalTableBuilder(builder.EntryGeneratorBuilder):
+class KangxiRadicalTableBuilder(BulkEntryGeneratorBuilder):
     """
     Builds a Kangxi radical table with index, radical form (traditional radical
     form, locale dependant radical form and variants), type of radical form
@@ -860,7 +1401,7 @@ class KangxiRadicalTableBuilder(builder.EntryGeneratorBuilder):
             .generator()
 
 
-class KangxiRadicalStrokeCountBuilder(builder.EntryGeneratorBuilder):
+class KangxiRadicalStrokeCountBuilder(BulkEntryGeneratorBuilder):
     """
     Builds a table with the stroke count of all Kangxi radical main forms.
     """
@@ -903,7 +1444,7 @@ class KangxiRadicalStrokeCountBuilder(builder.EntryGeneratorBuilder):
             .generator()
 
 
-class SwacAudioCollectionBuilder(builder.EntryGeneratorBuilder):
+class SwacAudioCollectionBuilder(BulkEntryGeneratorBuilder):
     """
     Builds an index on a swac audio collection.
     """
@@ -1022,7 +1563,7 @@ class SwacCmnCaenTanBuilder(SwacAudioCollectionBuilder):
     BASE_DIRECTORY_NAME = 'cmn-caen-tan_ogg'
 
 
-class GlobbingPronunciationBuilder(builder.EntryGeneratorBuilder):
+class GlobbingPronunciationBuilder(BulkEntryGeneratorBuilder):
     """
     Provides an abstract builder for creating an index on a directory of
     pronunciation files following a given mapping from file name to reading.
@@ -1185,9 +1726,563 @@ class EduTwStrokeOrderIndexBuilder(builder.CSVFileLoader):
     TABLE_DECLARATION_FILE_MAPPING = 'edutw_strokeorderindex.sql'
 
 
+class IncrementalDatabaseBuilder(DatabaseBuilder):
+    """
+    Updates existing tables incrementally where supported by the table's
+    builder, only writing changed entries. All other tables are rebuilt.
+    """
+    SHARED_TABLES = ['UpdateVersion']
+    """
+    Tables builders write to besides their own table. These are only built if
+    missing, before other tables are updated, and existing content is kept.
+    """
+
+    def update(self, tables):
+        """
+        Updates the given tables. Tables are rebuilt if they don't exist yet or
+        their builder doesn't support incremental updates.
+
+        @type tables: list
+        @param tables: list of tables to update
+        """
+        if type(tables) != type([]):
+            tables = [tables]
+
+        for table in tables:
+            if table not in self._tableBuilderLookup:
+                raise exception.UnsupportedError("Table '%s' not provided" \
+                    % table)
+
+        # rebuilding would drop content written by other builders
+        missingSharedTables = [table for table in tables
+            if table in self.SHARED_TABLES and not self.db.mainHasTable(table)]
+        if missingSharedTables:
+            DatabaseBuilder.build(self, missingSharedTables)
+
+        rebuildTables = []
+        updatedTables = []
+        for table in tables:
+            if table in self.SHARED_TABLES:
+                continue
+
+            builderClass = self._tableBuilderLookup[table]
+            if not hasattr(builderClass, 'update') \
+                or not self.db.mainHasTable(table):
+                rebuildTables.append(table)
+                continue
+
+            options = self.getBuilderOptions(builderClass, ignoreUnknown=True)
+            options['dbConnectInst'] = self.db
+            instance = builderClass(**options)
+            if not instance.supportsUpdate():
+                rebuildTables.append(table)
+                continue
+
+            transaction = self.db.connection.begin()
+            try:
+                instance.update()
+            except:
+                transaction.rollback()
+                raise
+            transaction.commit()
+            updatedTables.append(table)
+
+        # tables built from the updated content need to follow
+        if self.rebuildDepending:
+            rebuildTables.extend([table for table
+                in self.getRebuiltDependingTables(updatedTables)
+                if table not in rebuildTables])
+
+        if rebuildTables:
+            # subclasses wrapping build() are already in charge here
+            DatabaseBuilder.build(self, rebuildTables)
+
+
+class ShadowDatabaseBuilder(IncrementalDatabaseBuilder):
+    """
+    Builds into a copy of a SQLite database and replaces the original file
+    only once the build succeeded and the copy passed an integrity check. The
+    database stays fully usable for lookups while building, and a failed or
+    canceled build leaves it untouched.
+
+    Connections opened on the original file keep reading the old content
+    until they are reopened. On Windows, where open files can't be replaced,
+    the content of the copy is written to the original database instead.
+    """
+    SHADOW_SUFFIX = '.shadow'
+    """Suffix of the database copy the build is run on."""
+
+    def __init__(self, **options):
+        """
+        Initialises the ShadowDatabaseBuilder. Takes the options of
+        L{DatabaseBuilder}.
+
+        @keyword databaseUrl: URL of the SQLite database to build
+        """
+        databaseUrl = options.pop('databaseUrl')
+        if not databaseUrl.startswith('sqlite:///'):
+            raise ValueError(
+                "Shadow builds are only supported for SQLite databases")
+        self.databasePath = databaseUrl[len('sqlite:///'):]
+        self.configuration = util.getDatabaseConfiguration(databaseUrl)
+
+        # use a private connection, shared ones are not reopened by us
+        options['dbConnectInst'] = DatabaseConnector(self.configuration)
+        IncrementalDatabaseBuilder.__init__(self, **options)
+        self._onShadow = False
+
+    def build(self, tables):
+        self._runOnShadow(IncrementalDatabaseBuilder.build, tables)
+
+    def update(self, tables):
+        self._runOnShadow(IncrementalDatabaseBuilder.update, tables)
+
+    def remove(self, tables):
+        return self._runOnShadow(IncrementalDatabaseBuilder.remove, tables)
+
+    def _runOnShadow(self, method, tables):
+        """
+        Runs the given build method on a copy of the database and swaps the
+        copy in on success. Nested calls run directly on the copy.
+        """
+        if self._onShadow:
+            return method(self, tables)
+
+        shadowPath = self.databasePath + self.SHADOW_SUFFIX
+        if os.path.exists(self.databasePath):
+            shutil.copyfile(self.databasePath, shadowPath)
+        elif os.path.exists(shadowPath):
+            os.remove(shadowPath)
+
+        configuration = self.configuration.copy()
+        configuration['sqlalchemy.url'] = 'sqlite:///%s' % shadowPath
+
+        liveDb = self.db
+        self.db = DatabaseConnector(configuration)
+        self._onShadow = True
+        try:
+            try:
+                result = method(self, tables)
+                self._checkDatabase()
+            finally:
+                self._onShadow = False
+                self._closeDatabase(self.db)
+                self.db = liveDb
+        except:
+            if os.path.exists(shadowPath):
+                os.remove(shadowPath)
+            raise
+
+        if os.name == 'nt' and os.path.exists(self.databasePath):
+            # files opened by lookups can't be replaced on Windows
+            try:
+                self._copyDatabase(shadowPath)
+            finally:
+                os.remove(shadowPath)
+        else:
+            self._closeDatabase(liveDb)
+            os.rename(shadowPath, self.databasePath)
+            self.db = DatabaseConnector(self.configuration)
+
+        return result
+
+    def _copyDatabase(self, filePath):
+        """
+        Replaces the content of the database by the one of the given database
+        in one transaction. Other connections can stay open and see the new
+        content once committed.
+        """
+        self.db.execute("ATTACH DATABASE '%s' AS shadow"
+            % filePath.replace("'", "''"))
+        try:
+            def getSchema(database):
+                schema = self.db.execute("SELECT type, name, sql"
+                    " FROM %s.sqlite_master WHERE sql IS NOT NULL"
+                    " AND name NOT LIKE 'sqlite_%%'" % database).fetchall()
+                # shadow tables are handled through their virtual table
+                virtualTables = [name for _, name, sql in schema
+                    if sql.upper().startswith('CREATE VIRTUAL TABLE')]
+                return [(entryType, name, sql) for entryType, name, sql
+                    in schema if not [virtual for virtual in virtualTables
+                        if name.startswith(virtual + '_')]]
+
+            transaction = self.db.connection.begin()
+            try:
+                for entryType, name, _ in getSchema('main'):
+                    if entryType in ('table', 'view'):
+                        self.db.execute('DROP %s main."%s"'
+                            % (entryType.upper(), name))
+
+                schema = getSchema('shadow')
+                for entryType, name, sql in schema:
+                    if entryType == 'table':
+                        self.db.execute(sql)
+                        self.db.execute('INSERT INTO main."%s"'
+                            ' SELECT * FROM shadow."%s"' % (name, name))
+                for entryType, name, sql in schema:
+                    if entryType in ('index', 'view'):
+                        self.db.execute(sql)
+            except:
+                transaction.rollback()
+                raise
+            transaction.commit()
+        finally:
+            self.db.execute("DETACH DATABASE shadow")
+
+    def _checkDatabase(self):
+        """
+        Checks the integrity of the database.
+
+        @raise IOError: if the database is damaged
+        """
+        result = self.db.execute('PRAGMA integrity_check').fetchall()
+        if [row[0] for row in result] != ['ok']:
+            raise IOError("Integrity check failed for '%s': %s"
+                % (self.db.databaseUrl, ', '.join([row[0] for row in result])))
+
+    @staticmethod
+    def _closeDatabase(db):
+        db.connection.close()
+        db.engine.dispose()
+
+
+class _BuildDatabaseError(Exception):
+    """
+    Database error raised in a worker process, standing in for SQLAlchemy's
+    errors that can't be passed to the parent process.
+    """
+
+class _BuildOperationalError(_BuildDatabaseError):
+    """
+    Operational error raised in a worker process, e.g. if the target database
+    was locked.
+    """
+
+def _buildTemporaryTable(builderClass, options, configuration,
+    sharedTableStatements):
+    """
+    Builds the table of the given builder in a worker process. The target
+    database is given by the configuration, other databases needed to solve
+    dependencies are attached.
+
+    @type builderClass: classobj
+    @param builderClass: L{TableBuilder} class
+    @type options: dict
+    @param options: options for the table builder
+    @type configuration: dict
+    @param configuration: database configuration
+    @type sharedTableStatements: list of str
+    @param sharedTableStatements: create statements of tables builders write
+        to besides their own
+    """
+    try:
+        db = getDBConnector(configuration)
+        for statement in sharedTableStatements:
+            db.execute(statement)
+
+        options = options.copy()
+        options['dbConnectInst'] = db
+        instance = builderClass(**options)
+
+        transaction = db.connection.begin()
+        try:
+            instance.build()
+        except:
+            transaction.rollback()
+            raise
+        transaction.commit()
+    except OperationalError, e:
+        # SQLAlchemy's errors can't be unpickled in the parent process
+        raise _BuildOperationalError(str(e))
+    except sqlalchemy.exceptions.DBAPIError, e:
+        raise _BuildDatabaseError(str(e))
+
+
+class ParallelDatabaseBuilder(DatabaseBuilder):
+    """
+    Builds independent tables concurrently. Tables are scheduled following the
+    dependency graph given by the builders' C{DEPENDS} declarations. Each table
+    is built by a worker process in its own temporary database and merged into
+    the target database once finished. Only SQLite databases are supported.
+    """
+    SHARED_TABLES = ['UpdateVersion']
+    """
+    Tables builders write to besides their own table. These are built first
+    and rows written by workers are merged into the target database.
+    """
+
+    POLL_INTERVAL = 0.1
+    """Seconds between checks for finished workers."""
+
+    BUSY_RETRIES = 3
+    """
+    Number of times a table is built again after its worker couldn't read the
+    target database while a merge was writing to it.
+    """
+
+    def __init__(self, **options):
+        """
+        Initialises the ParallelDatabaseBuilder. Takes the options of
+        L{DatabaseBuilder}.
+
+        @keyword jobs: number of worker processes
+        """
+        self.jobs = options.pop('jobs', None) or multiprocessing.cpu_count()
+        DatabaseBuilder.__init__(self, **options)
+
+        if self.db.engine.name != 'sqlite':
+            raise ValueError(
+                "Parallel builds are only supported for SQLite databases")
+
+    def build(self, tables):
+        if type(tables) != type([]):
+            tables = [tables]
+
+        if not self.quiet:
+            warn("Building database '%s' with %d processes"
+                % (self.db.databaseUrl, self.jobs))
+
+        # remove tables that don't need to be rebuilt
+        filteredTables = []
+        for table in tables:
+            if table not in self._tableBuilderLookup:
+                raise exception.UnsupportedError("Table '%s' not provided" \
+                    % table)
+
+            if self.needsRebuild(table):
+                filteredTables.append(table)
+            elif not self.quiet:
+                warn("Skipping table '%s' because it already exists" % table)
+        tables = filteredTables
+
+        if self.rebuildDepending:
+            dependingTables = self.getRebuiltDependingTables(tables)
+            if dependingTables:
+                if not self.quiet:
+                    warn("Tables rebuilt because of dependencies updated: '" \
+                        + "', '".join(dependingTables) + "'")
+                tables.extend(dependingTables)
+
+        buildDependentTables = self.getBuildDependentTables(tables)
+        builderClasses = self.getClassesInBuildOrder(
+            set(tables) | buildDependentTables)
+
+        self._instancesUnrequestedTable = set()
+        try:
+            # tables written to by several builders are built up front
+            for builderClass in builderClasses[:]:
+                if builderClass.PROVIDES in self.SHARED_TABLES:
+                    self._buildLocally(builderClass, buildDependentTables)
+                    builderClasses.remove(builderClass)
+
+            self._buildConcurrently(builderClasses, buildDependentTables)
+        except:
+            if not self.quiet: warn("Error")
+            self.clearTemporary()
+            raise
+
+        self.clearTemporary()
+
+    def _getInstance(self, builderClass, buildDependentTables):
+        options = self.getBuilderOptions(builderClass, ignoreUnknown=True)
+        options['dbConnectInst'] = self.db
+        instance = builderClass(**options)
+        # mark tables as deletable if only provided because of dependencies
+        if builderClass.PROVIDES in buildDependentTables \
+            and not self.db.mainHasTable(builderClass.PROVIDES):
+            self._instancesUnrequestedTable.add(instance)
+        return instance
+
+    def _removeTable(self, instance):
+        if self.db.mainHasTable(instance.PROVIDES):
+            if not self.quiet:
+                warn("Removing previously built table '%s'" % instance.PROVIDES)
+            instance.remove()
+
+        # remove old metadata
+        if instance.PROVIDES in self.db.tables:
+            del self.db.tables[instance.PROVIDES]
+
+    def _buildLocally(self, builderClass, buildDependentTables):
+        """Builds the given table directly in the target database."""
+        transaction = self.db.connection.begin()
+        try:
+            instance = self._getInstance(builderClass, buildDependentTables)
+            self._removeTable(instance)
+
+            if not self.quiet:
+                warn("Building table '%s' with builder '%s'..."
+                    % (builderClass.PROVIDES, builderClass.__name__))
+            instance.build()
+        except:
+            transaction.rollback()
+            raise
+        transaction.commit()
+
+    def _buildConcurrently(self, builderClasses, buildDependentTables):
+        """
+        Builds the given tables in worker processes, starting each table as
+        soon as all its dependencies are merged into the target database.
+        """
+        providedTables = set([clss.PROVIDES for clss in builderClasses])
+        finishedTables = set()
+        failedTables = set()
+        running = {}
+        merging = []
+        retries = {}
+
+        # target database is attached for reading dependencies
+        attach = [self.db.databaseUrl] + list(self.db.attached.keys())
+        sharedTableStatements = self._getSharedTableStatements()
+
+        pool = multiprocessing.Pool(self.jobs)
+        try:
+            while builderClasses or running or merging:
+                # start all builders whose dependencies are met
+                for builderClass in builderClasses[:]:
+                    dependencies = set(builderClass.DEPENDS) & providedTables
+                    if dependencies & failedTables:
+                        if not self.quiet:
+                            warn("Ignoring depending table '%s'"
+                                % builderClass.PROVIDES)
+                        failedTables.add(builderClass.PROVIDES)
+                        builderClasses.remove(builderClass)
+                    elif dependencies <= finishedTables:
+                        if not self.quiet:
+                            warn("Building table '%s' with builder '%s'..."
+                                % (builderClass.PROVIDES,
+                                    builderClass.__name__))
+                        fileHandle, filePath = tempfile.mkstemp(suffix='.db')
+                        os.close(fileHandle)
+                        configuration = {
+                            'sqlalchemy.url': 'sqlite:///%s' % filePath,
+                            'attach': attach}
+                        options = self.getBuilderOptions(builderClass,
+                            ignoreUnknown=True)
+                        result = pool.apply_async(_buildTemporaryTable,
+                            (builderClass, options, configuration,
+                                sharedTableStatements))
+                        running[builderClass] = (result, filePath)
+                        builderClasses.remove(builderClass)
+
+                # collect finished workers
+                for builderClass, (result, filePath) in running.items():
+                    if not result.ready():
+                        continue
+                    del running[builderClass]
+                    try:
+                        result.get()
+                    except (IOError, _BuildOperationalError), e:
+                        os.remove(filePath)
+                        if isinstance(e, _BuildOperationalError):
+                            # reading failed while the target database was
+                            #   busy with a merge, build again
+                            retries[builderClass] \
+                                = retries.get(builderClass, 0) + 1
+                            if retries[builderClass] <= self.BUSY_RETRIES:
+                                builderClasses.append(builderClass)
+                                continue
+                        # data not available, can't build table
+                        if not self.noFail:
+                            raise
+                        if not self.quiet:
+                            warn("Building table '%s' failed: '%s', skipping"
+                                % (builderClass.PROVIDES, str(e)))
+                        failedTables.add(builderClass.PROVIDES)
+                        continue
+                    except:
+                        os.remove(filePath)
+                        raise
+                    merging.append((builderClass, filePath))
+
+                # merge finished tables, workers still reading the target
+                #   database might lock it, so merges are retried later
+                merged = False
+                for builderClass, filePath in merging[:]:
+                    try:
+                        self._mergeTable(builderClass, filePath,
+                            buildDependentTables)
+                    except OperationalError:
+                        if not running:
+                            raise
+                        continue
+                    merging.remove((builderClass, filePath))
+                    os.remove(filePath)
+                    finishedTables.add(builderClass.PROVIDES)
+                    merged = True
+
+                if not merged:
+                    time.sleep(self.POLL_INTERVAL)
+        except:
+            pool.terminate()
+            for _, filePath in running.values() + merging:
+                os.remove(filePath)
+            raise
+        else:
+            pool.close()
+        pool.join()
+
+    def _getSharedTableStatements(self):
+        statements = []
+        for tableName in self.SHARED_TABLES:
+            if self.db.mainHasTable(tableName):
+                statements.append(self.db.selectScalar(
+                    "SELECT sql FROM sqlite_master WHERE type = 'table'"
+                    " AND name = '%s'" % tableName))
+        return statements
+
+    def _mergeTable(self, builderClass, filePath, buildDependentTables):
+        """
+        Copies the table built in the given temporary database into the target
+        database, replacing an eventually existing one.
+        """
+        self.db.execute("ATTACH DATABASE '%s' AS buildtemp"
+            % filePath.replace("'", "''"))
+        try:
+            schema = self.db.execute("SELECT type, name, sql"
+                " FROM buildtemp.sqlite_master WHERE sql IS NOT NULL")\
+                .fetchall()
+
+            # shadow tables are filled through their virtual table
+            virtualTables = [name for entryType, name, sql in schema
+                if sql.upper().startswith('CREATE VIRTUAL TABLE')]
+            tableNames = [name for entryType, name, _ in schema
+                if entryType == 'table' and name not in self.SHARED_TABLES
+                and not [virtual for virtual in virtualTables
+                    if name.startswith(virtual + '_')]]
+
+            transaction = self.db.connection.begin()
+            try:
+                instance = self._getInstance(builderClass, buildDependentTables)
+                self._removeTable(instance)
+
+                for entryType, name, sql in schema:
+                    if entryType == 'table' and name in tableNames:
+                        self.db.execute(sql)
+                        self.db.execute('INSERT INTO main."%s"'
+                            ' SELECT * FROM buildtemp."%s"' % (name, name))
+                for entryType, name, sql in schema:
+                    if entryType == 'index':
+                        self.db.execute(sql)
+
+                for tableName in self.SHARED_TABLES:
+                    if [1 for entryType, name, _ in schema
+                        if entryType == 'table' and name == tableName]:
+                        self.db.execute('INSERT OR REPLACE INTO main."%s"'
+                            ' SELECT * FROM buildtemp."%s"'
+                            % (tableName, tableName))
+            except:
+                transaction.rollback()
+                raise
+            transaction.commit()
+        finally:
+            self.db.execute("DETACH DATABASE buildtemp")
+
+
 class EclectusCommandLineBuilder(cli.CommandLineBuilder):
     DESCRIPTION = """Builds the database for Eclectus.
-Example: \"%prog build allAvail\""""
+Example: \"%prog build allAvail\", or \"%prog -j 4 build allAvail\" for a
+parallel build"""
 
     BUILD_GROUPS = {
         # source based
@@ -1197,17 +2292,19 @@ Example: \"%prog build allAvail\""""
             'KangxiRadicalStrokeCount', 'EDICT', 'CEDICT', 'CEDICTGR', 'CFDICT',
             'HanDeDict', 'UpdateVersion', 'Pronunciation_Pinyin',
             'Pronunciation_CantoneseYale', 'JISX0208Set', 'JISX0208_0213Set',
-            'EduTwIndex'],
+            'EduTwIndex', 'HeadwordIndex_CEDICT', 'HeadwordIndex_HanDeDict',
+            'HeadwordIndex_CFDICT'],
         'base': ['SimilarCharacters', 'KangxiRadicalTable',
             'KangxiRadicalStrokeCount', 'RadicalTable_zh_cmn__en',
             'EduTwIndex'],
         'zh-cmn': ['RadicalNames_zh_cmn', 'Pronunciation_Pinyin'],
         'ja': ['RadicalTable_ja__en', 'JISX0208Set', 'JISX0208_0213Set'],
         'EDICT_related': ['UpdateVersion'],
-        'CEDICT_related': ['UpdateVersion'],
+        'CEDICT_related': ['HeadwordIndex_CEDICT', 'UpdateVersion'],
         'CEDICTGR_related': ['UpdateVersion'],
-        'HanDeDict_related': ['RadicalTable_zh_cmn__de', 'UpdateVersion'],
-        'CFDICT_related': ['UpdateVersion'],
+        'HanDeDict_related': ['RadicalTable_zh_cmn__de',
+            'HeadwordIndex_HanDeDict', 'UpdateVersion'],
+        'CFDICT_related': ['HeadwordIndex_CFDICT', 'UpdateVersion'],
     }
 
     DB_PREFER_BUILDERS = ['WiktionaryHSKVocabularyBuilder',
@@ -1238,6 +2335,108 @@ Example: \"%prog build allAvail\""""
         options['additionalBuilders'] = cls.getTableBuilderClasses()
         return options
 
+    def buildParser(self):
+        parser = cli.CommandLineBuilder.buildParser(self)
+        parser.add_option("-j", "--jobs", action="store", type="int",
+            metavar="N", dest="jobs",
+            help="build independent tables in N processes (SQLite only)")
+        return parser
+
+    def getDatabaseBuilder(self, db, options):
+        """
+        Creates the database builder, a L{ParallelDatabaseBuilder} if several
+        jobs are requested.
+
+        @type db: L{DatabaseConnector}
+        @param db: database connection
+        @type options: dict
+        @param options: options of the builder
+        @raise ValueError: if the database doesn't support parallel builds
+        """
+        options = options.copy()
+        jobs = options.pop('jobs', None)
+        if jobs and jobs > 1:
+            return ParallelDatabaseBuilder(dbConnectInst=db, jobs=jobs,
+                **options)
+        else:
+            return DatabaseBuilder(dbConnectInst=db, **options)
+
+    def runBuild(self, buildGroupList, options):
+        # follows cli.CommandLineBuilder.runBuild(), creating the builder
+        #   through getDatabaseBuilder()
+        if not buildGroupList:
+            return
+        buildGroupList = set(buildGroupList)
+        # by default fail if a table couldn't be built
+        options['noFail'] = False
+        if 'all' in buildGroupList or 'allAvail' in buildGroupList:
+            if 'allAvail' in buildGroupList:
+                if len(buildGroupList) == 1:
+                    # don't fail on non available
+                    options['noFail'] = True
+                else:
+                    raise ValueError("group 'allAvail' can't be specified " \
+                        + "together with other groups.")
+            # if generic group given get list
+            buildGroupList = DatabaseBuilder.getSupportedTables()
+
+        deprecatedGroups = self._getDeprecated() & set(buildGroupList)
+        if deprecatedGroups:
+            warnings.warn("Group(s) '%s' is (are) deprecated"
+                    % "', '".join(deprecatedGroups)
+                + " and will disappear from future versions.",
+                category=DeprecationWarning)
+
+        # unpack groups
+        groups = []
+        while len(buildGroupList) != 0:
+            group = buildGroupList.pop()
+            if self.BUILD_GROUPS.has_key(group):
+                buildGroupList.update(self.BUILD_GROUPS[group])
+            else:
+                groups.append(group)
+
+        # re-add builders preferred by default, in case overwritten by user
+        preferredBuilderNames = options.get('prefer', [])
+        if preferredBuilderNames:
+            options['prefer'] = self._combinePreferred(preferredBuilderNames,
+                self.DB_PREFER_BUILDERS)
+
+        # get database connection
+        configuration = getDefaultConfiguration()
+        configuration['sqlalchemy.url'] = options.pop('databaseUrl',
+            configuration['sqlalchemy.url'])
+        configuration['attach'] = [attach for attach in
+            options.pop('attach', configuration.get('attach', [])) if attach]
+        if 'registerUnicode' in options:
+            configuration['registerUnicode'] = options.pop('registerUnicode')
+        try:
+            db = DatabaseConnector(configuration)
+            dbBuilder = self.getDatabaseBuilder(db, options)
+        except ValueError, e:
+            print >> sys.stderr, "Error: %s" % e
+            return False
+
+        try:
+            dbBuilder.build(groups)
+
+            print "finished"
+        except exception.UnsupportedError, e:
+            print >> sys.stderr, \
+                "Error building local tables, some names do not exist: %s" % e
+            return False
+        except KeyboardInterrupt:
+            print >> sys.stderr, "Keyboard interrupt."
+            try:
+                # remove temporary tables
+                dbBuilder.clearTemporary()
+            except KeyboardInterrupt:
+                print >> sys.stderr, \
+                    "Interrupted while cleaning temporary tables"
+            return False
+
+        return True
+
     @classmethod
     def getTableBuilderClasses(cls):
         """
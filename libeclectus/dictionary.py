@@ -15,21 +15,26 @@ __all__ = [
     "ExtendedCFDICT"]
 
 import re
+import os
+import time
 import random
 import types
+from itertools import ifilter, imap, islice
 
-from sqlalchemy import select
+from sqlalchemy import select, bindparam
 from sqlalchemy.sql import and_, or_, func
 
 from cjklib.dictionary import EDICT, CEDICT, CEDICTGR, HanDeDict, CFDICT
 from cjklib.dictionary import search, format, entry, EDICTStyleDictionary
 from cjklib.reading import ReadingFactory
 from cjklib import exception
-from cjklib.util import cross
+from cjklib.util import cross, getCharacterList
 from cjklib.dbconnector import getDBConnector
 
 from libeclectus.chardb import CharacterDB
 from libeclectus import util
+from libeclectus.memorydictionary import MemoryDictionary
+from libeclectus.binarydictionary import BinaryDictionary
 
 search.setDefaultWildcards(singleCharacter='?', multipleCharacters='*')
 
@@ -149,16 +154,30 @@ def getDictionaryClass(dictionaryName):
         raise ValueError('Not a supported dictionary')
     return _dictionaryMap[dictionaryName]
 
-def getDictionary(dictionaryName, dbConnectInst=None, **options):
+def getDictionary(dictionaryName, dbConnectInst=None, engine='sql',
+    **options):
     """
     Get a dictionary instance by dictionary name. Returns C{None} if the
     dictionary is not available.
 
     @type dictionaryName: str
     @param dictionaryName: dictionary name
+    @type engine: str
+    @param engine: C{'sql'} to search the database (default), C{'memory'} to
+        load the dictionary into memory once and search there, see
+        L{MemoryDictionary}, C{'mmap'} to search a binary dictionary file
+        written by L{binarydictionary.exportDictionary()}, see
+        L{BinaryDictionary}
+    @keyword dictionaryFile: path of the binary dictionary file for engine
+        C{'mmap'}, by default C{<dictionaryName>.ecd} is located in the data
+        paths
     @rtype: type
     @return: dictionary instance
     """
+    if engine not in ('sql', 'memory', 'mmap'):
+        raise ValueError("Unsupported dictionary engine '%s'" % engine)
+    dictionaryFile = options.pop('dictionaryFile', None)
+
     dbConnectInst = dbConnectInst or getDBConnector()
     if dictionaryName.startswith('PSEUDO_'):
         language = dictionaryName[7:]
@@ -170,6 +189,17 @@ def getDictionary(dictionaryName, dbConnectInst=None, **options):
         dictCls = getDictionaryClass(dictionaryName)
         if not dictCls.available(dbConnectInst):
             return None
+        elif engine == 'memory':
+            return MemoryDictionary(
+                dictCls(dbConnectInst=dbConnectInst, **options))
+        elif engine == 'mmap':
+            dictionaryFile = (dictionaryFile
+                or util.locatePath('%s.ecd' % dictionaryName))
+            if not dictionaryFile or not os.path.exists(dictionaryFile):
+                return None
+            return BinaryDictionary(
+                dictCls(dbConnectInst=dbConnectInst, **options),
+                dictionaryFile)
         else:
             return dictCls(dbConnectInst=dbConnectInst, **options)
 
@@ -366,6 +396,146 @@ class CEDICTEntry(EDICTEntry):
 
 #{ search strategies
 
+def _getPrefixSuccessor(prefix):
+    """
+    Gets the smallest string sorting after all strings starting with the given
+    prefix under binary collation.
+
+    @type prefix: str
+    @param prefix: non-empty prefix
+    @rtype: str
+    @return: successor of the prefix, or C{None} if none can be given
+    """
+    code = ord(prefix[-1])
+    # leave surrogates and the end of the BMP to LIKE
+    if 0xD7FF <= code < 0xE000 or code >= 0xFFFF:
+        return None
+    return prefix[:-1] + unichr(code + 1)
+
+
+class _LengthIndexBase(object):
+    """
+    Partial class for search strategies that narrows down wildcard searches of
+    fixed length using the indexed length columns that are provided by the
+    weighted dictionary builders.
+    """
+    LENGTH_COLUMNS = {}
+    """Mapping of searched column to the column holding its length."""
+
+    def _getLengthClause(self, column, lengths):
+        """
+        Gets an equality clause on the length column of the given column.
+
+        @type column: object
+        @param column: searched column
+        @type lengths: list of int
+        @param lengths: possible lengths
+        @return: where clause, or C{None} if no length column exists or no
+            lengths are given
+        """
+        table = column.table
+        lengthColumn = self.LENGTH_COLUMNS.get(column.name, None)
+        if (not lengths or not lengthColumn
+            or lengthColumn not in table.columns):
+            return None
+
+        lengths = sorted(set(lengths))
+        if len(lengths) == 1:
+            return table.c[lengthColumn] == lengths[0]
+        else:
+            return table.c[lengthColumn].in_(lengths)
+
+
+class PrefixWildcard(_LengthIndexBase, search.Wildcard):
+    """
+    Headword search strategy with support for wildcards. Searches for a prefix,
+    e.g. C{'中*'}, are done by a range on the column so that its index can
+    be used, as SQLite will not use an index for C{LIKE}. Searches of fixed
+    length, e.g. C{'对?起'}, are narrowed down by the headword's length.
+    """
+    LENGTH_COLUMNS = {'Headword': 'HeadwordLength',
+        'HeadwordTraditional': 'HeadwordLength',
+        'HeadwordSimplified': 'HeadwordLength'}
+
+    def __init__(self, *args, **options):
+        search.Wildcard.__init__(self, *args, **options)
+        self._rangeSupport = False
+
+    def setDictionaryInstance(self, dictInstance):
+        search.Wildcard.setDictionaryInstance(self, dictInstance)
+        # ranges only agree with LIKE under binary collation
+        self._rangeSupport = (dictInstance.db.engine.name == 'sqlite'
+            and not self._caseInsensitive and not self._sqlCollation)
+
+    def _getPrefix(self, searchStr):
+        """
+        Gets the prefix of a search string that has only wildcards matching
+        multiple characters at its end.
+
+        @type searchStr: str
+        @param searchStr: search string
+        @rtype: str
+        @return: prefix, or C{None} if the search string is no plain prefix
+            search
+        """
+        entities = self._parseWildcardString(searchStr)
+        prefix = []
+        while entities and isinstance(entities[0], basestring):
+            prefix.append(entities.pop(0))
+        if not prefix or not entities:
+            return None
+        for entity in entities:
+            if not isinstance(entity, self.MultipleWildcard):
+                return None
+
+        return ''.join(prefix)
+
+    def _getLength(self, searchStr):
+        """
+        Gets the length of strings matched by the given search string.
+
+        @type searchStr: str
+        @param searchStr: search string
+        @rtype: int
+        @return: length, or C{None} if the length is not fixed
+        """
+        length = 0
+        for entity in self._parseWildcardString(searchStr):
+            if isinstance(entity, basestring):
+                length += len(getCharacterList(entity))
+            elif isinstance(entity, self.SingleWildcard):
+                length += 1
+            else:
+                return None
+
+        return length
+
+    def getWhereClause(self, column, searchStr, **options):
+        if not self._hasWildcardCharacters(searchStr):
+            return search.Wildcard.getWhereClause(self, column, searchStr,
+                **options)
+
+        if self._fullwidthCharacters:
+            searchStr = search._mapToFullwidth(searchStr)
+
+        if self._rangeSupport:
+            prefix = self._getPrefix(searchStr)
+            if prefix:
+                successor = _getPrefixSuccessor(prefix)
+                if successor:
+                    return and_(column >= prefix, column < successor)
+
+        clause = search.Wildcard.getWhereClause(self, column, searchStr,
+            **options)
+        length = self._getLength(searchStr)
+        if length is not None:
+            lengthClause = self._getLengthClause(column, [length])
+            if lengthClause is not None:
+                return and_(lengthClause, clause)
+
+        return clause
+
+
 class HeadwordEntity(search.Exact):
     """
     Exact search strategy class matching any single Chinese character from a
@@ -392,9 +562,23 @@ class HeadwordEntity(search.Exact):
         @param readingStr: reading string
         @return: SQLAlchemy clause
         """
-        characters = self._getCharacters(headwordStr)
+        characters, = self.getWhereClauseValues(headwordStr, readingStr)
         return headwordColumn.in_(characters)
 
+    def getWhereClauseValues(self, headwordStr, readingStr):
+        """
+        Gets the values the columns given to L{getWhereClause()} are matched
+        against.
+
+        @type headwordStr: str
+        @param headwordStr: headword string
+        @type readingStr: str
+        @param readingStr: reading string
+        @rtype: list
+        @return: list of values for each column
+        """
+        return [self._getCharacters(headwordStr)]
+
     def getMatchFunction(self, headwordStr, readingStr):
         """
         Gets a function that returns C{True} if the entry matches any of the
@@ -471,18 +655,168 @@ class HeadwordEntityReading(HeadwordEntity):
 
     def getWhereClause(self, headwordColumn, readingColumn, headwordStr,
         readingStr, **options):
-        pairs = self._getCharacters(headwordStr, readingStr, **options)
         # quick search, will be filtered later
-        chars, readingEntities = zip(*pairs)
+        chars, readingEntities = self.getWhereClauseValues(headwordStr,
+            readingStr, **options)
 
         return and_(headwordColumn.in_(chars),
             readingColumn.in_(readingEntities))
 
+    def getWhereClauseValues(self, headwordStr, readingStr, **options):
+        pairs = self._getCharacters(headwordStr, readingStr, **options)
+        chars, readingEntities = zip(*pairs)
+        return [list(chars), list(readingEntities)]
+
     def getMatchFunction(self, headwordStr, readingStr, **options):
         pairs = self._getCharacters(headwordStr, readingStr, **options)
         return lambda headword, reading: (headword, reading) in pairs
 
 
+class _PlainReadingIndexBase(_LengthIndexBase):
+    """
+    Partial class for reading search strategies that narrows down searches
+    using the indexed plain reading column (lower case, without tones) and
+    syllable count that are provided by the weighted dictionary builders.
+    """
+    PLAIN_READING_COLUMN = 'ReadingPlain'
+    """Column holding the plain reading."""
+    LENGTH_COLUMNS = {'Reading': 'ReadingSyllables'}
+
+    class TonalEntityWildcard(search._TonelessReadingWildcardBase \
+        .TonalEntityWildcard):
+        """
+        Wildcard matching a reading entity with any tone, giving access to the
+        plain entity.
+        """
+        def __init__(self, plainEntity, escape):
+            search._TonelessReadingWildcardBase.TonalEntityWildcard.__init__(
+                self, plainEntity, escape)
+            self.plainEntity = plainEntity
+
+    def _getPlainReadings(self, searchStr, **options):
+        """
+        Gets the plain readings of all wildcard forms of the given search
+        string. A form ending in wildcards matching multiple entities gives
+        its plain prefix.
+
+        @type searchStr: str
+        @param searchStr: search string
+        @rtype: set
+        @return: pairs of plain reading and C{True} if it is a prefix, or
+            C{None} if a form includes an entity with no fixed plain form
+        """
+        plainReadings = set()
+        for entities in self._getWildcardForms(searchStr, **options):
+            plainEntities = []
+            isPrefix = False
+            for entity in entities:
+                if isPrefix:
+                    if not isinstance(entity, self.MultipleWildcard):
+                        return None
+                elif isinstance(entity, basestring):
+                    plainEntities.append(entity)
+                elif hasattr(entity, 'plainEntity'):
+                    plainEntities.append(entity.plainEntity)
+                elif (isinstance(entity, self.MultipleWildcard)
+                    and plainEntities):
+                    isPrefix = True
+                else:
+                    return None
+            plainReadings.add(
+                (util.getPlainReading(' '.join(plainEntities)), isPrefix))
+
+        return plainReadings
+
+    def _getPlainReadingClause(self, column, searchStr, **options):
+        """
+        Gets a clause on the plain reading column for the given search string,
+        using equality for complete readings and a range for prefixes.
+
+        @type column: object
+        @param column: reading column
+        @type searchStr: str
+        @param searchStr: search string
+        @return: where clause, or C{None} if no plain reading column exists or
+            the search string has no fixed plain form
+        """
+        table = column.table
+        if self.PLAIN_READING_COLUMN not in table.columns:
+            return None
+
+        plainReadings = self._getPlainReadings(searchStr, **options)
+        if not plainReadings:
+            return None
+
+        plainColumn = table.c[self.PLAIN_READING_COLUMN]
+        clauses = []
+        readings = sorted([reading for reading, isPrefix in plainReadings
+            if not isPrefix])
+        if readings:
+            clauses.append(plainColumn.in_(readings))
+        for prefix in sorted([reading for reading, isPrefix in plainReadings
+            if isPrefix]):
+            successor = _getPrefixSuccessor(prefix)
+            if not successor:
+                return None
+            clauses.append(and_(plainColumn >= prefix, plainColumn < successor))
+
+        return or_(*clauses)
+
+    def _getSyllableCounts(self, searchStr, **options):
+        """
+        Gets the syllable counts of all wildcard forms of the given search
+        string.
+
+        @type searchStr: str
+        @param searchStr: search string
+        @rtype: list of int
+        @return: syllable counts, or C{None} if a form has no fixed count
+        """
+        counts = []
+        for entities in self._getWildcardForms(searchStr, **options):
+            for entity in entities:
+                if isinstance(entity, self.MultipleWildcard):
+                    return None
+            counts.append(len(entities))
+
+        return counts
+
+    def _getIndexClause(self, column, searchStr, **options):
+        """
+        Gets a clause on the indexed plain reading or, failing that, on the
+        syllable count.
+
+        @type column: object
+        @param column: reading column
+        @type searchStr: str
+        @param searchStr: search string
+        @return: where clause, or C{None} if no index can be used
+        """
+        clause = self._getPlainReadingClause(column, searchStr, **options)
+        if clause is None:
+            clause = self._getLengthClause(column,
+                self._getSyllableCounts(searchStr, **options))
+        return clause
+
+
+class IndexedTonelessWildcardReading(_PlainReadingIndexBase,
+    search.TonelessWildcardReading):
+    """
+    Reading based search strategy with support for missing tonal information and
+    wildcards. Searches are done on the indexed plain reading column wherever
+    possible, e.g. for C{'tianan'}, and else narrowed down by the syllable
+    count, e.g. for C{'dui?qi'}.
+    """
+    def getWhereClause(self, column, searchStr, **options):
+        clause = search.TonelessWildcardReading.getWhereClause(self, column,
+            searchStr, **options)
+        indexClause = self._getIndexClause(column, searchStr, **options)
+        if indexClause is not None:
+            return and_(indexClause, clause)
+        else:
+            return clause
+
+
 class _SimilarReadingWildcardBase(search._TonelessReadingWildcardBase):
     """
     Wildcard search base class for similar readings.
@@ -531,7 +865,8 @@ class _SimilarReadingWildcardBase(search._TonelessReadingWildcardBase):
         return self._wildcardForms
 
 
-class SimilarWildcardReading(search.SimpleReading, _SimilarReadingWildcardBase):
+class SimilarWildcardReading(_PlainReadingIndexBase, search.SimpleReading,
+    _SimilarReadingWildcardBase):
     """
     Reading based search strategy with support similar readings. For tonal
     readings other tonal combinations will be searched and if supported,
@@ -545,11 +880,17 @@ class SimilarWildcardReading(search.SimpleReading, _SimilarReadingWildcardBase):
     def getWhereClause(self, column, searchStr, **options):
         if self._hasWildcardForms(searchStr, **options):
             queries = self._getWildcardQuery(searchStr, **options)
-            return or_(*[self._like(column, query) for query in queries])
+            clause = or_(*[self._like(column, query) for query in queries])
         else:
             # exact lookup
             queries = self._getSimpleQuery(searchStr, **options)
-            return or_(*[self._equals(column, query) for query in queries])
+            clause = or_(*[self._equals(column, query) for query in queries])
+
+        indexClause = self._getIndexClause(column, searchStr, **options)
+        if indexClause is not None:
+            return and_(indexClause, clause)
+        else:
+            return clause
 
     def getMatchFunction(self, searchStr, **options):
         if self._hasWildcardForms(searchStr, **options):
@@ -680,11 +1021,27 @@ class ExactMultiple(search.Exact):
     def getWhereClause(self, column, headwordStr):
         return column.in_(self._getSubstrings(headwordStr))
 
+    def getWhereClauseValues(self, headwordStr):
+        return [self._getSubstrings(headwordStr)]
+
     def getMatchFunction(self, headwordStr):
         searchStrings = self._getSubstrings(headwordStr)
         return lambda cell: cell in searchStrings
 
 
+class ExactList(search.Exact):
+    """Exact search strategy class matching any string of a given list."""
+    def getWhereClause(self, column, headwords):
+        return column.in_(headwords)
+
+    def getWhereClauseValues(self, headwords):
+        return [list(headwords)]
+
+    def getMatchFunction(self, headwords):
+        searchStrings = set(headwords)
+        return lambda cell: cell in searchStrings
+
+
 class HeadwordVariant(search.Exact):
     """Search strategy class matching variants of a given headword."""
     def setDictionaryInstance(self, dictInstance):
@@ -707,6 +1064,9 @@ class HeadwordVariant(search.Exact):
         else:
             return None
 
+    def getWhereClauseValues(self, headwordStr):
+        return [list(self._getPossibleHeadwordVariants(headwordStr))]
+
     def getMatchFunction(self, headwordStr):
         searchStrings = self._getPossibleHeadwordVariants(headwordStr)
         return lambda cell: cell in searchStrings
@@ -734,12 +1094,85 @@ class HeadwordSimilar(search.Exact):
         else:
             return None
 
+    def getWhereClauseValues(self, headwordStr):
+        return [list(self._getPossibleHeadwordSimilars(headwordStr))]
+
     def getMatchFunction(self, headwordStr):
         searchStrings = self._getPossibleHeadwordSimilars(headwordStr)
         return lambda cell: cell in searchStrings
 
+class _ParameterizedInStrategy(object):
+    """
+    Stands in for a search strategy matching columns against lists of values,
+    placing bind parameters instead of the values into the where clause.
+    Statements built this way can be compiled once and reused for all
+    searches with the same number of values.
+    """
+    def __init__(self, strategy, parameterLists):
+        """
+        Initialises the _ParameterizedInStrategy instance.
+
+        @param strategy: search strategy providing C{getWhereClauseValues()}
+        @type parameterLists: list
+        @param parameterLists: list of bind parameters for each column
+        """
+        self._strategy = strategy
+        self._parameterLists = parameterLists
+
+    def getWhereClause(self, *args, **options):
+        columns = args[:len(self._parameterLists)]
+        return and_(*[column.in_(parameters) for column, parameters
+            in zip(columns, self._parameterLists)])
+
+    def getMatchFunction(self, *args, **options):
+        return self._strategy.getMatchFunction(*args, **options)
+
 #{ dictionary classes
 
+def _getBucketSize(count):
+    """
+    Gets the number of bind parameters used for a list of the given number of
+    values, rounded up to the next power of two to limit the number of
+    distinct statements.
+
+    @type count: int
+    @param count: number of values
+    @rtype: int
+    @return: number of bind parameters
+    """
+    size = 1
+    while size < count:
+        size *= 2
+    return size
+
+def _getKeysetClause(keyColumns, key):
+    """
+    Gets a clause matching all rows ordered after the given key, i.e. the
+    row value of the key columns compared lexicographically. NULL values are
+    ordered before all others, as done by SQLite.
+
+    @type keyColumns: list
+    @param keyColumns: columns the rows are ordered by
+    @type key: tuple
+    @param key: values of the key columns of the last row already fetched
+    @return: SQLAlchemy clause
+    """
+    def getGreaterClause(column, value):
+        # NULL values are ordered first
+        if value is None:
+            return column != None
+        else:
+            return column > value
+
+    clauses = []
+    for idx, column in enumerate(keyColumns):
+        # comparing with None gives IS NULL
+        equalClauses = [keyColumns[i] == key[i] for i in range(idx)]
+        clauses.append(and_(*(equalClauses
+            + [getGreaterClause(column, key[idx])])))
+    return or_(*clauses)
+
+
 class _ExtendedDictionarySupport(object):
     """
     Partial class that adds further searching capabilities to dictionaries:
@@ -748,12 +1181,33 @@ class _ExtendedDictionarySupport(object):
         - Search for similar pronunciations
         - Search for similar pronunciations mixed with headword
         - Get a random entry
+        - Page through results without fetching preceding entries
+        - Cache search results
 
     TODO
     Further features:
         - Unify entries with same headword
         - Split entries with different translation fields
     """
+    CACHED_METHODS = ['getFor', 'getForHeadword', 'getForReading',
+        'getForTranslation', 'getEntitiesForHeadword',
+        'getSubstringsForHeadword', 'getForSimilarReading',
+        'getVariantsForHeadword', 'getSimilarsForHeadword']
+    """Search methods served from the result cache if enabled."""
+
+    VERSION_CHECK_INTERVAL = 5
+    """
+    Seconds for which a dictionary version is trusted before checking for an
+    update again.
+    """
+
+    CACHED_STATEMENT_MAX_VALUES = 128
+    """
+    Maximum number of values searched with a reused compiled statement.
+    Padding larger lists could exceed SQLite's limit of 999 bind parameters,
+    as lists are repeated for each script searched.
+    """
+
     def __init__(self, **options):
         """
         Initialises the _ExtendedDictionarySupport instance.
@@ -762,6 +1216,8 @@ class _ExtendedDictionarySupport(object):
             strategy instance
         @keyword headwordSubstringSearchStrategy: headword substring search
             strategy instance
+        @keyword resultCacheSize: number of search results kept in memory,
+            C{None} to disable the result cache
         """
         self.language = options.get('language', None)
         if not self.language:
@@ -804,6 +1260,15 @@ class _ExtendedDictionarySupport(object):
             'setDictionaryInstance'):
             self.headwordSubstringSearchStrategy.setDictionaryInstance(self)
 
+        if 'headwordListSearchStrategy' in options:
+            self.headwordListSearchStrategy \
+                = options['headwordListSearchStrategy']
+        else:
+            self.headwordListSearchStrategy = ExactList()
+            """Strategy for searching a list of headwords."""
+        if hasattr(self.headwordListSearchStrategy, 'setDictionaryInstance'):
+            self.headwordListSearchStrategy.setDictionaryInstance(self)
+
         if 'readingSimilarSearchStrategy' in options:
             self.readingSimilarSearchStrategy \
                 = options['readingSimilarSearchStrategy']
@@ -847,12 +1312,99 @@ class _ExtendedDictionarySupport(object):
         dictionaryTable = self.db.tables[self.DICTIONARY_TABLE]
         self._dictionaryPrefer = 'Weight' in dictionaryTable.columns
 
+        self._eligibleEntryIds = {}
+        """Ids of entries eligible for random selection, per constraint."""
+
+        self._statementCache = {}
+        """Compiled search statements by search, strategy and shape."""
+
+        self._version = None
+        self._versionChecked = None
+        resultCacheSize = options.get('resultCacheSize', None)
+        if resultCacheSize:
+            self._resultCache = util.LRUCache(resultCacheSize)
+            """Search results by method and arguments."""
+            for method in self.CACHED_METHODS:
+                if hasattr(self, method):
+                    setattr(self, method,
+                        self._getCachingMethod(getattr(self, method)))
+        else:
+            self._resultCache = None
+
+    def _getVersion(self):
+        """
+        Gets the release date of the dictionary as stored on installation.
+
+        @return: release date, C{None} if unknown
+        """
+        if not self.db.hasTable('UpdateVersion'):
+            return None
+        table = self.db.tables['UpdateVersion']
+        return self.db.selectScalar(select([table.c.ReleaseDate],
+            table.c.TableName == self.DICTIONARY_TABLE))
+
+    def _checkVersion(self):
+        """
+        Drops cached data if the dictionary was updated since last checked.
+        Checks are done at most once per L{VERSION_CHECK_INTERVAL}.
+        """
+        now = time.time()
+        if (self._versionChecked is not None
+            and now - self._versionChecked < self.VERSION_CHECK_INTERVAL):
+            return
+        self._versionChecked = now
+
+        version = self._getVersion()
+        if version != self._version:
+            self._version = version
+            if self._resultCache is not None:
+                self._resultCache.clear()
+            self._eligibleEntryIds = {}
+
+    @staticmethod
+    def _getHashable(value):
+        """Converts lists and dicts to tuples for use as a cache key."""
+        if type(value) == type([]):
+            return tuple([_ExtendedDictionarySupport._getHashable(item)
+                for item in value])
+        elif type(value) == type({}):
+            items = value.items()
+            items.sort()
+            return tuple([(key, _ExtendedDictionarySupport._getHashable(item))
+                for key, item in items])
+        return value
+
+    def _getCachingMethod(self, method):
+        """
+        Wraps the given search method to serve results from the result cache.
+        Results are keyed by method, arguments, reading and character domain.
+        """
+        def cachingMethod(*args, **options):
+            self._checkVersion()
+
+            key = (method.__name__, self._getHashable(list(args)),
+                self._getHashable(options), self.reading,
+                self.charDB.characterDomain)
+            entries = self._resultCache.get(key)
+            if entries is None:
+                entries = list(method(*args, **options))
+                self._resultCache[key] = entries
+            return entries[:]
+
+        cachingMethod.__name__ = method.__name__
+        cachingMethod.__doc__ = method.__doc__
+        return cachingMethod
+
     def _checkOrderByWeight(self, orderBy):
         if orderBy and 'Weight' in orderBy:
             if self._dictionaryPrefer:
                 dictionaryTable = self.db.tables[self.DICTIONARY_TABLE]
 
-                orderByWeight = func.ifnull(dictionaryTable.c.Weight, 100)
+                if 'SortWeight' in dictionaryTable.columns:
+                    # non-null key, indexed together with the search columns
+                    orderByWeight = dictionaryTable.c.SortWeight
+                else:
+                    orderByWeight = func.ifnull(dictionaryTable.c.Weight, 100)
                 orderBy[orderBy.index('Weight')] =  orderByWeight
             else:
                 orderBy.remove('Weight')
@@ -875,46 +1427,302 @@ class _ExtendedDictionarySupport(object):
                 return classObj.guessReadingDialect(string)
         return {}
 
-    def _getHeadwordEntitiesSearch(self, headwordStr, readingStr, **options):
+    def _getOrderByColumns(self, orderBy):
+        """
+        Gets the columns to order by, substituting the indexed sort weight for
+        column 'Weight'.
+
+        @type orderBy: list
+        @param orderBy: list of column names or SQLAlchemy column objects
+        @rtype: list
+        @return: SQLAlchemy column objects
+        """
         dictionaryTable = self.db.tables[self.DICTIONARY_TABLE]
 
-        headwordEntitiesClause \
-            = self.headwordEntitiesSearchStrategy.getWhereClause(
-                dictionaryTable.c.Headword, dictionaryTable.c.Reading,
-                headwordStr, readingStr, **options)
+        if orderBy is None:
+            orderBy = []
+        elif type(orderBy) != type([]):
+            orderBy = [orderBy]
+        else:
+            orderBy = orderBy[:]
+        self._checkOrderByWeight(orderBy)
+
+        orderByCols = []
+        for col in orderBy:
+            if isinstance(col, basestring):
+                col = dictionaryTable.c[col]
+            orderByCols.append(col)
+        return orderByCols
+
+    def _getFilterFunction(self, filters):
+        """
+        Gets a function telling if a row is matched by any of the given
+        filters.
+
+        @type filters: list
+        @param filters: list of columns and match functions
+        @return: function taking a row, C{None} if no filters are given
+        """
+        if not filters:
+            return None
+
+        functionList = []
+        for columns, function in filters:
+            columnsIdx = [self.COLUMNS.index(column) for column in columns]
+            functionList.append((columnsIdx, function))
+
+        def anyFunc(row):
+            for columnsIdx, function in functionList:
+                if function(*[row[idx] for idx in columnsIdx]):
+                    return True
+            return False
+
+        return anyFunc
+
+    def _iterFormat(self, results):
+        """
+        Formats the given rows and creates entries, one row at a time.
+
+        @param results: iterable of table rows
+        @return: iterator of entries
+        """
+        # column strategies are adapted to whole rows, a strategy for the
+        #   full row comes last
+        formatStrategies = self._formatStrategies
+
+        for row in results:
+            # format readings and translations
+            if formatStrategies:
+                rowList = list(row)
+                for formatStrategy in formatStrategies:
+                    rowList = formatStrategy.format(rowList)
+                row = tuple(rowList)
+
+            for entry in self.entryFactory.getEntries([row]):
+                yield entry
+
+    def _iterSearch(self, whereClause, filters, orderBy):
+        """
+        Does the search for a given where clause, yielding entries while rows
+        are read from the database. Unlike with a limited search, rows dropped
+        by the filters don't reduce the number of entries available.
+
+        @return: iterator of entries
+        """
+        dictionaryTable = self.db.tables[self.DICTIONARY_TABLE]
+
+        results = self.db.iterRows(
+            select([dictionaryTable.c[col] for col in self.COLUMNS],
+                whereClause, distinct=True)\
+            .order_by(*self._getOrderByColumns(orderBy)))
+
+        filterFunction = self._getFilterFunction(filters)
+        if filterFunction:
+            results = ifilter(filterFunction, results)
+
+        return self._iterFormat(results)
+
+    def _iterCachedSearch(self, searchFunc, strategy, searchArgs, orderBy,
+        **options):
+        """
+        Does the search of a strategy matching columns against lists of
+        values, reusing the compiled statement of an earlier search of the same
+        shape. Values are passed as bind parameters, their number rounded up to
+        the next power of two by repeating the last value.
+
+        Strategies without C{getWhereClauseValues()} and searches with more
+        than L{CACHED_STATEMENT_MAX_VALUES} values are searched the usual way.
+
+        @param searchFunc: method returning clauses and filters for the search
+            arguments, taking the strategy as keyword C{strategy}
+        @param strategy: search strategy
+        @type searchArgs: tuple
+        @param searchArgs: search arguments passed to the strategy
+        @return: iterator of entries
+        """
+        def iterSearch():
+            clauses, filters = searchFunc(*searchArgs, **options)
+            if not clauses:
+                return iter([])
+            return self._iterSearch(or_(*clauses), filters, orderBy)
+
+        if not hasattr(strategy, 'getWhereClauseValues'):
+            return iterSearch()
+
+        valueLists = [list(values) for values
+            in strategy.getWhereClauseValues(*searchArgs, **options)]
+        if [values for values in valueLists if not values]:
+            # an empty list matches nothing
+            return iter([])
+        if sum([len(values) for values in valueLists]) \
+            > self.CACHED_STATEMENT_MAX_VALUES:
+            return iterSearch()
+
+        if orderBy is not None and type(orderBy) != type([]):
+            orderBy = [orderBy]
+        sizes = tuple([_getBucketSize(len(values)) for values in valueLists])
+        key = (searchFunc.__name__, strategy.__class__, sizes,
+            tuple([unicode(col) for col in (orderBy or [])]))
+
+        if key not in self._statementCache:
+            parameterLists = [
+                [bindparam('value%d_%d' % (listIdx, idx))
+                    for idx in range(size)]
+                for listIdx, size in enumerate(sizes)]
+            clauses, filters = searchFunc(*searchArgs, **dict(options,
+                strategy=_ParameterizedInStrategy(strategy, parameterLists)))
+
+            dictionaryTable = self.db.tables[self.DICTIONARY_TABLE]
+            statement = select(
+                [dictionaryTable.c[col] for col in self.COLUMNS],
+                or_(*clauses), distinct=True)\
+                .order_by(*self._getOrderByColumns(orderBy))\
+                .compile(bind=self.db.engine)
+            # all filters share the strategy's match function
+            self._statementCache[key] = (statement,
+                [columns for columns, _ in filters])
+
+        statement, filterColumns = self._statementCache[key]
+
+        parameters = {}
+        for listIdx, values in enumerate(valueLists):
+            values = values + [values[-1]] * (sizes[listIdx] - len(values))
+            for idx, value in enumerate(values):
+                parameters['value%d_%d' % (listIdx, idx)] = value
+
+        matchFunc = strategy.getMatchFunction(*searchArgs, **options)
+        results = imap(self.db._decode, self.db.execute(statement, parameters))
+
+        filterFunction = self._getFilterFunction(
+            [(columns, matchFunc) for columns in filterColumns])
+        if filterFunction:
+            results = ifilter(filterFunction, results)
+
+        return self._iterFormat(results)
+
+    def _getForSearch(self, searchStr, **options):
+        clauseList = []
+        filterList = []
+        for searchFunc in (self._getHeadwordSearch, self._getReadingSearch,
+            self._getTranslationSearch):
+            try:
+                clauses, filters = searchFunc(searchStr, **options)
+            except exception.ConversionError:
+                continue
+            clauseList.extend(clauses)
+            filterList.extend(filters)
+
+        return clauseList, filterList
 
-        headwordEntitiesMatchFunc \
-            = self.headwordEntitiesSearchStrategy.getMatchFunction(
-                headwordStr, readingStr, **options)
+    def iterFor(self, searchStr, orderBy=None, **options):
+        """
+        Gets an iterator of dictionary entries whose headword, reading or
+        translation matches the given string. Entries are read from the
+        database as the iterator is advanced, so callers only interested in
+        the first entries can stop early.
+
+        @type orderBy: list
+        @param orderBy: list of column names or SQLAlchemy column objects giving
+            the order of returned entries
+        @return: iterator of entries
+        """
+        options.update(self._getReadingOptions(searchStr))
+        clauses, filters = self._getForSearch(searchStr, **options)
+
+        return self._iterSearch(or_(*clauses), filters, orderBy)
+
+    def iterForHeadword(self, headwordStr, orderBy=None, **options):
+        """
+        Gets an iterator of dictionary entries whose headword matches the given
+        string. See L{iterFor()}.
+        """
+        clauses, filters = self._getHeadwordSearch(headwordStr, **options)
+
+        return self._iterSearch(or_(*clauses), filters, orderBy)
+
+    def iterForReading(self, readingStr, orderBy=None, **options):
+        """
+        Gets an iterator of dictionary entries whose reading matches the given
+        string. See L{iterFor()}.
+        """
+        options.update(self._getReadingOptions(readingStr))
+        clauses, filters = self._getReadingSearch(readingStr, **options)
+
+        return self._iterSearch(or_(*clauses), filters, orderBy)
+
+    def _getHeadwordEntitiesSearch(self, headwordStr, readingStr,
+        strategy=None, **options):
+        dictionaryTable = self.db.tables[self.DICTIONARY_TABLE]
+        strategy = strategy or self.headwordEntitiesSearchStrategy
+
+        headwordEntitiesClause = strategy.getWhereClause(
+            dictionaryTable.c.Headword, dictionaryTable.c.Reading,
+            headwordStr, readingStr, **options)
+
+        headwordEntitiesMatchFunc = strategy.getMatchFunction(headwordStr,
+            readingStr, **options)
 
         return ([headwordEntitiesClause],
             [(['Headword', 'Reading'], headwordEntitiesMatchFunc)])
 
-    def getEntitiesForHeadword(self, headwordStr, readingStr=None, limit=None,
+    def iterEntitiesForHeadword(self, headwordStr, readingStr=None,
         orderBy=None, **options):
         # TODO raises conversion error
-        clauses, filters = self._getHeadwordEntitiesSearch(headwordStr,
-            readingStr, **options)
+        return self._iterCachedSearch(self._getHeadwordEntitiesSearch,
+            self.headwordEntitiesSearchStrategy, (headwordStr, readingStr),
+            orderBy, **options)
 
-        return self._search(or_(*clauses), filters, limit, orderBy)
+    def getEntitiesForHeadword(self, headwordStr, readingStr=None, limit=None,
+        orderBy=None, **options):
+        return list(islice(self.iterEntitiesForHeadword(headwordStr,
+            readingStr, orderBy=orderBy, **options), limit))
 
-    def _getHeadwordSubstringSearch(self, headwordStr, **options):
+    def _getHeadwordSubstringSearch(self, headwordStr, strategy=None,
+        **options):
         dictionaryTable = self.db.tables[self.DICTIONARY_TABLE]
+        strategy = strategy or self.headwordSubstringSearchStrategy
 
-        headwordSubstringClause \
-            = self.headwordSubstringSearchStrategy.getWhereClause(
-                dictionaryTable.c.Headword, headwordStr)
+        headwordSubstringClause = strategy.getWhereClause(
+            dictionaryTable.c.Headword, headwordStr)
 
-        headwordSubstringMatchFunc \
-            = self.headwordSubstringSearchStrategy.getMatchFunction(headwordStr)
+        headwordSubstringMatchFunc = strategy.getMatchFunction(headwordStr)
 
         return ([headwordSubstringClause],
             [(['Headword'], headwordSubstringMatchFunc)])
 
+    def iterSubstringsForHeadword(self, headwordStr, orderBy=None):
+        return self._iterCachedSearch(self._getHeadwordSubstringSearch,
+            self.headwordSubstringSearchStrategy, (headwordStr, ), orderBy)
+
     def getSubstringsForHeadword(self, headwordStr, limit=None, orderBy=None):
-        clauses, filters = self._getHeadwordSubstringSearch(headwordStr)
+        return list(islice(self.iterSubstringsForHeadword(headwordStr,
+            orderBy=orderBy), limit))
 
-        return self._search(or_(*clauses), filters, limit, orderBy)
+    def _getHeadwordListSearch(self, headwords, strategy=None, **options):
+        dictionaryTable = self.db.tables[self.DICTIONARY_TABLE]
+        strategy = strategy or self.headwordListSearchStrategy
+
+        headwordListClause = strategy.getWhereClause(
+            dictionaryTable.c.Headword, headwords)
+
+        headwordListMatchFunc = strategy.getMatchFunction(headwords)
+
+        return ([headwordListClause], [(['Headword'], headwordListMatchFunc)])
+
+    def iterForHeadwords(self, headwords, orderBy=None):
+        """
+        Searches entries for several headwords at once.
+
+        @type headwords: list of str
+        @param headwords: headwords
+        @return: iterator of entries matching any of the headwords
+        """
+        return self._iterCachedSearch(self._getHeadwordListSearch,
+            self.headwordListSearchStrategy, (headwords, ), orderBy)
+
+    def getForHeadwords(self, headwords, limit=None, orderBy=None):
+        return list(islice(self.iterForHeadwords(headwords, orderBy=orderBy),
+            limit))
 
     def _getSimilarReadingSearch(self, readingStr, **options):
         dictionaryTable = self.db.tables[self.DICTIONARY_TABLE]
@@ -947,98 +1755,279 @@ class _ExtendedDictionarySupport(object):
 
         return clauses, filters
 
-    def getForSimilarReading(self, readingStr, limit=None, orderBy=None,
-        **options):
-
+    def iterForSimilarReading(self, readingStr, orderBy=None, **options):
         options.update(self._getReadingOptions(readingStr))
 
         if self.readingSimilarSearchStrategy is None:
-            return []
+            return iter([])
         # TODO raises conversion error
         clauses, filters = self._getSimilarReadingSearch(readingStr, **options)
 
-        return self._search(or_(*clauses), filters, limit, orderBy)
+        return self._iterSearch(or_(*clauses), filters, orderBy)
+
+    def getForSimilarReading(self, readingStr, limit=None, orderBy=None,
+        **options):
+        return list(islice(self.iterForSimilarReading(readingStr,
+            orderBy=orderBy, **options), limit))
 
-    def _getHeadwordVariantSearch(self, headwordStr, **options):
+    def _getHeadwordVariantSearch(self, headwordStr, strategy=None,
+        **options):
         dictionaryTable = self.db.tables[self.DICTIONARY_TABLE]
+        strategy = strategy or self.headwordVariantSearchStrategy
 
-        headwordSubstringClause \
-            = self.headwordVariantSearchStrategy.getWhereClause(
-                dictionaryTable.c.Headword, headwordStr)
+        headwordSubstringClause = strategy.getWhereClause(
+            dictionaryTable.c.Headword, headwordStr)
 
-        if not headwordSubstringClause:
+        if headwordSubstringClause is None:
             return None, None
 
-        headwordSubstringMatchFunc \
-            = self.headwordVariantSearchStrategy.getMatchFunction(headwordStr)
+        headwordSubstringMatchFunc = strategy.getMatchFunction(headwordStr)
 
         return ([headwordSubstringClause],
             [(['Headword'], headwordSubstringMatchFunc)])
 
+    def iterVariantsForHeadword(self, headwordStr, orderBy=None, **options):
+        return self._iterCachedSearch(self._getHeadwordVariantSearch,
+            self.headwordVariantSearchStrategy, (headwordStr, ), orderBy,
+            **options)
+
     def getVariantsForHeadword(self, headwordStr, limit=None, orderBy=None,
         **options):
-        clauses, filters = self._getHeadwordVariantSearch(headwordStr,
-            **options)
-        if not clauses:
-            return []
-        else:
-            return self._search(or_(*clauses), filters, limit, orderBy)
+        return list(islice(self.iterVariantsForHeadword(headwordStr,
+            orderBy=orderBy, **options), limit))
 
-    def _getHeadwordSimilarSearch(self, headwordStr, **options):
+    def _getHeadwordSimilarSearch(self, headwordStr, strategy=None,
+        **options):
         dictionaryTable = self.db.tables[self.DICTIONARY_TABLE]
+        strategy = strategy or self.headwordSimilarSearchStrategy
 
-        headwordSubstringClause \
-            = self.headwordSimilarSearchStrategy.getWhereClause(
-                dictionaryTable.c.Headword, headwordStr)
+        headwordSubstringClause = strategy.getWhereClause(
+            dictionaryTable.c.Headword, headwordStr)
 
-        if not headwordSubstringClause:
+        if headwordSubstringClause is None:
             return None, None
 
-        headwordSubstringMatchFunc \
-            = self.headwordSimilarSearchStrategy.getMatchFunction(headwordStr)
+        headwordSubstringMatchFunc = strategy.getMatchFunction(headwordStr)
 
         return ([headwordSubstringClause],
             [(['Headword'], headwordSubstringMatchFunc)])
 
+    def iterSimilarsForHeadword(self, headwordStr, orderBy=None, **options):
+        return self._iterCachedSearch(self._getHeadwordSimilarSearch,
+            self.headwordSimilarSearchStrategy, (headwordStr, ), orderBy,
+            **options)
+
     def getSimilarsForHeadword(self, headwordStr, limit=None, orderBy=None,
         **options):
-        clauses, filters = self._getHeadwordSimilarSearch(headwordStr,
-            **options)
-        if not clauses:
+        return list(islice(self.iterSimilarsForHeadword(headwordStr,
+            orderBy=orderBy, **options), limit))
+
+    def _searchPage(self, whereClause, filters, limit, orderBy, after):
+        """
+        Does the search for a given where clause returning one page of
+        entries. Entries are ordered by the given columns followed by the
+        entry's columns, and a page continues directly after the key of the
+        preceding page's last entry, so no preceding entries need to be
+        skipped. Entries are distinct, as with L{_iterSearch()}, so the key
+        is unique.
+
+        @rtype: tuple
+        @return: entries and key to continue with, C{None} on the last page
+        """
+        dictionaryTable = self.db.tables[self.DICTIONARY_TABLE]
+
+        keyColumns = self._getOrderByColumns(orderBy)
+        for col in self.COLUMNS:
+            column = dictionaryTable.c[col]
+            if not [keyColumn for keyColumn in keyColumns
+                if keyColumn is column]:
+                keyColumns.append(column)
+
+        # select key columns not already part of the entry only once
+        columns = [dictionaryTable.c[col] for col in self.COLUMNS]
+        keyIndices = []
+        for keyColumn in keyColumns:
+            for idx, column in enumerate(columns):
+                if column is keyColumn:
+                    keyIndices.append(idx)
+                    break
+            else:
+                keyIndices.append(len(columns))
+                columns.append(keyColumn)
+
+        if after is not None:
+            keysetClause = _getKeysetClause(keyColumns, after)
+            if whereClause is not None:
+                whereClause = and_(whereClause, keysetClause)
+            else:
+                whereClause = keysetClause
+
+        filterFunction = self._getFilterFunction(filters)
+
+        # fetch rows until one more entry than fits on the page was found
+        results = []
+        lastKey = None
+        nextKey = None
+        for row in self.db.iterRows(select(columns, whereClause,
+            distinct=True).order_by(*keyColumns)):
+            if filterFunction and not filterFunction(row):
+                continue
+
+            if limit is not None and len(results) >= limit:
+                nextKey = lastKey
+                break
+            results.append(tuple(row[:len(self.COLUMNS)]))
+            lastKey = tuple([row[idx] for idx in keyIndices])
+
+        return list(self._iterFormat(results)), nextKey
+
+    def getPageFor(self, searchStr, limit, orderBy=None, after=None,
+        **options):
+        """
+        Gets one page of dictionary entries whose headword, reading or
+        translation matches the given string.
+
+        @type limit: int
+        @param limit: number of entries per page
+        @type orderBy: list
+        @param orderBy: list of column names or SQLAlchemy column objects giving
+            the order of returned entries
+        @type after: tuple
+        @param after: key returned with the preceding page, C{None} for the
+            first page
+        @rtype: tuple
+        @return: entries and key of the next page, C{None} on the last page
+        """
+        options.update(self._getReadingOptions(searchStr))
+        clauses, filters = self._getForSearch(searchStr, **options)
+
+        return self._searchPage(or_(*clauses), filters, limit, orderBy, after)
+
+    def getPageForHeadword(self, headwordStr, limit, orderBy=None, after=None,
+        **options):
+        """
+        Gets one page of dictionary entries whose headword matches the given
+        string. See L{getPageFor()}.
+        """
+        clauses, filters = self._getHeadwordSearch(headwordStr, **options)
+
+        return self._searchPage(or_(*clauses), filters, limit, orderBy, after)
+
+    def getPageForSimilarReading(self, readingStr, limit, orderBy=None,
+        after=None, **options):
+        """
+        Gets one page of dictionary entries with a reading similar to the given
+        string. See L{getPageFor()}.
+        """
+        options.update(self._getReadingOptions(readingStr))
+
+        if self.readingSimilarSearchStrategy is None:
+            return [], None
+        # TODO raises conversion error
+        clauses, filters = self._getSimilarReadingSearch(readingStr, **options)
+
+        return self._searchPage(or_(*clauses), filters, limit, orderBy, after)
+
+    def _getHeadwordColumn(self):
+        """Returns the column used for displaying headwords."""
+        return self.db.tables[self.DICTIONARY_TABLE].c.Headword
+
+    def _getHeadwordColumns(self):
+        """Returns the columns searched by headword lookups."""
+        return [self.db.tables[self.DICTIONARY_TABLE].c.Headword]
+
+    def getHeadwords(self):
+        """
+        Gets all headwords searched by headword lookups, e.g. for segmenting
+        text.
+
+        @rtype: set of str
+        @return: headwords
+        """
+        headwords = set()
+        for column in self._getHeadwordColumns():
+            headwords.update(self.db.selectScalars(
+                select([column], distinct=True)))
+        return headwords
+
+    def getFrequentHeadwords(self, limit=None):
+        """
+        Gets the most frequent headwords, i.e. those of lowest weight.
+        Dictionaries without a weight column return an empty list.
+
+        @type limit: int
+        @param limit: maximum number of headwords returned
+        @rtype: list of str
+        @return: headwords, most frequent first
+        """
+        if not self._dictionaryPrefer:
             return []
-        else:
-            return self._search(or_(*clauses), filters, limit, orderBy)
 
-    def getRandomEntry(self):
-        # TODO add constraint that random entry needs to fulfill, e.g.
-        #   frequency > 10
-        # TODO add offset support to cjklib.dictionary and use _search() here
         dictionaryTable = self.db.tables[self.DICTIONARY_TABLE]
-        entryCount = self.db.selectScalar(
-            select([func.count(dictionaryTable.c[self.COLUMNS[0]])]))
+        headwordColumn = self._getHeadwordColumn()
+        minWeight = func.min(dictionaryTable.c.Weight)
+        query = select([headwordColumn, minWeight],
+            dictionaryTable.c.Weight != None).group_by(headwordColumn)\
+            .order_by(minWeight)
+        if limit:
+            query = query.limit(limit)
 
-        entryIdx = random.randrange(entryCount)
+        return [headword for headword, _ in self.db.selectRows(query)]
 
-        # lookup in db
-        results = self.db.selectRows(
-            select([dictionaryTable.c[col] for col in self.COLUMNS])\
-                .offset(entryIdx).limit(1))
-
-        # format readings and translations
-        for column, formatStrategy in self.columnFormatStrategies.items():
-            columnIdx = self.COLUMNS.index(column)
-            for idx in range(len(results)):
-                rowList = list(results[idx])
-                rowList[columnIdx] = formatStrategy.format(rowList[columnIdx])
-                results[idx] = tuple(rowList)
+    def getRandomEntry(self, maxWeight=None):
+        """
+        Gets a random entry. Entries are chosen from a list of the ids of all
+        eligible entries, built once per constraint.
+
+        @type maxWeight: int
+        @param maxWeight: if given, only entries with a weight up to the given
+            value are chosen, e.g. up to a HSK level; ignored for dictionaries
+            without weight
+        @rtype: list
+        @return: list with the random entry, empty if no entry is eligible
+        """
+        dictionaryTable = self.db.tables[self.DICTIONARY_TABLE]
+        if not self._dictionaryPrefer:
+            maxWeight = None
+
+        if maxWeight is not None:
+            whereClause = and_(dictionaryTable.c.Weight != None,
+                dictionaryTable.c.Weight <= maxWeight)
+        else:
+            whereClause = None
 
-        # format results
-        entries = self.entryFactory.getEntries(results)
+        columns = [dictionaryTable.c[col] for col in self.COLUMNS]
+        if 'EntryId' in dictionaryTable.columns:
+            self._checkVersion()
+            if maxWeight not in self._eligibleEntryIds:
+                self._eligibleEntryIds[maxWeight] = self.db.selectScalars(
+                    select([dictionaryTable.c.EntryId], whereClause))
 
-        return entries
+            entryIds = self._eligibleEntryIds[maxWeight]
+            if not entryIds:
+                return []
+            query = select(columns,
+                dictionaryTable.c.EntryId == random.choice(entryIds))
+        else:
+            # no ids to sample from, skip a random count of entries
+            entryCount = self.db.selectScalar(
+                select([func.count(dictionaryTable.c[self.COLUMNS[0]])],
+                    whereClause))
+            if not entryCount:
+                return []
+            query = select(columns, whereClause)\
+                .offset(random.randrange(entryCount)).limit(1)
+
+        # lookup in db
+        return list(self._iterFormat(self.db.selectRows(query)))
 
 
 class _ExtendedCEDICTStyleSupport(_ExtendedDictionarySupport):
+    HEADWORD_INDEX_TABLE = 'HeadwordIndex_%s'
+    """
+    Lookup table holding simplified and traditional headwords in one column.
+    """
+
     def __init__(self, **options):
         if 'readingSimilarSearchStrategy' not in options:
             options['readingSimilarSearchStrategy'] = SimilarWildcardReading()
@@ -1049,24 +2038,105 @@ class _ExtendedCEDICTStyleSupport(_ExtendedDictionarySupport):
             options['headwordEntitiesSearchStrategy'] = HeadwordEntityReading()
         _ExtendedDictionarySupport.__init__(self, **options)
 
-    def _getHeadwordEntitiesSearch(self, headwordStr, readingStr, **options):
+        indexTableName = self.HEADWORD_INDEX_TABLE % self.DICTIONARY_TABLE
+        if self.db.hasTable(indexTableName):
+            self._headwordIndexTable = self.db.tables[indexTableName]
+        else:
+            self._headwordIndexTable = None
+
+    def _getHeadwordClauses(self, strategy, headwordStr):
+        """
+        Gets the clauses and filters for searching the headword with the given
+        strategy. Both scripts are searched with one lookup on the headword
+        index table if available.
+
+        @type strategy: object
+        @param strategy: headword search strategy
+        @type headwordStr: str
+        @param headwordStr: headword search string
+        @rtype: tuple
+        @return: list of clauses and list of filters
+        """
         dictionaryTable = self.db.tables[self.DICTIONARY_TABLE]
 
+        if self._headwordIndexTable is None:
+            clauses = []
+            filters = []
+            if self.headword != 't':
+                whereClause = strategy.getWhereClause(
+                    dictionaryTable.c.HeadwordSimplified, headwordStr)
+                if whereClause is not None:
+                    clauses.append(whereClause)
+                    filters.append((['HeadwordSimplified'],
+                        strategy.getMatchFunction(headwordStr)))
+            if self.headword != 's':
+                whereClause = strategy.getWhereClause(
+                    dictionaryTable.c.HeadwordTraditional, headwordStr)
+                if whereClause is not None:
+                    clauses.append(whereClause)
+                    filters.append((['HeadwordTraditional'],
+                        strategy.getMatchFunction(headwordStr)))
+
+            return clauses, filters
+
+        indexTable = self._headwordIndexTable
+        whereClause = strategy.getWhereClause(indexTable.c.Headword,
+            headwordStr)
+        if whereClause is None:
+            return [], []
+
+        matchFunc = strategy.getMatchFunction(headwordStr)
+        filters = []
+        if self.headword != 't':
+            filters.append((['HeadwordSimplified'], matchFunc))
+        if self.headword != 's':
+            filters.append((['HeadwordTraditional'], matchFunc))
+        if self.headword in ('s', 't'):
+            whereClause = and_(whereClause,
+                indexTable.c.Script == self.headword)
+
+        return ([dictionaryTable.c.EntryId.in_(
+            select([indexTable.c.EntryId], whereClause))], filters)
+
+    def _getHeadwordSearch(self, headwordStr, **options):
+        return self._getHeadwordClauses(self.headwordSearchStrategy,
+            headwordStr)
+
+    def _getHeadwordColumn(self):
+        dictionaryTable = self.db.tables[self.DICTIONARY_TABLE]
+        if self.headword == 't':
+            return dictionaryTable.c.HeadwordTraditional
+        else:
+            return dictionaryTable.c.HeadwordSimplified
+
+    def _getHeadwordColumns(self):
+        dictionaryTable = self.db.tables[self.DICTIONARY_TABLE]
+        columns = []
+        if self.headword != 't':
+            columns.append(dictionaryTable.c.HeadwordSimplified)
+        if self.headword != 's':
+            columns.append(dictionaryTable.c.HeadwordTraditional)
+        return columns
+
+    def _getHeadwordEntitiesSearch(self, headwordStr, readingStr,
+        strategy=None, **options):
+        dictionaryTable = self.db.tables[self.DICTIONARY_TABLE]
+        strategy = strategy or self.headwordEntitiesSearchStrategy
+
         clauses = []
         filters = []
 
-        headwordEntitiesMatchFunc \
-            = self.headwordEntitiesSearchStrategy.getMatchFunction(
-                headwordStr, readingStr, **options)
+        headwordEntitiesMatchFunc = strategy.getMatchFunction(headwordStr,
+            readingStr, **options)
 
         if self.headword != 't':
-            clauses.append(self.headwordEntitiesSearchStrategy.getWhereClause(
+            clauses.append(strategy.getWhereClause(
                 dictionaryTable.c.HeadwordSimplified,
                 dictionaryTable.c.Reading, headwordStr, readingStr, **options))
             filters.append((['HeadwordSimplified', 'Reading'],
                 headwordEntitiesMatchFunc))
         if self.headword != 's':
-            clauses.append(self.headwordEntitiesSearchStrategy.getWhereClause(
+            clauses.append(strategy.getWhereClause(
                 dictionaryTable.c.HeadwordTraditional,
                 dictionaryTable.c.Reading, headwordStr, readingStr, **options))
             filters.append((['HeadwordTraditional', 'Reading'],
@@ -1074,25 +2144,14 @@ class _ExtendedCEDICTStyleSupport(_ExtendedDictionarySupport):
 
         return clauses, filters
 
-    def _getHeadwordSubstringSearch(self, headwordStr, **options):
-        dictionaryTable = self.db.tables[self.DICTIONARY_TABLE]
-
-        clauses = []
-        filters = []
-        if self.headword != 't':
-            clauses.append(self.headwordSubstringSearchStrategy.getWhereClause(
-                dictionaryTable.c.HeadwordSimplified, headwordStr))
-            filters.append((['HeadwordSimplified'],
-                self.headwordSubstringSearchStrategy.getMatchFunction(
-                    headwordStr)))
-        if self.headword != 's':
-            clauses.append(self.headwordSubstringSearchStrategy.getWhereClause(
-                dictionaryTable.c.HeadwordTraditional, headwordStr))
-            filters.append((['HeadwordTraditional'],
-                self.headwordSubstringSearchStrategy.getMatchFunction(
-                    headwordStr)))
+    def _getHeadwordSubstringSearch(self, headwordStr, strategy=None,
+        **options):
+        return self._getHeadwordClauses(
+            strategy or self.headwordSubstringSearchStrategy, headwordStr)
 
-        return clauses, filters
+    def _getHeadwordListSearch(self, headwords, strategy=None, **options):
+        return self._getHeadwordClauses(
+            strategy or self.headwordListSearchStrategy, headwords)
 
     def _getSimilarReadingSearch(self, readingStr, **options):
         dictionaryTable = self.db.tables[self.DICTIONARY_TABLE]
@@ -1139,54 +2198,20 @@ class _ExtendedCEDICTStyleSupport(_ExtendedDictionarySupport):
 
         return clauses, filters
 
-    def _getHeadwordVariantSearch(self, headwordStr, **options):
-        dictionaryTable = self.db.tables[self.DICTIONARY_TABLE]
-
-        clauses = []
-        filters = []
-        if self.headword != 't':
-            whereClause = self.headwordVariantSearchStrategy.getWhereClause(
-                dictionaryTable.c.HeadwordSimplified, headwordStr)
-            if whereClause:
-                clauses.append(whereClause)
-                filters.append((['HeadwordSimplified'],
-                    self.headwordVariantSearchStrategy.getMatchFunction(
-                        headwordStr)))
-        if self.headword != 's':
-            whereClause = self.headwordVariantSearchStrategy.getWhereClause(
-                dictionaryTable.c.HeadwordTraditional, headwordStr)
-            if whereClause:
-                clauses.append(whereClause)
-                filters.append((['HeadwordTraditional'],
-                    self.headwordVariantSearchStrategy.getMatchFunction(
-                        headwordStr)))
+    def _getHeadwordVariantSearch(self, headwordStr, strategy=None,
+        **options):
+        clauses, filters = self._getHeadwordClauses(
+            strategy or self.headwordVariantSearchStrategy, headwordStr)
 
         if not clauses:
             return None, None
         else:
             return clauses, filters
 
-    def _getHeadwordSimilarSearch(self, headwordStr, **options):
-        dictionaryTable = self.db.tables[self.DICTIONARY_TABLE]
-
-        clauses = []
-        filters = []
-        if self.headword != 't':
-            whereClause = self.headwordSimilarSearchStrategy.getWhereClause(
-                dictionaryTable.c.HeadwordSimplified, headwordStr)
-            if whereClause:
-                clauses.append(whereClause)
-                filters.append((['HeadwordSimplified'],
-                    self.headwordSimilarSearchStrategy.getMatchFunction(
-                        headwordStr)))
-        if self.headword != 's':
-            whereClause = self.headwordSimilarSearchStrategy.getWhereClause(
-                dictionaryTable.c.HeadwordTraditional, headwordStr)
-            if whereClause:
-                clauses.append(whereClause)
-                filters.append((['HeadwordTraditional'],
-                    self.headwordSimilarSearchStrategy.getMatchFunction(
-                        headwordStr)))
+    def _getHeadwordSimilarSearch(self, headwordStr, strategy=None,
+        **options):
+        clauses, filters = self._getHeadwordClauses(
+            strategy or self.headwordSimilarSearchStrategy, headwordStr)
 
         if not clauses:
             return None, None
@@ -1197,6 +2222,10 @@ class _ExtendedCEDICTStyleSupport(_ExtendedDictionarySupport):
 class ExtendedEDICT(EDICT, _ExtendedDictionarySupport):
     def __init__(self, **options):
         options['entryFactory'] = EDICTEntry() # TODO
+        if 'headwordSearchStrategy' not in options:
+            options['headwordSearchStrategy'] = PrefixWildcard()
+        if 'readingSearchStrategy' not in options:
+            options['readingSearchStrategy'] = PrefixWildcard()
         EDICT.__init__(self, **options)
         _ExtendedDictionarySupport.__init__(self, **options)
 
@@ -1209,6 +2238,8 @@ class ExtendedCEDICTGR(CEDICTGR, _ExtendedDictionarySupport):
     # TODO similar reading support for CEDICTGR
     def __init__(self, **options):
         options['entryFactory'] = EDICTEntry() # TODO
+        if 'headwordSearchStrategy' not in options:
+            options['headwordSearchStrategy'] = PrefixWildcard()
         CEDICTGR.__init__(self, **options)
         _ExtendedDictionarySupport.__init__(self, **options)
 
@@ -1235,6 +2266,12 @@ class _CEDICTDictionaryDefaults():
         reading = options.get('reading', None)
         if not reading: reading = cls.READING
 
+        if 'headwordSearchStrategy' not in options:
+            options['headwordSearchStrategy'] = PrefixWildcard(
+                fullwidthCharacters=True)
+        if 'readingSearchStrategy' not in options:
+            options['readingSearchStrategy'] = IndexedTonelessWildcardReading()
+
         if 'entryFactory' not in options:
             #options['entryFactory'] = HeadwordAlternative()
             if language.endswith('Hant'):
@@ -1262,6 +2299,10 @@ class ExtendedCEDICT(_CEDICTDictionaryDefaults, CEDICT,
         self._checkOrderByWeight(orderBy)
         return CEDICT._search(self, whereClause, filters, limit, orderBy)
 
+    def _getHeadwordSearch(self, headwordStr, **options):
+        return _ExtendedCEDICTStyleSupport._getHeadwordSearch(self,
+            headwordStr, **options)
+
     def getForReading(self, readingStr, limit=None, orderBy=None, **options):
         options.update(self._getReadingOptions(readingStr))
         return CEDICT.getForReading(self, readingStr, limit=limit,
@@ -1276,6 +2317,8 @@ class ExtendedCEDICT(_CEDICTDictionaryDefaults, CEDICT,
 class ExtendedHanDeDict(_CEDICTDictionaryDefaults, HanDeDict,
     _ExtendedCEDICTStyleSupport):
     def __init__(self, **options):
+        if 'headwordSearchStrategy' not in options:
+            options['headwordSearchStrategy'] = PrefixWildcard()
         self._setDefaults(options)
 
         HanDeDict.__init__(self, **options)
@@ -1285,6 +2328,10 @@ class ExtendedHanDeDict(_CEDICTDictionaryDefaults, HanDeDict,
         self._checkOrderByWeight(orderBy)
         return HanDeDict._search(self, whereClause, filters, limit, orderBy)
 
+    def _getHeadwordSearch(self, headwordStr, **options):
+        return _ExtendedCEDICTStyleSupport._getHeadwordSearch(self,
+            headwordStr, **options)
+
     def getForReading(self, readingStr, limit=None, orderBy=None, **options):
         options.update(self._getReadingOptions(readingStr))
         return HanDeDict.getForReading(self, readingStr, limit=limit, orderBy=orderBy,
@@ -1308,6 +2355,10 @@ class ExtendedCFDICT(_CEDICTDictionaryDefaults, CFDICT,
         self._checkOrderByWeight(orderBy)
         return CFDICT._search(self, whereClause, filters, limit, orderBy)
 
+    def _getHeadwordSearch(self, headwordStr, **options):
+        return _ExtendedCEDICTStyleSupport._getHeadwordSearch(self,
+            headwordStr, **options)
+
     def getForReading(self, readingStr, limit=None, orderBy=None, **options):
         options.update(self._getReadingOptions(readingStr))
         return CFDICT.getForReading(self, readingStr, limit=limit,
@@ -1394,21 +2445,27 @@ class PseudoDictionary(object):
         if hasattr(self.entryFactory, 'setDictionaryInstance'):
             self.entryFactory.setDictionaryInstance(self)
 
-    def _format(self, results):
-        # format readings and translations
-        for column, formatStrategy in self.columnFormatStrategies.items():
-            columnIdx = self.COLUMNS.index(column)
-            for idx in range(len(results)):
-                rowList = list(results[idx])
+    def _iterFormat(self, results):
+        """
+        Formats the given pairs of headword and reading and creates entries,
+        one row at a time.
+        """
+        formatStrategies = [(self.COLUMNS.index(column), formatStrategy)
+            for column, formatStrategy in self.columnFormatStrategies.items()]
+
+        for headword, reading in results:
+            # TODO
+            rowList = [headword, headword, reading, '']
+
+            # format readings and translations
+            for columnIdx, formatStrategy in formatStrategies:
                 rowList[columnIdx] = formatStrategy.format(rowList[columnIdx])
-                results[idx] = tuple(rowList)
 
-        # format results
-        # TODO
-        entries = self.entryFactory.getEntries([(h, h, r, '') for h, r in results])
-        #entries = self.entryFactory.getEntries(results)
+            for entry in self.entryFactory.getEntries([tuple(rowList)]):
+                yield entry
 
-        return entries
+    def _format(self, results):
+        return list(self._iterFormat(results))
 
     def getForHeadword(self, headwordStr, **options):
         if len(headwordStr) > 1:
@@ -1555,6 +2612,12 @@ class PseudoDictionary(object):
     def getSubstringsForHeadword(self, headwordStr, limit=None, orderBy=None):
         return self.getSubstringsForHeadword(headwordStr, limit, orderBy)
 
+    def getFrequentHeadwords(self, limit=None):
+        return []
+
+    def getRandomEntry(self, maxWeight=None):
+        return []
+
     def getVariantsForHeadword(self, headwordStr, **options):
         # TODO remove radical forms
         if len(headwordStr) != 1:
@@ -1569,3 +2632,33 @@ class PseudoDictionary(object):
         else:
             return self._format([(char, None) for char
                 in self.charDB.getCharacterSimilars(headwordStr)])
+
+    def getPageFor(self, searchStr, limit, orderBy=None, after=None,
+        **options):
+        if after is not None:
+            return [], None
+        return list(self.getFor(searchStr, **options)), None
+
+    def getPageForHeadword(self, headwordStr, limit, orderBy=None, after=None,
+        **options):
+        if after is not None:
+            return [], None
+        return self.getForHeadword(headwordStr, **options), None
+
+    def getPageForSimilarReading(self, readingStr, limit, orderBy=None,
+        after=None, **options):
+        if after is not None:
+            return [], None
+        return self.getForSimilarReading(readingStr, **options), None
+
+    def iterForHeadword(self, headwordStr, **options):
+        return iter(self.getForHeadword(headwordStr, **options))
+
+    def iterForReading(self, readingStr, **options):
+        return iter(self.getForReading(readingStr, **options))
+
+    def iterFor(self, searchStr, **options):
+        return iter(self.getFor(searchStr, **options))
+
+    def iterForSimilarReading(self, readingStr, **options):
+        return iter(self.getForSimilarReading(readingStr, **options))
@@ -21,13 +21,15 @@ import os
 import os.path
 import re
 import urllib
+from itertools import islice
 
 from cjklib.dbconnector import getDBConnector
 
 from libeclectus import util
 from libeclectus.chardb import CharacterDB
 from libeclectus.dictionary import (getDictionary, getDefaultDictionary,
-    getAvailableDictionaryNames)
+    getAvailableDictionaryNames, getDictionaryLanguage)
+from libeclectus.federateddictionary import FederatedDictionary
 from libeclectus.locale import gettext, ngettext, getTranslationLanguage
 
 class DictionaryView:
@@ -61,12 +63,25 @@ class DictionaryView:
         'zh-yue-Hant': 't', 'zh-yue-Hans': '', 'ja': 'j', 'ko': 't'}
     """Language dependant Wikimedia Commons stroke order image prefix."""
 
+    RANDOM_ENTRY_MAX_WEIGHT = 4
+    """Highest weight (HSK level) of randomly chosen dictionary entries."""
+
+    VOCABULARY_PAGE_SIZE = 50
+    """Number of entries per page of the "All entries..." result pages."""
+
+    RESULT_CACHE_SIZE = 200
+    """
+    Number of dictionary search results kept, shared by sections doing the
+    same lookup.
+    """
+
     @classmethod
     def needsDictionary(cls, method):
         return hasattr(getattr(cls, method), 'needsDictionary')
 
     def __init__(self, dictionary=None, dbConnectInst=None, databaseUrl=None,
-        strokeOrderType=None, showAlternativeHeadwords=True, **options):
+        strokeOrderType=None, showAlternativeHeadwords=True,
+        additionalDictionaries=None, **options):
 
         self.db = dbConnectInst or getDBConnector(
             util.getDatabaseConfiguration(databaseUrl))
@@ -77,6 +92,8 @@ class DictionaryView:
 
         self.availableDictionaryNames = getAvailableDictionaryNames(self.db)
 
+        options.setdefault('resultCacheSize', self.RESULT_CACHE_SIZE)
+
         # get ditionary
         if dictionary in self.availableDictionaryNames:
             self._dictionary = getDictionary(dictionary, dbConnectInst=self.db,
@@ -87,6 +104,23 @@ class DictionaryView:
                 dbConnectInst=self.db, ignoreIllegalSettings=True, **options)
 
         self.dictionary = self._dictionary.PROVIDES
+
+        # search further dictionaries of the same language together
+        self.additionalDictionaries = []
+        if additionalDictionaries and not self.dictionary.startswith('PSEUDO_'):
+            language = getDictionaryLanguage(self.dictionary, noScript=True)
+            self.additionalDictionaries = [dictionaryName
+                for dictionaryName in additionalDictionaries
+                if dictionaryName in self.availableDictionaryNames
+                    and not dictionaryName.startswith('PSEUDO_')
+                    and dictionaryName != self.dictionary
+                    and getDictionaryLanguage(dictionaryName, noScript=True)
+                        == language]
+        if self.additionalDictionaries:
+            self._dictionary = FederatedDictionary(self._dictionary,
+                self.additionalDictionaries, ignoreIllegalSettings=True,
+                **options)
+
         self.reading = self._dictionary.reading
         self.language = self._dictionary.language
         self.characterDomain = self._dictionary.charDB.characterDomain
@@ -112,12 +146,18 @@ class DictionaryView:
             else:
                 self.strokeOrderType = None
 
+    def close(self):
+        """Stops the search of further dictionaries."""
+        if isinstance(self._dictionary, FederatedDictionary):
+            self._dictionary.close()
+
     def settings(self):
         return {'strokeOrderType': self.strokeOrderType,
             'showAlternativeHeadwords': self.showAlternativeHeadwords,
             'useExtraReadingInformation': self.useExtraReadingInformation,
             'Transcription': self.reading,
             'Dictionary': self.dictionary,
+            'Additional dictionaries': ','.join(self.additionalDictionaries),
             'Character Domain': self.characterDomain,
             'Update database url': self.db.databaseUrl
             }
@@ -142,6 +182,9 @@ class DictionaryView:
 
         settings['reading'] = settingsDict.get('Transcription', None)
         settings['dictionary'] = settingsDict.get('Dictionary', None)
+        if settingsDict.get('Additional dictionaries', None):
+            settings['additionalDictionaries'] \
+                = unicode(settingsDict['Additional dictionaries']).split(',')
         settings['characterDomain'] = settingsDict.get('Character Domain', None)
         settings['databaseUrl'] = settingsDict.get('Update database url', None)
 
@@ -257,6 +300,15 @@ class DictionaryView:
                 + '</tr>')
         return '\n'.join(htmlList)
 
+    @staticmethod
+    def _getMoreEntriesLink(method, inputString, nextKey):
+        """
+        Gets a link fetching the next page of the given paged section.
+        """
+        return '<a class="meta more" href="#more(%s;%s;%s)">%s</a>' \
+            % (method, util.encodeBase64(inputString),
+                util.encodePageKey(nextKey), gettext('More entries...'))
+
     # METHODS WITHOUT DATABASE ACCESS
 
     def getGeneralCharacterSection(self, inputString):
@@ -474,7 +526,13 @@ class DictionaryView:
             + '?searchtype=1&text=%s' % charString
         return link, gettext('CantoDict Cantonese-Mandarin-English dictionary')
 
-    def getLinkSection(self, inputString):
+    def getLinkData(self, inputString):
+        """
+        Gets links to websites for the given character string.
+
+        @rtype: list of tuple
+        @return: pairs of URL and website name
+        """
         functions = []
         if self.language in self.WEB_LINKS:
             functions.extend(self.WEB_LINKS[self.language])
@@ -485,22 +543,29 @@ class DictionaryView:
         for linkProc in functions:
             content = getattr(self, linkProc)(inputString)
             if content:
-                links.append('<a class="crossLink" href="%s">%s</a>' % content)
+                links.append(content)
+        return links
+
+    def getLinkSection(self, inputString):
+        links = ['<a class="crossLink" href="%s">%s</a>' % content
+            for content in self.getLinkData(inputString)]
 
         return "<ol><li>" + "</li>\n<li>".join(links) + "</li></ol>"
 
     # FUNCTIONS BASED ON DATABASE
 
-    def getVariantSection(self, inputString):
+    def getVariantData(self, inputString):
+        """Gets the variants of the given headword."""
         variantEntries = self._dictionary.getVariantsForHeadword(inputString)
-        variants = set([e.Headword for e in variantEntries
-            if e.Headword != inputString])
+        # e.g. 台 is listed as it's on variant, Unihan's policy
+        return list(set([e.Headword for e in variantEntries
+            if e.Headword != inputString]))
+
+    def getVariantSection(self, inputString):
+        variants = self.getVariantData(inputString)
 
         variantLinks = []
         for variant in variants:
-            if variant == inputString:
-                # e.g. 台 is listed as it's on variant, Unihan's policy
-                continue
             variantLinks.append('<span class="character">' \
                 + '<a class="character" href="#lookup(%s)">%s</a>' \
                     % (util.encodeBase64(variant), variant) \
@@ -515,14 +580,18 @@ class DictionaryView:
                 + ', '.join(variantLinks) \
                 + '</div>'
 
-    def getSimilarsSection(self, inputString):
-        """Returns a section of headwords with similar shape."""
+    def getSimilarsData(self, inputString):
+        """Gets headwords with similar shape, sorted by reading."""
         similarEntries = self._dictionary.getSimilarsForHeadword(inputString,
             orderBy=['Reading'])
             #orderBy=['Reading', 'Headword']) # TODO doesn't work for CEDICT
-        similars = [e.Headword for e in similarEntries
+        return [e.Headword for e in similarEntries
             if e.Headword != inputString]
 
+    def getSimilarsSection(self, inputString):
+        """Returns a section of headwords with similar shape."""
+        similars = self.getSimilarsData(inputString)
+
         similarLinks = []
         for similar in similars:
             similarLinks.append('<span class="character">' \
@@ -540,19 +609,16 @@ class DictionaryView:
                 + ', '.join(similarLinks) \
                 + '</div>'
 
-    def getMeaningSection(self, inputString):
-        """
-        Gets a list of entries for the given character string, sorted by reading
-        with annotated alternative character writing, audio and vocab handle.
+    def getMeaningData(self, inputString):
         """
-        def getAudio(filePath):
-            return (' <a class="audio" href="#play(%s)">%s</a>'
-                % (urllib.quote(filePath.encode('utf8')), gettext('Listen')))
-                #audioHtml = ' <a class="audio" href="#" onclick="new Audio(\'%s\').play(); return false;">%s</a>' \
-                    #% (urllib.quote(filePath.encode('utf8')), gettext('Listen'))
-                #audioHtml = ' <audio src="%s" id="audio_%s" autoplay=false></audio><a class="audio" href="#" onClick="document.getElementById(\'audio_%s\').play(); return false;">%s</a>' \
-                    #% (urllib.quote(filePath.encode('utf8')), reading, reading, gettext('Listen'))
+        Gets the entries for the given character string, grouped by reading.
 
+        @rtype: dict
+        @return: C{'readings'} giving triples of reading, number of its first
+            translation and its translations; C{'alternativeHeadwords'} giving
+            pairs of alternative headword and the numbers of its translations,
+            empty if alternative headwords are not to be shown
+        """
         readings = []
         translations = {}
         translationIndex = {}
@@ -560,7 +626,6 @@ class DictionaryView:
         alternativeHeadwordIndex = {}
 
         # TODO index calculation is broken, e.g. 说
-        # TODO cache
         dictResult = self._dictionary.getForHeadword(inputString)
 
         for idx, entry in enumerate(dictResult):
@@ -585,14 +650,40 @@ class DictionaryView:
             alternativeHeadwordIndex[charStringAlt].append(
                 translations[reading].index(translation))
 
-        htmlList = []
         # show alternative headword when a) several different ones exist,
         #   b) several entries exist, c) different to headword
+        alternativeHeadwordData = []
         if self.showAlternativeHeadwords and alternativeHeadwords \
             and (len(alternativeHeadwords) > 1 \
                 or inputString not in alternativeHeadwords):
+            alternativeHeadwordData = [(altHeadword,
+                    [i + 1 for i in alternativeHeadwordIndex[altHeadword]])
+                for altHeadword in alternativeHeadwords]
+
+        return {'readings': [(reading, translationIndex[reading] + 1,
+                translations[reading]) for reading in readings],
+            'alternativeHeadwords': alternativeHeadwordData}
+
+    def getMeaningSection(self, inputString):
+        """
+        Gets a list of entries for the given character string, sorted by reading
+        with annotated alternative character writing, audio and vocab handle.
+        """
+        def getAudio(filePath):
+            return (' <a class="audio" href="#play(%s)">%s</a>'
+                % (urllib.quote(filePath.encode('utf8')), gettext('Listen')))
+                #audioHtml = ' <a class="audio" href="#" onclick="new Audio(\'%s\').play(); return false;">%s</a>' \
+                    #% (urllib.quote(filePath.encode('utf8')), gettext('Listen'))
+                #audioHtml = ' <audio src="%s" id="audio_%s" autoplay=false></audio><a class="audio" href="#" onClick="document.getElementById(\'audio_%s\').play(); return false;">%s</a>' \
+                    #% (urllib.quote(filePath.encode('utf8')), reading, reading, gettext('Listen'))
+
+        data = self.getMeaningData(inputString)
+        readings = data['readings']
+
+        htmlList = []
+        if data['alternativeHeadwords']:
             altHeadwordHtml = []
-            for altHeadword in alternativeHeadwords:
+            for altHeadword, indices in data['alternativeHeadwords']:
                 if len(inputString) > 1:
                     className = "word"
                 else:
@@ -602,12 +693,10 @@ class DictionaryView:
                     + '<a class="character" href="#lookup(%s)">%s</a></span>' \
                         % (util.encodeBase64(altHeadword), altHeadword)
 
-                if len(readings) > 1 or len(translations[readings[0]]) > 1:
-                    indices = [str(i + 1) for i \
-                        in alternativeHeadwordIndex[altHeadword]]
+                if len(readings) > 1 or len(readings[0][2]) > 1:
                     altHeadwordHtml.append('<li>' + entry \
                         + '<span class="alternativeHeadwordIndex">%s</span>' \
-                            % ' '.join(indices) \
+                            % ' '.join([str(i) for i in indices]) \
                         + '</li>')
                 else:
                     altHeadwordHtml.append('<li>%s</li>' % entry)
@@ -619,7 +708,7 @@ class DictionaryView:
         if readings:
             htmlList.append('<table class="meaning">')
 
-            for reading in readings:
+            for reading, firstIndex, translations in readings:
                 # get audio if available
                 #filePath, audioHtml = getAudio(reading)
                 filePath, audioHtml = ('', '') # TODO
@@ -630,7 +719,7 @@ class DictionaryView:
                             forceBlocksOfFor=False))
                 # get translations
                 translationEntries = []
-                for translation in translations[reading]:
+                for translation in translations:
                     translationEntries.append('<li class="translation">' \
                         + '<a class="addVocabulary" ' \
                         + 'href="#addvocab(%s;%s;%s;%s)"></a>' \
@@ -646,8 +735,7 @@ class DictionaryView:
                             + '<td class="reading">%s%s</td>' \
                                 % (readingEntry, audioHtml) \
                             + '<td><ol start="%d">%s</ol></td>' \
-                                % (translationIndex[reading] + 1,
-                                    translationString) \
+                                % (firstIndex, translationString) \
                             + '</tr>')
 
             htmlList.append('</table>')
@@ -657,9 +745,10 @@ class DictionaryView:
 
         return '\n'.join(htmlList)
 
-    def _getContainedEntitiesSection(self, inputString, dictResult):
+    @staticmethod
+    def _sortContainedEntities(inputString, dictResult):
         """
-        Gets a list of dictionary entries for single characters of the given
+        Sorts dictionary entries by the position of their headword in the given
         character string.
         """
         def sortDictionaryResults(x, y):
@@ -676,10 +765,15 @@ class DictionaryView:
             else:
                 return a - b
 
+        return sorted(dictResult, sortDictionaryResults)
+
+    def _getContainedEntitiesSection(self, inputString, dictResult):
+        """
+        Gets a list of dictionary entries for single characters of the given
+        character string.
+        """
         htmlList = []
         if dictResult:
-            dictResult.sort(sortDictionaryResults)
-
             htmlList.append('<table class="containedVocabulary">')
             # don't display alternative if the charString is found
             #   in the given string
@@ -714,43 +808,72 @@ class DictionaryView:
         else:
             return list(entriesSet)
 
+    def getHeadwordContainedCharactersData(self, inputString):
+        """
+        Gets the dictionary entries for characters of the given character
+        string, in order of the string.
+        """
+        return self._sortContainedEntities(inputString,
+            self._searchDictionaryHeadwordEntities(inputString))
+
     def getHeadwordContainedCharactersSection(self, inputString):
         """
         Gets a list of dictionary entries for characters of the given character
         string.
         """
-        dictResult = self._searchDictionaryHeadwordEntities(inputString)
-        return self._getContainedEntitiesSection(inputString, dictResult)
+        return self._getContainedEntitiesSection(inputString,
+            self.getHeadwordContainedCharactersData(inputString))
+
+    def getHeadwordContainedVocabularyData(self, inputString):
+        """
+        Gets the dictionary entries for substrings of the given character
+        string, in order of the string.
+        """
+        return self._sortContainedEntities(inputString,
+            self._dictionary.getSubstringsForHeadword(inputString))
 
     def getHeadwordContainedVocabularySection(self, inputString):
         """
         Gets a list of dictionary entries for substrings of the given character
         string.
         """
-        dictResult = self._dictionary.getSubstringsForHeadword(inputString)
-        return self._getContainedEntitiesSection(inputString, dictResult)
+        return self._getContainedEntitiesSection(inputString,
+            self.getHeadwordContainedVocabularyData(inputString))
 
     @util.attr('needsDictionary')
-    def getVocabularySection(self, inputString):
-        # we only need 4 entries, but because of double entries we might end up
-        #   with some being merged, also need +1 to show the "more entries"
-        #   play safe and select 10
+    def getVocabularyData(self, inputString):
+        """
+        Gets the first dictionary entries including the given character
+        string.
+
+        @rtype: dict
+        @return: C{'entries'} giving the entries, C{'hasMore'} telling if
+            further entries exist
+        """
+        # we only need 4 entries, +1 to show the "more entries", stop reading
+        #   the results after that
         # TODO true contains
-        dictResult = self._dictionary.getForHeadword(
-            '*' + inputString + '*', orderBy=['Weight'], limit=10)
+        dictResult = list(islice(self._dictionary.iterForHeadword(
+            '*' + inputString + '*', orderBy=['Weight']), 5))
+
+        return {'entries': dictResult[:4], 'hasMore': len(dictResult) > 4}
+
+    @util.attr('needsDictionary')
+    def getVocabularySection(self, inputString):
+        data = self.getVocabularyData(inputString)
 
         htmlList = []
-        if dictResult:
+        if data['entries']:
             htmlList.append('<table class="vocabulary">')
             # don't display alternative if the charString is found
             #   in the given string
             showAlternative = lambda charString, _: \
                     (charString.find(inputString) < 0)
-            htmlList.append(self._getVocabularyTable(dictResult[:4],
+            htmlList.append(self._getVocabularyTable(data['entries'],
                 useAltFunc=showAlternative))
             htmlList.append('</table>')
 
-            if len(dictResult) > 4:
+            if data['hasMore']:
                 htmlList.append(
                     '<a class="meta" href="#lookup(%s)">%s</a>' \
                         % (util.encodeBase64('vocabulary' \
@@ -762,117 +885,199 @@ class DictionaryView:
         return '\n'.join(htmlList)
 
     @util.attr('needsDictionary')
-    def getFullVocabularySection(self, inputString):
+    def getFullVocabularyData(self, inputString, after=None):
         """
-        Gets a list of dictionary entries with exact matches and matches
+        Gets the dictionary entries with exact matches and a page of matches
         including the given character string.
+
+        @rtype: dict
+        @return: C{'exact'} giving exact matches, C{None} when continuing
+            after the given key, C{'other'} giving other matches and
+            C{'nextKey'} the key of the following page, C{None} on the last
+            page
         """
-        dictResult = self._dictionary.getForHeadword(inputString)
+        exact = None
+        if after is None:
+            exact = self._dictionary.getForHeadword(inputString)
+
+        # TODO true contains
+        other, nextKey = self._dictionary.getPageForHeadword(
+            '*' + inputString + '*', self.VOCABULARY_PAGE_SIZE,
+            orderBy=['Reading'], after=after)
+
+        return {'exact': exact, 'other': other, 'nextKey': nextKey}
+
+    @util.attr('needsDictionary')
+    def getFullVocabularySection(self, inputString, after=None):
+        """
+        Gets a list of dictionary entries with exact matches and matches
+        including the given character string. Other matches are split into
+        pages, given C{after} only the page following that key is returned.
+        """
+        data = self.getFullVocabularyData(inputString, after=after)
 
         htmlList = []
         htmlList.append('<table class="fullVocabulary">')
 
-        # exact matches
-        htmlList.append('<tr><td colspan="3"><h3>%s</h3></td></tr>' \
-            % gettext('Dictionary entries'))
-        if dictResult:
-            showAlternative = lambda charString, _: (charString != inputString)
-            htmlList.append(self._getVocabularyTable(dictResult,
-                useAltFunc=showAlternative))
-        else:
-            htmlList.append(
-                '<tr><td colspan="3"><span class="meta">%s</span></td></tr>' \
-                    % gettext('No exact matches found'))
+        if data['exact'] is not None:
+            # exact matches
+            htmlList.append('<tr><td colspan="3"><h3>%s</h3></td></tr>' \
+                % gettext('Dictionary entries'))
+            if data['exact']:
+                showAlternative = lambda charString, _: \
+                    (charString != inputString)
+                htmlList.append(self._getVocabularyTable(data['exact'],
+                    useAltFunc=showAlternative))
+            else:
+                htmlList.append('<tr><td colspan="3">' \
+                    + '<span class="meta">%s</span>' \
+                        % gettext('No exact matches found') \
+                    + '</td></tr>')
 
         # other matches
-        # TODO true contains
-        dictResult = self._dictionary.getForHeadword('*' + inputString + '*',
-            orderBy=['Reading'])
-
-        if dictResult:
-            htmlList.append('<tr><td colspan="3"><h3>%s</h3></td></tr>' \
-                % gettext('Other matches'))
+        if data['other']:
+            if after is None:
+                htmlList.append('<tr><td colspan="3"><h3>%s</h3></td></tr>' \
+                    % gettext('Other matches'))
 
             # don't display alternative if the charString is found in the
             #   given string
             showAlternative = lambda charString, _: \
                     (charString.find(inputString) < 0)
-            htmlList.append(self._getVocabularyTable(dictResult,
+            htmlList.append(self._getVocabularyTable(data['other'],
                 useAltFunc=showAlternative))
 
         htmlList.append('</table>')
 
+        if data['nextKey'] is not None:
+            htmlList.append(self._getMoreEntriesLink(
+                'getFullVocabularySection', inputString, data['nextKey']))
+
         return '\n'.join(htmlList)
 
-    def _getDictionaryInfo(self, char, dictResult=None):
+    def _getDictionaryInfoData(self, char, dictResult=None):
+        """
+        Gets the readings and translations of the given character.
+
+        @rtype: tuple
+        @return: list of readings and list of translations
+        """
         readings = []
         translations = []
 
         dictResult = (dictResult or self._dictionary.getForHeadword(char))
 
-        if dictResult:
-            # separate readings from translation
-            for _, _, reading, translation in dictResult:
-                if reading not in readings:
-                    readings.append(reading)
-                if translation and translation not in translations:
-                    translations.append(
-                        self._getTranslationRepresentation(translation))
+        # separate readings from translation
+        for _, _, reading, translation in dictResult:
+            if reading not in readings:
+                readings.append(reading)
+            if translation and translation not in translations:
+                translations.append(translation)
 
+        return readings, translations
+
+    def _getDictionaryInfo(self, info):
+        readings, translations = info
         return ' <span class="reading">%s</span>' % ', '.join(readings) \
             + ' <span class="translation">%s</span>' \
-                % ' / '.join(translations)
+                % ' / '.join([self._getTranslationRepresentation(translation)
+                    for translation in translations])
 
-    def getCharacterWithComponentSection(self, inputString):
-        """Gets a list of characters with the given character as component."""
+    def getCharacterWithComponentData(self, inputString):
+        """
+        Gets the characters with the given character as component.
+
+        @rtype: list of tuple
+        @return: triples of character, its readings and its translations
+        """
         chars = self._dictionary.charDB.getCharactersForComponents([inputString])
 
-        if inputString in chars:
-            chars.remove(inputString)
+        return [(char, ) + self._getDictionaryInfoData(char)
+            for char in chars if char != inputString]
 
-        if chars:
+    def getCharacterWithComponentSection(self, inputString):
+        """Gets a list of characters with the given character as component."""
+        data = self.getCharacterWithComponentData(inputString)
+
+        if data:
             characterLinks = []
-            for char in chars:
+            for char, readings, translations in data:
                 #characterLinks.append(
                     #'<a class="character" href="#lookup(%s)">%s</a>' \
                         #% (util.encodeBase64(char), char))
                 characterLinks.append('<li><span class="character">' \
                     + '<a class="character" href="#lookup(%s)">%s</a>' \
                         % (util.encodeBase64(char),  char) \
-                    + '</span>%s</li>' % self._getDictionaryInfo(char))
+                    + '</span>%s</li>' \
+                        % self._getDictionaryInfo((readings, translations)))
             return '<div class="components"><ul>%s</ul></div>' \
                 % ' '.join(characterLinks)
         else:
             return '<span class="meta">%s</span>' % gettext('No entries found')
 
-    def getDecompositionTreeSection(self, inputString):
-        """Gets a tree of components included in the given character."""
-        def getLayer(decompTree, isSubTree=False):
+    def getDecompositionTreeData(self, inputString):
+        """
+        Gets a tree of components included in the given character.
+
+        @rtype: dict
+        @return: root node, C{None} if no decomposition is known. A node gives
+            its C{'character'}, C{None} for unnamed nodes, and the readings
+            and translations of the character as C{'info'}. C{'info'} is
+            C{None} for the root node, for unknown components and for
+            characters already given before. Inner nodes give their
+            C{'layout'} and C{'components'}.
+        """
+        def getNode(decompTree, isSubTree=False):
             if type(decompTree) != type(()):
                 char = decompTree
+                info = None
+                if char != u'？' and char not in seenEntry:
+                    seenEntry.add(char)
+                    info = self._getDictionaryInfoData(char)
+                return {'character': char, 'info': info}
+            else:
+                layout, char, tree = decompTree
+                info = None
+                if char and isSubTree:
+                    info = self._getDictionaryInfoData(char)
+
+                return {'layout': layout, 'character': char, 'info': info,
+                    'components': [getNode(entry, isSubTree=True)
+                        for entry in tree]}
+
+        decompTree = self._dictionary.charDB.getCharacterDecomposition(inputString)
+        if decompTree:
+            seenEntry = set()
+            return getNode(decompTree)
+
+    def getDecompositionTreeSection(self, inputString):
+        """Gets a tree of components included in the given character."""
+        def getLayer(node, isSubTree=False):
+            char = node['character']
+            if 'components' not in node:
                 if char != u'？':
-                    if char in seenEntry:
+                    if node['info'] is None:
                         return '<span class="entry">' \
                             + '<span class="character">%s</span>' % char \
                             + '</span>'
                     else:
-                        seenEntry.add(char)
                         return '<span class="entry"><span class="character">' \
                             + '<a class="character" href="#lookup(%s)">%s</a>' \
                                 % (util.encodeBase64(char),  char) \
-                            + '</span>%s</span>' % self._getDictionaryInfo(char)
+                            + '</span>%s</span>' \
+                                % self._getDictionaryInfo(node['info'])
                 else:
                     return '<span class="entry meta">%s</span>' \
                         % gettext('unknown')
             else:
-                layout, char, tree = decompTree
+                layout = node['layout']
                 if char:
                     if isSubTree:
                         head = layout + '<span class="character">' \
                             + '<a class="character" href="#lookup(%s)">%s</a>' \
                                 % (util.encodeBase64(char),  char) \
                             + '</span>' \
-                            + self._getDictionaryInfo(char)
+                            + self._getDictionaryInfo(node['info'])
                     else:
                         # don't show dictionary information for the root element
                         head = layout \
@@ -880,6 +1085,7 @@ class DictionaryView:
                 else:
                     head = layout
 
+                tree = node['components']
                 subLayer = []
                 for idx, entry in enumerate(tree):
                     cssClass = 'decomposition'
@@ -890,10 +1096,9 @@ class DictionaryView:
                 return '<span class="entry">%s<ul>%s</ul></span>' \
                     % (head, ''.join(subLayer))
 
-        decompTree = self._dictionary.charDB.getCharacterDecomposition(inputString)
-        if decompTree:
-            seenEntry = set()
-            return '<div class="tree">%s</div>' % getLayer(decompTree)
+        data = self.getDecompositionTreeData(inputString)
+        if data:
+            return '<div class="tree">%s</div>' % getLayer(data)
         else:
             return '<span class="meta">%s</span>' % gettext('No entry found')
 
@@ -914,8 +1119,14 @@ class DictionaryView:
         else:
             return list(entriesSet)
 
-    def getCharacterWithSamePronunciationSection(self, inputString):
-        """Gets a list of characters with the same pronunciation."""
+    def getCharacterWithSamePronunciationData(self, inputString):
+        """
+        Gets the characters with the same pronunciation, grouped by reading.
+
+        @rtype: list of tuple
+        @return: pairs of reading and a list of triples of character, its
+            readings and its translations
+        """
         dictResult = self._searchDictionarySamePronunciationAs(inputString)
 
         # group by reading and character
@@ -928,16 +1139,25 @@ class DictionaryView:
             charDict[reading][char].append(
                 (char, charAlt, reading, translation))
 
-        if charDict:
+        return [(reading, [(char, ) + self._getDictionaryInfoData(char,
+                    charDict[reading][char])
+                for char in charDict[reading]])
+            for reading in sorted(charDict.keys(), reverse=True)]
+
+    def getCharacterWithSamePronunciationSection(self, inputString):
+        """Gets a list of characters with the same pronunciation."""
+        data = self.getCharacterWithSamePronunciationData(inputString)
+
+        if data:
             html = ''
-            for reading in sorted(charDict.keys(), reverse=True):
+            for reading, chars in data:
                 characterLinks = []
-                for char in charDict[reading]:
+                for char, readings, translations in chars:
                     characterLinks.append('<li><span class="character">' \
                         + '<a class="character" href="#lookup(%s)">%s</a>' \
                             % (util.encodeBase64(char),  char) \
-                        + '</span>%s</li>' % self._getDictionaryInfo(char,
-                            charDict[reading][char]))
+                        + '</span>%s</li>' \
+                            % self._getDictionaryInfo((readings, translations)))
                 html += '<h3>%s</h3>' % reading \
                     + '<ul>%s</ul>' % ' '.join(characterLinks)
 
@@ -945,39 +1165,66 @@ class DictionaryView:
         else:
             return '<span class="meta">%s</span>' % gettext('No entries found')
 
+    def getVocabularySearchData(self, inputString):
+        """
+        Gets the search results for the given string.
+
+        @rtype: dict
+        @return: C{'exact'} giving exact matches, C{'similar'} and C{'other'}
+            giving the first matches of similar pronunciation and matches
+            including the given string, C{'hasMoreSimilar'} and
+            C{'hasMoreOther'} telling if further matches exist
+        """
+        # exact hits
+        exactDictResult = self._dictionary.getFor(inputString,
+            orderBy=['Weight'])
+
+        # similar pronunciation
+        similarDictResult = list(islice(
+            self._dictionary.iterForSimilarReading(inputString,
+                orderBy=['Weight']), 5))
+
+        # other matches
+        # TODO optimize and include other matches in exact run, after all
+        #   translation will be all searched with LIKE '% ... %'
+        otherDictResult = list(islice(self._dictionary.iterFor(
+            '*' + inputString + '*', orderBy=['Weight']), 5))
+
+        return {'exact': exactDictResult,
+            'similar': similarDictResult[:4],
+            'hasMoreSimilar': len(similarDictResult) > 4,
+            'other': otherDictResult[:4],
+            'hasMoreOther': len(otherDictResult) > 4}
+
     def getVocabularySearchSection(self, inputString):
         """
         Gets the search results for the given string including exact maches
         and a shortened list of similar results and results including the given
         string.
         """
+        data = self.getVocabularySearchData(inputString)
+
         htmlList = []
         htmlList.append('<table class="search">')
 
         # exact hits
-        exactDictResult = self._dictionary.getFor(inputString,
-            orderBy=['Weight'])
-
-        if exactDictResult:
+        if data['exact']:
             htmlList.append('<tr><td colspan="3"><h3>%s</h3></td></tr>' \
                 % gettext('Matches'))
             # match against input string with regular expression
-            htmlList.append(self._getVocabularyTable(exactDictResult,
+            htmlList.append(self._getVocabularyTable(data['exact'],
                 useAltFunc=lambda x, y: \
                     self._matchesInput(inputString, y) \
                     and not self._matchesInput(inputString, x)))
 
 
         # similar pronunciation
-        similarDictResult = self._dictionary.getForSimilarReading(
-            inputString, orderBy=['Weight'], limit=5)
-
-        if similarDictResult:
+        if data['similar']:
             htmlList.append('<tr><td colspan="3"><h3>%s</h3></td></tr>' \
                 % gettext('Similar pronunciations'))
-            htmlList.append(self._getVocabularyTable(similarDictResult[:4]))
+            htmlList.append(self._getVocabularyTable(data['similar']))
 
-            if len(similarDictResult) > 4:
+            if data['hasMoreSimilar']:
                 htmlList.append('<tr><td colspan="3">' \
                     + '<a class="meta" href="#lookup(%s)">%s</a>' \
                         % (util.encodeBase64('similar' + ':' \
@@ -986,21 +1233,15 @@ class DictionaryView:
 
 
         # other matches
-        # TODO optimize and include other matches in exact run, after all
-        #   translation will be all searched with LIKE '% ... %'
-        otherDictResult = self._dictionary.getFor('*' + inputString + '*',
-            orderBy=['Weight'])
-
-        if otherDictResult:
+        if data['other']:
             htmlList.append('<tr><td colspan="3"><h3>%s</h3></td></tr>' \
                 % gettext('Other matches'))
-            augmentedInput = '*' + inputString + '*'
-            htmlList.append(self._getVocabularyTable(otherDictResult[:4],
+            htmlList.append(self._getVocabularyTable(data['other'],
                 useAltFunc=lambda x, y: \
                     self._matchesInput(inputString, y) \
                     and not self._matchesInput(inputString, x)))
 
-            if len(otherDictResult) > 4:
+            if data['hasMoreOther']:
                 htmlList.append('<tr><td colspan="3">' \
                     + '<a class="meta" href="#lookup(%s)">%s</a>' \
                         % (util.encodeBase64('othervocabulary' + ':' \
@@ -1008,8 +1249,8 @@ class DictionaryView:
                     + '</td></tr>')
 
         # handle 0 result cases
-        if not exactDictResult:
-            if not similarDictResult and not otherDictResult:
+        if not data['exact']:
+            if not data['similar'] and not data['other']:
                 htmlList.append('<tr><td colspan="3">'\
                     + '<span class="meta">%s</span>' \
                         % gettext('No matches found') \
@@ -1025,53 +1266,112 @@ class DictionaryView:
         return '\n'.join(htmlList)
 
     @util.attr('needsDictionary')
-    def getOtherVocabularySearchSection(self, inputString):
+    def getOtherVocabularySearchData(self, inputString, after=None):
         """
-        Gets a list of vocabulary entries containing the given inputString.
+        Gets a page of vocabulary entries containing the given inputString.
+
+        @rtype: dict
+        @return: C{'entries'} giving the entries and C{'nextKey'} the key of
+            the following page, C{None} on the last page
         """
-        htmlList = []
+        dictResult, nextKey = self._dictionary.getPageFor(
+            '*' + inputString + '*', self.VOCABULARY_PAGE_SIZE,
+            orderBy=['Weight'], after=after)
 
-        # TODO use caching
-        dictResult = self._dictionary.getFor('*' + inputString + '*',
-            orderBy=['Weight'])
+        return {'entries': dictResult, 'nextKey': nextKey}
 
-        if dictResult:
+    @util.attr('needsDictionary')
+    def getOtherVocabularySearchSection(self, inputString, after=None):
+        """
+        Gets a list of vocabulary entries containing the given inputString.
+        Given C{after} only the page following that key is returned.
+        """
+        data = self.getOtherVocabularySearchData(inputString, after=after)
+
+        htmlList = []
+        if data['entries']:
             htmlList.append('<table class="otherVocabulary">')
-            htmlList.append('<tr><td colspan="3"><h3>%s</h3></td></tr>' \
-                % gettext('Other matches'))
-            augmentedInput = '*' + inputString + '*'
-            htmlList.append(self._getVocabularyTable(dictResult,
+            if after is None:
+                htmlList.append('<tr><td colspan="3"><h3>%s</h3></td></tr>' \
+                    % gettext('Other matches'))
+            htmlList.append(self._getVocabularyTable(data['entries'],
                 useAltFunc=lambda x, y: \
                     self._matchesInput(inputString, y) \
                     and not self._matchesInput(inputString, x)))
             htmlList.append('</table>')
 
-        else:
+            if data['nextKey'] is not None:
+                htmlList.append(self._getMoreEntriesLink(
+                    'getOtherVocabularySearchSection', inputString,
+                    data['nextKey']))
+
+        elif after is None:
             htmlList.append('<span class="meta">%s</span>' \
                     % gettext('No matches found'))
 
         return '\n'.join(htmlList)
 
     @util.attr('needsDictionary')
-    def getSimilarVocabularySearchSection(self, inputString):
+    def getSimilarVocabularySearchData(self, inputString, after=None):
         """
-        Gets a list of vocabulary entries with pronunciation similar to the
+        Gets a page of vocabulary entries with pronunciation similar to the
         given string.
+
+        @rtype: dict
+        @return: C{'entries'} giving the entries and C{'nextKey'} the key of
+            the following page, C{None} on the last page
         """
-        htmlList = []
+        dictResult, nextKey = self._dictionary.getPageForSimilarReading(
+            inputString, self.VOCABULARY_PAGE_SIZE, orderBy=['Reading'],
+            after=after)
 
-        dictResult = self._dictionary.getForSimilarReading(inputString,
-            orderBy=['Reading'])
+        return {'entries': dictResult, 'nextKey': nextKey}
 
-        if dictResult:
+    @util.attr('needsDictionary')
+    def getSimilarVocabularySearchSection(self, inputString, after=None):
+        """
+        Gets a list of vocabulary entries with pronunciation similar to the
+        given string. Given C{after} only the page following that key is
+        returned.
+        """
+        data = self.getSimilarVocabularySearchData(inputString, after=after)
+
+        htmlList = []
+        if data['entries']:
             htmlList.append('<table class="similarVocabulary">')
-            htmlList.append('<tr><td colspan="3"><h3>%s</h3></td></tr>' \
-                % gettext('Similar pronunciations'))
-            htmlList.append(self._getVocabularyTable(dictResult))
+            if after is None:
+                htmlList.append('<tr><td colspan="3"><h3>%s</h3></td></tr>' \
+                    % gettext('Similar pronunciations'))
+            htmlList.append(self._getVocabularyTable(data['entries']))
             htmlList.append('</table>')
 
-        else:
+            if data['nextKey'] is not None:
+                htmlList.append(self._getMoreEntriesLink(
+                    'getSimilarVocabularySearchSection', inputString,
+                    data['nextKey']))
+
+        elif after is None:
             htmlList.append('<span class="meta">%s</span>' \
                 % gettext('No matches found'))
 
         return '\n'.join(htmlList)
+
+    # FREQUENCY
+
+    def getFrequentHeadwords(self, limit=None):
+        """
+        Gets the most frequent headwords of the current dictionary, e.g. for
+        rendering their pages in advance.
+        """
+        return self._dictionary.getFrequentHeadwords(limit=limit)
+
+    def getRandomDictionaryEntry(self, maxWeight=RANDOM_ENTRY_MAX_WEIGHT):
+        """
+        Gets a random entry of the current dictionary, e.g. for the "one word
+        a day" page. By default only common words are chosen.
+        """
+        entries = self._dictionary.getRandomEntry(maxWeight=maxWeight)
+        if not entries and maxWeight is not None:
+            # dictionary without weights
+            entries = self._dictionary.getRandomEntry()
+        return entries
@@ -0,0 +1,388 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+u"""
+Searches several dictionaries concurrently, merging their results.
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+
+import sys
+import threading
+import Queue
+import heapq
+from itertools import islice
+from operator import itemgetter
+
+from cjklib.dbconnector import DatabaseConnector
+from cjklib import exception
+
+from libeclectus.dictionary import getDictionary
+
+class FederatedEntry(tuple):
+    """
+    Entry merged from the results of several dictionaries. Iterates like the
+    entries of the single dictionaries, giving headword, alternative headword,
+    reading and the translation of the first dictionary including it. All
+    dictionaries including the entry are given in C{sources}, their
+    translations in C{translations}.
+    """
+    FIELDS = ['Headword', 'HeadwordAlternative', 'Reading', 'Translation']
+    """Fields of an entry."""
+
+    Headword = property(itemgetter(0))
+    HeadwordAlternative = property(itemgetter(1))
+    Reading = property(itemgetter(2))
+    Translation = property(itemgetter(3))
+
+    def __new__(cls, entry):
+        self = tuple.__new__(cls, entry)
+        self.sources = []
+        self.translations = {}
+        return self
+
+    def addSource(self, source, translation):
+        self.sources.append(source)
+        self.translations[source] = translation
+
+
+class _Result(object):
+    """Result of a search run by a L{_DictionaryWorker}."""
+    def __init__(self):
+        self._done = threading.Event()
+        self._value = None
+        self._excInfo = None
+
+    def set(self, value=None, excInfo=None):
+        self._value = value
+        self._excInfo = excInfo
+        self._done.set()
+
+    def get(self):
+        self._done.wait()
+        if self._excInfo:
+            raise self._excInfo[0], self._excInfo[1], self._excInfo[2]
+        return self._value
+
+
+class _DictionaryWorker(threading.Thread):
+    """
+    Thread owning a dictionary instance with a database connection of its
+    own, as connections may not be shared between threads.
+    """
+    def __init__(self, dictionaryName, configuration, options):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self.dictionaryName = dictionaryName
+        self.dictionary = None
+        self._configuration = configuration
+        self._options = options
+        self._requests = Queue.Queue()
+        self._ready = _Result()
+        self._stopped = False
+        self._stopLock = threading.Lock()
+        self.start()
+
+    def run(self):
+        db = None
+        try:
+            db = DatabaseConnector(self._configuration.copy())
+            self.dictionary = getDictionary(self.dictionaryName,
+                dbConnectInst=db, **self._options)
+        except:
+            self._ready.set(excInfo=sys.exc_info())
+            if db is not None:
+                db.connection.close()
+                db.engine.dispose()
+            return
+        self._ready.set()
+
+        while True:
+            request = self._requests.get()
+            if request is None:
+                break
+            func, result = request
+            try:
+                result.set(func())
+            except:
+                result.set(excInfo=sys.exc_info())
+
+        db.connection.close()
+        db.engine.dispose()
+
+    def waitReady(self):
+        """Waits until the dictionary is loaded, raising errors on loading."""
+        self._ready.get()
+
+    def call(self, func):
+        """
+        Runs the given function in the thread. Once stopped, requests are
+        answered with an empty result.
+        """
+        result = _Result()
+        self._stopLock.acquire()
+        try:
+            if self._stopped:
+                result.set([])
+            else:
+                self._requests.put((func, result))
+        finally:
+            self._stopLock.release()
+        return result
+
+    def submit(self, method, args, options):
+        """Runs the given search in the thread, reading all results."""
+        return self.call(lambda: list(getattr(self.dictionary, method)(*args,
+            **options)))
+
+    def stop(self):
+        self._stopLock.acquire()
+        try:
+            self._stopped = True
+            self._requests.put(None)
+        finally:
+            self._stopLock.release()
+
+
+class FederatedDictionary(object):
+    """
+    Dictionary searching further dictionaries together with a main
+    dictionary. Searches run concurrently, each further dictionary in a thread
+    with its own database connection, the main dictionary in the calling
+    thread. Results are merged into L{FederatedEntry}s by headword and
+    reading.
+
+    Each dictionary orders and limits its results as requested. Merged
+    entries are ordered by the requested columns as far as entries include
+    them, then by their position in the results of their dictionary, the main
+    dictionary coming first on ties, and cut to the limit again. Columns not
+    part of an entry, e.g. C{'Weight'}, are thus followed by the order of
+    each dictionary, and the first entries of each dictionary are shown before
+    later ones of another.
+
+    Iterators read the results of further dictionaries in chunks while
+    merging. An entry's sources are then completed as iteration proceeds.
+
+    All other methods and attributes are those of the main dictionary.
+    """
+    SEARCH_METHODS = {'getFor': 1, 'getForHeadword': 1, 'getForReading': 1,
+        'getForTranslation': 1, 'getForSimilarReading': 1,
+        'getEntitiesForHeadword': 2, 'getSubstringsForHeadword': 1,
+        'getVariantsForHeadword': 1, 'getSimilarsForHeadword': 1}
+    """
+    Methods searched in all dictionaries, with the position of C{limit},
+    followed by C{orderBy}.
+    """
+
+    ITERATOR_METHODS = {'iterFor': 1, 'iterForHeadword': 1,
+        'iterForReading': 1, 'iterForSimilarReading': 1,
+        'iterEntitiesForHeadword': 2, 'iterSubstringsForHeadword': 1,
+        'iterVariantsForHeadword': 1, 'iterSimilarsForHeadword': 1}
+    """
+    Iterators searched in all dictionaries, with the position of C{orderBy}.
+    """
+
+    CHUNK_SIZE = 50
+    """Number of entries read at once from iterators of further dictionaries."""
+
+    def __init__(self, dictionary, dictionaryNames, **options):
+        """
+        Initialises the FederatedDictionary instance. Further dictionaries not
+        available are left out.
+
+        @param dictionary: main dictionary instance
+        @type dictionaryNames: list of str
+        @param dictionaryNames: names of the further dictionaries
+        @param options: options passed on to L{getDictionary()} for further
+            dictionaries
+        """
+        self._dictionary = dictionary
+
+        configuration = {'sqlalchemy.url': dictionary.db.databaseUrl,
+            'attach': list(dictionary.db.attached.keys())}
+        workers = [_DictionaryWorker(dictionaryName, configuration, options)
+            for dictionaryName in dictionaryNames
+            if dictionaryName != dictionary.PROVIDES]
+
+        self._workers = []
+        try:
+            for worker in workers:
+                worker.waitReady()
+                if worker.dictionary is None:
+                    worker.stop()
+                else:
+                    self._workers.append(worker)
+        except:
+            for worker in workers:
+                worker.stop()
+            self._workers = []
+            raise
+
+        for method, limitIdx in self.SEARCH_METHODS.items():
+            setattr(self, method, self._getSearchMethod(method, limitIdx))
+        for method, orderByIdx in self.ITERATOR_METHODS.items():
+            setattr(self, method, self._getIteratorMethod(method, orderByIdx))
+
+    def __getattr__(self, name):
+        return getattr(self._dictionary, name)
+
+    @property
+    def dictionaryNames(self):
+        """Names of all dictionaries searched, main dictionary first."""
+        return ([self._dictionary.PROVIDES]
+            + [worker.dictionaryName for worker in self._workers])
+
+    def close(self):
+        """
+        Stops the threads of the further dictionaries, closing their
+        database connections. Only the main dictionary is searched afterwards.
+        """
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.stop()
+
+    @staticmethod
+    def _getArgument(args, options, idx, name):
+        if len(args) > idx:
+            return args[idx]
+        else:
+            return options.get(name, None)
+
+    def _getSearchMethod(self, method, limitIdx):
+        def search(*args, **options):
+            limit = self._getArgument(args, options, limitIdx, 'limit')
+            orderBy = self._getArgument(args, options, limitIdx + 1,
+                'orderBy')
+
+            pending = [(worker.dictionaryName,
+                    worker.submit(method, args, options))
+                for worker in self._workers]
+
+            results = [(self._dictionary.PROVIDES,
+                list(getattr(self._dictionary, method)(*args, **options)))]
+            for dictionaryName, result in pending:
+                try:
+                    results.append((dictionaryName, result.get()))
+                except exception.ConversionError:
+                    pass
+
+            entries = list(self._iterMerge(results, orderBy))
+            if limit is not None:
+                entries = entries[:limit]
+            return entries
+
+        search.__name__ = method
+        return search
+
+    def _getIteratorMethod(self, method, orderByIdx):
+        def search(*args, **options):
+            orderBy = self._getArgument(args, options, orderByIdx, 'orderBy')
+
+            # start further dictionaries before reading from the main one
+            results = [(worker.dictionaryName,
+                    self._iterWorker(worker, method, args, options))
+                for worker in self._workers]
+            results.insert(0, (self._dictionary.PROVIDES,
+                getattr(self._dictionary, method)(*args, **options)))
+
+            return self._iterMerge(results, orderBy)
+
+        search.__name__ = method
+        return search
+
+    def _iterWorker(self, worker, method, args, options):
+        """
+        Runs the given iterator search in the thread of a further dictionary,
+        reading the results in chunks. The next chunk is read while the
+        current one is merged. Conversion errors, e.g. for readings the
+        dictionary doesn't support, count as no result.
+        """
+        state = {}
+        def openIterator():
+            state['iterator'] = iter(getattr(worker.dictionary, method)(*args,
+                **options))
+
+        def readChunk():
+            if 'iterator' not in state:
+                return []
+            return list(islice(state['iterator'], self.CHUNK_SIZE))
+
+        opened = worker.call(openIterator)
+        pending = worker.call(readChunk)
+
+        def iterate(pending):
+            try:
+                opened.get()
+                while True:
+                    chunk = pending.get()
+                    if not chunk:
+                        break
+                    pending = worker.call(readChunk)
+                    for entry in chunk:
+                        yield entry
+            except exception.ConversionError:
+                pass
+
+        return iterate(pending)
+
+    @staticmethod
+    def _iterMerge(results, orderBy):
+        """
+        Merges the entries of several dictionaries by headword and reading.
+        The entries of each dictionary need to be ordered by C{orderBy}.
+
+        @type results: list
+        @param results: pairs of dictionary name and iterable of entries
+        @param orderBy: order of the entries
+        @return: iterator of L{FederatedEntry}
+        """
+        if orderBy is None:
+            orderBy = []
+        elif type(orderBy) != type([]):
+            orderBy = [orderBy]
+
+        # entries can only be compared by the columns they include
+        keyIndices = []
+        for column in orderBy:
+            column = getattr(column, 'name', column)
+            if column not in FederatedEntry.FIELDS:
+                break
+            keyIndices.append(FederatedEntry.FIELDS.index(column))
+
+        def pushNext(heap, iterator, rank, sourceIdx, source):
+            for entry in iterator:
+                key = tuple([entry[idx] for idx in keyIndices]) \
+                    + (rank, sourceIdx)
+                heapq.heappush(heap, (key, entry, iterator, rank, source))
+                break
+
+        heap = []
+        for sourceIdx, (source, entries) in enumerate(results):
+            pushNext(heap, iter(entries), 0, sourceIdx, source)
+
+        merged = {}
+        while heap:
+            key, entry, iterator, rank, source = heapq.heappop(heap)
+            sourceIdx = key[-1]
+
+            # the first occurrence holds the best position
+            mergeKey = (entry[0], entry[2])
+            if mergeKey not in merged:
+                mergedEntry = merged[mergeKey] = FederatedEntry(entry)
+                mergedEntry.addSource(source, entry[3])
+                yield mergedEntry
+            else:
+                merged[mergeKey].addSource(source, entry[3])
+
+            pushNext(heap, iterator, rank + 1, sourceIdx, source)
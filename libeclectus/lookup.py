@@ -0,0 +1,324 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+u"""
+Looks up lists of words from the command line.
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+
+import sys
+import codecs
+import json
+import multiprocessing
+from itertools import islice
+from optparse import OptionParser
+
+from cjklib.dbconnector import DatabaseConnector
+from cjklib import exception
+
+from libeclectus import util
+from libeclectus.dictionary import getDictionary, getDefaultDictionary
+from libeclectus.locale import getTranslationLanguage
+
+class Lookup(object):
+    """
+    Looks up queries in a dictionary, giving a line of output per result.
+    Search modes follow those of L{DictionaryView}:
+        - C{exact}: headword, reading or translation matching the query
+        - C{similar}: similar reading
+        - C{contains}: headwords including the query
+        - C{components}: characters including all characters of the query as
+          components
+    """
+    MODES = ['exact', 'similar', 'contains', 'components']
+    """Supported search modes."""
+
+    FORMATS = ['json', 'tsv']
+    """Supported output formats, JSON lines or tab separated values."""
+
+    FIELDS = ['query', 'headword', 'headwordAlternative', 'reading',
+        'translation']
+    """Fields of an output line."""
+
+    def __init__(self, dictionaryName=None, databaseUrl=None, mode='exact',
+        outputFormat='json', limit=None, **options):
+        """
+        Initialises the Lookup instance. A database connection of its own is
+        opened, read only if the database supports it.
+
+        @type dictionaryName: str
+        @param dictionaryName: dictionary name, by default the dictionary is
+            chosen by translation language
+        @type databaseUrl: str
+        @param databaseUrl: database URL
+        @type mode: str
+        @param mode: search mode, see L{MODES}
+        @type outputFormat: str
+        @param outputFormat: output format, see L{FORMATS}
+        @type limit: int
+        @param limit: maximum number of results per query
+        @param options: options passed on to L{getDictionary()}
+        @raise ValueError: if a setting is not supported or the dictionary is
+            not available
+        """
+        if mode not in self.MODES:
+            raise ValueError("Unsupported search mode '%s'" % mode)
+        if outputFormat not in self.FORMATS:
+            raise ValueError("Unsupported output format '%s'" % outputFormat)
+        self.mode = mode
+        self.outputFormat = outputFormat
+        self.limit = limit
+
+        db = DatabaseConnector(util.getDatabaseConfiguration(databaseUrl))
+        if db.engine.name == 'sqlite':
+            db.execute('PRAGMA query_only = 1')
+
+        if dictionaryName:
+            self.dictionary = getDictionary(dictionaryName, dbConnectInst=db,
+                ignoreIllegalSettings=True, **options)
+            if self.dictionary is None:
+                raise ValueError("Dictionary '%s' not available"
+                    % dictionaryName)
+        else:
+            self.dictionary = getDefaultDictionary(getTranslationLanguage(),
+                dbConnectInst=db, ignoreIllegalSettings=True, **options)
+
+    @classmethod
+    def checkSettings(cls, **options):
+        """
+        Checks the given settings of a lookup. Dictionaries are not loaded into
+        memory for this.
+
+        @param options: options of L{Lookup}
+        @rtype: str
+        @return: name of the dictionary searched
+        @raise ValueError: if a setting is not supported or the dictionary is
+            not available
+        """
+        if options.get('engine') == 'memory':
+            options = options.copy()
+            options['engine'] = 'sql'
+        return cls(**options).dictionary.PROVIDES
+
+    def search(self, query, mode=None, limit=None):
+        """
+        Searches the given query.
+
+        @type query: str
+        @param query: query
+        @type mode: str
+        @param mode: search mode, by default the one of this instance
+        @type limit: int
+        @param limit: maximum number of results, by default the one of this
+            instance
+        @rtype: list of tuple
+        @return: results, headword, alternative headword, reading and
+            translation
+        @raise ValueError: if the search mode is not supported
+        """
+        mode = mode or self.mode
+        limit = limit or self.limit
+        try:
+            if mode == 'exact':
+                return self.dictionary.getFor(query, limit=limit,
+                    orderBy=['Weight'])
+            elif mode == 'similar':
+                return self.dictionary.getForSimilarReading(query,
+                    limit=limit, orderBy=['Weight'])
+            elif mode == 'contains':
+                return self.dictionary.getForHeadword('*' + query + '*',
+                    limit=limit, orderBy=['Weight'])
+            elif mode == 'components':
+                chars = self.dictionary.charDB.getCharactersForComponents(
+                    list(query))
+                return [(char, None, None, None)
+                    for char in islice(chars, limit)]
+            else:
+                raise ValueError("Unsupported search mode '%s'" % mode)
+        except exception.ConversionError:
+            return []
+
+    def format(self, query, results):
+        """
+        Formats the results of a query, giving a line with only the query if
+        nothing was found.
+
+        @rtype: list of str
+        @return: UTF-8 encoded output lines
+        """
+        rows = [(query, ) + tuple(result[:4]) for result in results]
+        if not rows:
+            rows = [(query, None, None, None, None)]
+
+        lines = []
+        for row in rows:
+            if self.outputFormat == 'json':
+                line = json.dumps(dict(zip(self.FIELDS, row)),
+                    ensure_ascii=False)
+            else:
+                line = '\t'.join([(value or '').replace('\t', ' ')
+                    .replace('\n', ' ') for value in row])
+            if isinstance(line, unicode):
+                line = line.encode('utf8')
+            lines.append(line)
+        return lines
+
+    def lookup(self, queries):
+        """
+        Looks up the given queries.
+
+        @type queries: list of str
+        @param queries: queries
+        @rtype: list of str
+        @return: UTF-8 encoded output lines
+        """
+        lines = []
+        for query in queries:
+            lines.extend(self.format(query, self.search(query)))
+        return lines
+
+_lookup = None
+"""Lookup instance of a worker process."""
+_lookupError = None
+"""Error creating the lookup instance, raised on the first lookup."""
+
+def _initWorker(options):
+    global _lookup, _lookupError
+    # an error raised here would only make the pool restart the worker
+    try:
+        _lookup = Lookup(**options)
+    except ValueError, e:
+        _lookupError = e
+    except Exception, e:
+        # e.g. database errors, which might not survive pickling
+        _lookupError = ValueError(str(e))
+
+def _lookupChunk(queries):
+    if _lookupError:
+        raise _lookupError
+    return _lookup.lookup(queries)
+
+def _iterChunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            break
+        yield chunk
+
+def _iterQueries(files):
+    """Reads queries from the given files, one per line."""
+    for f in files:
+        for line in codecs.getreader('utf8')(f):
+            query = line.strip()
+            if query:
+                yield query
+
+def runLookup(files, output, jobs=None, chunkSize=100, **options):
+    """
+    Looks up queries read from the given files and writes the results.
+    Queries can be sharded across several worker processes, each with its own
+    database connection. Results are written in order of input.
+
+    @type files: list of file
+    @param files: input files, one query per line
+    @type output: file
+    @param output: output file
+    @type jobs: int
+    @param jobs: number of worker processes
+    @type chunkSize: int
+    @param chunkSize: number of queries handed to a worker at once
+    @param options: options of L{Lookup}
+    """
+    chunks = _iterChunks(_iterQueries(files), chunkSize)
+    if jobs and jobs > 1:
+        # connections are opened in the workers only, none is shared
+        pool = multiprocessing.Pool(jobs, _initWorker, (options, ))
+        try:
+            results = pool.imap(_lookupChunk, chunks)
+            for lines in results:
+                for line in lines:
+                    print >> output, line
+        finally:
+            pool.terminate()
+    else:
+        lookup = Lookup(**options)
+        for chunk in chunks:
+            for line in lookup.lookup(chunk):
+                print >> output, line
+
+def addDictionaryOptions(parser):
+    """
+    Adds the command line options choosing the dictionary to the given
+    parser. Values are options of L{Lookup}.
+    """
+    parser.add_option("-d", "--dictionary", action="store",
+        dest="dictionaryName", help="dictionary to search")
+    parser.add_option("-r", "--reading", action="store", dest="reading",
+        help="reading of results")
+    parser.add_option("-e", "--engine", action="store", dest="engine",
+        choices=['sql', 'memory', 'mmap'], default='sql',
+        help="dictionary engine: sql, memory, mmap [default: %default]")
+    parser.add_option("--database", action="store", dest="databaseUrl",
+        help="database URL")
+
+def main():
+    parser = OptionParser(usage="%prog [options] [FILE ...]",
+        description="Looks up queries read from the given files or standard "
+            "input, one per line. Writes a line per result as JSON or tab "
+            "separated values.")
+    addDictionaryOptions(parser)
+    parser.add_option("-m", "--mode", action="store", dest="mode",
+        choices=Lookup.MODES, default='exact',
+        help="search mode: %s [default: %%default]" % ', '.join(Lookup.MODES))
+    parser.add_option("-f", "--format", action="store", dest="outputFormat",
+        choices=Lookup.FORMATS, default='json',
+        help="output format: %s [default: %%default]"
+            % ', '.join(Lookup.FORMATS))
+    parser.add_option("-l", "--limit", action="store", type="int",
+        dest="limit", help="maximum number of results per query")
+    parser.add_option("-j", "--jobs", action="store", type="int",
+        metavar="N", dest="jobs", help="look up in N processes")
+
+    opts, args = parser.parse_args()
+    options = dict([(key, value) for key, value in vars(opts).items()
+        if value is not None])
+
+    files = []
+    try:
+        for fileName in args:
+            if fileName == '-':
+                files.append(sys.stdin)
+            else:
+                files.append(open(fileName, 'rb'))
+        if not files:
+            files.append(sys.stdin)
+
+        runLookup(files, sys.stdout, **options)
+    except IOError, e:
+        print >> sys.stderr, "Error: %s" % e
+        return False
+    except ValueError, e:
+        print >> sys.stderr, "Error: %s" % e
+        return False
+    except KeyboardInterrupt:
+        print >> sys.stderr, "Keyboard interrupt."
+        return False
+
+    return True
+
+if __name__ == '__main__':
+    if not main():
+        sys.exit(1)
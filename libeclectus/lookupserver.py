@@ -0,0 +1,247 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+u"""
+Local HTTP server answering dictionary lookups with JSON.
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+Lookups are requested as C{GET /lookup?q=QUERY&mode=MODE&limit=N}, with
+C{mode} and C{limit} being optional. The query is given UTF-8 encoded. The
+response is a JSON object giving the dictionary, query, mode and a list of
+results with headword, alternative headword, reading and translation.
+"""
+
+import sys
+import json
+import threading
+import Queue
+import urlparse
+import BaseHTTPServer
+from optparse import OptionParser
+
+from libeclectus import util
+from libeclectus.lookup import Lookup, addDictionaryOptions
+
+class LookupRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Handles lookup requests of a L{LookupServer}."""
+    server_version = 'EclectusLookup/1.0'
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        if url.path != '/lookup':
+            self._sendJSON(404, {'error': 'Not found'})
+            return
+
+        params = urlparse.parse_qs(url.query)
+        try:
+            query = params.get('q', [''])[0].decode('utf8').strip()
+        except UnicodeDecodeError:
+            self._sendJSON(400, {'error': 'Query not UTF-8 encoded'})
+            return
+        if not query:
+            self._sendJSON(400, {'error': "Parameter 'q' missing"})
+            return
+
+        mode = params.get('mode', ['exact'])[0]
+        if mode not in Lookup.MODES:
+            self._sendJSON(400, {'error': "Unsupported search mode '%s'"
+                % mode})
+            return
+
+        limit = None
+        if 'limit' in params:
+            try:
+                limit = int(params['limit'][0])
+            except ValueError:
+                limit = 0
+            if limit <= 0:
+                self._sendJSON(400, {'error': "Invalid parameter 'limit'"})
+                return
+
+        try:
+            results = self.server.search(query, mode, limit)
+        except Exception, e:
+            self.server.handle_error(self.request, self.client_address)
+            self._sendJSON(500, {'error': unicode(e)})
+            return
+
+        self._sendJSON(200, {'dictionary': self.server.dictionaryName,
+            'query': query, 'mode': mode, 'results': results})
+
+    def _sendJSON(self, code, data):
+        body = json.dumps(data, ensure_ascii=False)
+        if isinstance(body, unicode):
+            body = body.encode('utf8')
+
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format,
+                *args)
+
+
+class LookupServer(BaseHTTPServer.HTTPServer):
+    """
+    HTTP server answering lookups. Requests are handled by a fixed number of
+    worker threads, each holding a L{Lookup} instance with a database
+    connection of its own, opened on start. Results are kept in a cache
+    shared by all workers.
+    """
+    WORKERS = 4
+    """Default number of worker threads."""
+
+    QUEUE_SIZE = 64
+    """Number of requests waiting for a worker before accepting blocks."""
+
+    CACHE_SIZE = 1000
+    """Default number of lookup results kept."""
+
+    def __init__(self, address, workers=None, cacheSize=None, quiet=False,
+        **options):
+        """
+        Initialises the LookupServer instance and starts the worker threads.
+
+        @type address: tuple
+        @param address: host and port to listen on
+        @type workers: int
+        @param workers: number of worker threads
+        @type cacheSize: int
+        @param cacheSize: number of lookup results kept
+        @type quiet: bool
+        @param quiet: if C{True} requests are not logged
+        @param options: options of L{Lookup}
+        @raise ValueError: if the dictionary is not available
+        """
+        # check settings before listening
+        self.dictionaryName = Lookup.checkSettings(**options)
+
+        BaseHTTPServer.HTTPServer.__init__(self, address,
+            LookupRequestHandler)
+        self.quiet = quiet
+        self.cache = util.LRUCache(cacheSize or self.CACHE_SIZE)
+        self._options = options
+        self._local = threading.local()
+        self._requests = Queue.Queue(self.QUEUE_SIZE)
+
+        self._workers = []
+        try:
+            for _ in range(workers or self.WORKERS):
+                worker = threading.Thread(target=self._work)
+                worker.setDaemon(True)
+                worker.start()
+                self._workers.append(worker)
+        except:
+            self.server_close()
+            raise
+
+    def _getLookup(self):
+        """
+        Gets the lookup instance of the current worker thread, creating it if
+        missing, e.g. after an error.
+        """
+        lookup = getattr(self._local, 'lookup', None)
+        if lookup is None:
+            lookup = self._local.lookup = Lookup(**self._options)
+        return lookup
+
+    def _work(self):
+        try:
+            self._getLookup()
+        except Exception, e:
+            # keep serving, lookups are retried and answered with an error
+            print >> sys.stderr, "Error: %s" % e
+        while True:
+            item = self._requests.get()
+            if item is None:
+                break
+
+            request, clientAddress = item
+            try:
+                self.finish_request(request, clientAddress)
+            except:
+                self.handle_error(request, clientAddress)
+            self.close_request(request)
+
+    def process_request(self, request, clientAddress):
+        # hand over to a worker, waiting if all are busy
+        self._requests.put((request, clientAddress))
+
+    def server_close(self):
+        BaseHTTPServer.HTTPServer.server_close(self)
+        for _ in self._workers:
+            self._requests.put(None)
+        self._workers = []
+
+    def search(self, query, mode, limit):
+        """
+        Searches the given query, using cached results if available.
+
+        @rtype: list of dict
+        @return: results
+        """
+        key = (query, mode, limit)
+        results = self.cache.get(key)
+        if results is None:
+            results = [dict(zip(Lookup.FIELDS[1:], result[:4]))
+                for result in self._getLookup().search(query, mode, limit)]
+            self.cache[key] = results
+        return results
+
+
+def main():
+    parser = OptionParser(usage="%prog [options]",
+        description="Serves dictionary lookups as JSON, e.g. "
+            "http://localhost:8437/lookup?q=QUERY&mode=exact&limit=10")
+    addDictionaryOptions(parser)
+    parser.add_option("--host", action="store", dest="host",
+        default='localhost', help="host to listen on [default: %default]")
+    parser.add_option("-p", "--port", action="store", type="int",
+        dest="port", default=8437, help="port to listen on [default: %default]")
+    parser.add_option("-w", "--workers", action="store", type="int",
+        dest="workers", help="number of worker threads [default: %d]"
+            % LookupServer.WORKERS)
+    parser.add_option("--cache-size", action="store", type="int",
+        dest="cacheSize", help="number of lookup results kept [default: %d]"
+            % LookupServer.CACHE_SIZE)
+    parser.add_option("-q", "--quiet", action="store_true", dest="quiet",
+        default=False, help="don't log requests")
+
+    opts, _ = parser.parse_args()
+    options = dict([(key, value) for key, value in vars(opts).items()
+        if value is not None])
+    address = (options.pop('host'), options.pop('port'))
+
+    try:
+        server = LookupServer(address, **options)
+    except ValueError, e:
+        print >> sys.stderr, "Error: %s" % e
+        return False
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+    return True
+
+if __name__ == '__main__':
+    if not main():
+        sys.exit(1)
@@ -0,0 +1,550 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+u"""
+Dictionary engine answering searches from memory.
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+
+import re
+import bisect
+from array import array
+
+from sqlalchemy import select
+
+from cjklib.dictionary import search
+from cjklib import exception
+
+from libeclectus import util
+
+_wordRegex = re.compile(r'\w+', re.UNICODE)
+
+def _getWords(string):
+    """Gets the lower case words of the given string."""
+    return _wordRegex.findall(string.lower())
+
+def _addPosting(index, key, rowId):
+    if key not in index:
+        index[key] = array('i')
+    index[key].append(rowId)
+
+
+class _StringPool(object):
+    """
+    Column of strings packed into one UTF-8 encoded buffer with an array of
+    offsets, taking far less memory than a list of unicode objects. Values
+    are decoded when accessed.
+    """
+    def __init__(self):
+        self._offsets = array('I', [0])
+        self._chunks = []
+        self._buffer = ''
+
+    def append(self, string):
+        if string is None:
+            item = '\x00'
+        else:
+            item = '\x01' + string.encode('utf8')
+        self._chunks.append(item)
+        self._offsets.append(self._offsets[-1] + len(item))
+
+    def pack(self):
+        """Joins the appended values, to be called once all are added."""
+        self._buffer = ''.join([self._buffer] + self._chunks)
+        self._chunks = []
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('string pool index out of range')
+        packedCount = len(self) - len(self._chunks)
+        if idx < packedCount:
+            item = self._buffer[self._offsets[idx]:self._offsets[idx + 1]]
+        else:
+            item = self._chunks[idx - packedCount]
+        if item[0] == '\x00':
+            return None
+        return item[1:].decode('utf8')
+
+
+class MemoryDictionary(object):
+    """
+    Dictionary engine loading all entries of a dictionary once into columns
+    held in memory, with hash and sorted indexes on headword and reading.
+    Columns are kept as packed string pools, duplicate entries are dropped as
+    the SQL dictionary only returns distinct ones.
+    Searches give the same results as the underlying SQL dictionary, whose
+    search strategies are used for matching entries. Indexes only narrow down
+    the entries to match:
+        - headwords by exact headword, prefix, or characters included
+        - readings by plain reading (lower case, without tones), where the
+          dictionary provides them
+        - translations by the words included
+
+    All methods not provided here are passed on to the underlying dictionary.
+    """
+    DEFAULT_SORT_WEIGHT = 100
+    """Sort weight of entries without weight."""
+
+    def __init__(self, dictionary):
+        """
+        Initialises the MemoryDictionary instance and loads all entries.
+
+        @param dictionary: SQL dictionary instance providing the entries
+        """
+        self._dictionary = dictionary
+
+        self._columnNames = list(dictionary.COLUMNS)
+        if 'Headword' in self._columnNames:
+            self._headwordColumns = ['Headword']
+        else:
+            self._headwordColumns = []
+            if dictionary.headword != 't':
+                self._headwordColumns.append('HeadwordSimplified')
+            if dictionary.headword != 's':
+                self._headwordColumns.append('HeadwordTraditional')
+
+        self._load()
+
+    def __getattr__(self, name):
+        return getattr(self._dictionary, name)
+
+    def _load(self):
+        """Loads all entries and builds the indexes."""
+        dictionary = self._dictionary
+        table = dictionary.db.tables[dictionary.DICTIONARY_TABLE]
+
+        indexedHeadwordColumns = [self._columnNames.index(column)
+            for column in self._columnNames if column.startswith('Headword')]
+        translationIdx = self._columnNames.index('Translation')
+
+        columns = [table.c[column] for column in self._columnNames]
+        if 'SortWeight' in table.columns:
+            columns.append(table.c.SortWeight)
+        elif 'Weight' in table.columns:
+            columns.append(table.c.Weight)
+        hasWeight = len(columns) > len(self._columnNames)
+        hasPlainReading = 'ReadingPlain' in table.columns
+        if hasPlainReading:
+            columns.append(table.c.ReadingPlain)
+        query = select(columns)
+        if 'EntryId' in table.columns:
+            query = query.order_by(table.c.EntryId)
+
+        self._columns = [_StringPool() for _ in self._columnNames]
+        self._sortWeights = array('i')
+        self._headwordIndex = {}
+        self._characterIndex = {}
+        self._plainReadingIndex = {}
+        self._wordIndex = {}
+
+        # entries by hash of their values, to find duplicates
+        rowHashes = {}
+
+        rowId = 0
+        for row in dictionary.db.iterRows(query):
+            values = tuple(row[:len(self._columnNames)])
+            sameHash = rowHashes.setdefault(hash(values), [])
+            if [1 for otherRowId in sameHash
+                if self._getRow(otherRowId) == values]:
+                continue
+            sameHash.append(rowId)
+
+            for idx, columnValues in enumerate(self._columns):
+                columnValues.append(row[idx])
+
+            if hasWeight:
+                weight = row[len(self._columnNames)]
+                if weight is None:
+                    weight = self.DEFAULT_SORT_WEIGHT
+                self._sortWeights.append(weight)
+            if hasPlainReading and row[-1] is not None:
+                _addPosting(self._plainReadingIndex, row[-1], rowId)
+
+            headwords = set([row[idx] for idx in indexedHeadwordColumns])
+            characters = set()
+            for headword in headwords:
+                _addPosting(self._headwordIndex, headword, rowId)
+                characters.update(headword)
+            for char in characters:
+                _addPosting(self._characterIndex, char, rowId)
+
+            for word in set(_getWords(row[translationIdx] or '')):
+                _addPosting(self._wordIndex, word, rowId)
+
+            rowId += 1
+
+        for columnValues in self._columns:
+            columnValues.pack()
+
+        self._count = rowId
+        self._hasWeight = hasWeight
+        self._hasPlainReading = hasPlainReading
+        self._sortedHeadwords = sorted(self._headwordIndex.keys())
+        self._sortedPlainReadings = sorted(self._plainReadingIndex.keys())
+
+    def _getRow(self, rowId):
+        return tuple([values[rowId] for values in self._columns])
+
+    # indexes
+
+    @staticmethod
+    def _getPrefixPostings(sortedKeys, index, prefix):
+        """Gets the postings of all keys starting with the given prefix."""
+        rowIds = set()
+        keyIdx = bisect.bisect_left(sortedKeys, prefix)
+        while (keyIdx < len(sortedKeys)
+            and sortedKeys[keyIdx].startswith(prefix)):
+            rowIds.update(index[sortedKeys[keyIdx]])
+            keyIdx += 1
+        return rowIds
+
+    def _getCharacterCandidates(self, characters):
+        """
+        Gets entries whose headword includes all the given characters.
+
+        @rtype: set
+        @return: entry ids, C{None} if no characters are given
+        """
+        candidates = None
+        for char in set(characters):
+            rowIds = set(self._characterIndex.get(char, []))
+            if candidates is None:
+                candidates = rowIds
+            else:
+                candidates &= rowIds
+        return candidates
+
+    def _getHeadwordCandidates(self, strategy, headwordStr):
+        """
+        Gets the entries possibly matched by the given headword search.
+
+        @rtype: set
+        @return: entry ids, C{None} if all entries need to be checked
+        """
+        if getattr(strategy, '_caseInsensitive', False):
+            return None
+
+        if getattr(strategy, '_fullwidthCharacters', False):
+            headwordStr = search._mapToFullwidth(headwordStr)
+
+        if not hasattr(strategy, '_parseWildcardString'):
+            return set(self._headwordIndex.get(headwordStr, []))
+
+        entities = strategy._parseWildcardString(headwordStr)
+        literals = [entity for entity in entities
+            if isinstance(entity, basestring)]
+        if len(literals) == len(entities):
+            return set(self._headwordIndex.get(''.join(literals), []))
+
+        prefix = []
+        for entity in entities:
+            if not isinstance(entity, basestring):
+                break
+            prefix.append(entity)
+        if prefix:
+            return self._getPrefixPostings(self._sortedHeadwords,
+                self._headwordIndex, ''.join(prefix))
+
+        return self._getCharacterCandidates(''.join(literals))
+
+    def _getReadingCandidates(self, strategy, readingStr, **options):
+        """
+        Gets the entries possibly matched by the given reading search.
+
+        @rtype: set
+        @return: entry ids, C{None} if all entries need to be checked
+        """
+        if not self._hasPlainReading or not hasattr(strategy,
+            '_getPlainReadings'):
+            return None
+
+        plainReadings = strategy._getPlainReadings(readingStr, **options)
+        if not plainReadings:
+            return None
+
+        candidates = set()
+        for plainReading, isPrefix in plainReadings:
+            if isPrefix:
+                candidates.update(self._getPrefixPostings(
+                    self._sortedPlainReadings, self._plainReadingIndex,
+                    plainReading))
+            else:
+                candidates.update(self._plainReadingIndex.get(plainReading,
+                    []))
+        return candidates
+
+    def _getTranslationCandidates(self, translationStr):
+        """
+        Gets the entries whose translation includes all complete words of the
+        given search string.
+
+        @rtype: set
+        @return: entry ids, C{None} if all entries need to be checked
+        """
+        words = []
+        for part in translationStr.split():
+            if not re.search(r'[*?%_\\]', part):
+                words.extend(_getWords(part))
+
+        candidates = None
+        for word in set(words):
+            rowIds = set(self._wordIndex.get(word, []))
+            if candidates is None:
+                candidates = rowIds
+            else:
+                candidates &= rowIds
+        return candidates
+
+    # searches
+
+    def _getHeadwordSearch(self, headwordStr, **options):
+        strategy = self._dictionary.headwordSearchStrategy
+        matchFunc = strategy.getMatchFunction(headwordStr)
+
+        return (self._getHeadwordCandidates(strategy, headwordStr),
+            [([column], matchFunc) for column in self._headwordColumns])
+
+    def _getMixedSearch(self, strategy, readingStr, **options):
+        """
+        Gets the search for a reading mixed with headword characters. Only
+        entries including the characters need to be checked.
+        """
+        characters = [char for char in readingStr
+            if util.getCJKScriptClass(char) == 'Han']
+        if not strategy or not characters:
+            return set(), []
+
+        matchFunc = strategy.getMatchFunction(readingStr, **options)
+        return (self._getCharacterCandidates(characters),
+            [([column, 'Reading'], matchFunc)
+                for column in self._headwordColumns])
+
+    def _getReadingSearch(self, readingStr, **options):
+        strategy = self._dictionary.readingSearchStrategy
+        matchFunc = strategy.getMatchFunction(readingStr, **options)
+        searches = [(self._getReadingCandidates(strategy, readingStr,
+            **options), [(['Reading'], matchFunc)])]
+
+        searches.append(self._getMixedSearch(
+            getattr(self._dictionary, 'mixedReadingSearchStrategy', None),
+            readingStr, **options))
+
+        return self._unionSearches(searches)
+
+    def _getTranslationSearch(self, translationStr, **options):
+        strategy = self._dictionary.translationSearchStrategy
+        matchFunc = strategy.getMatchFunction(translationStr)
+
+        return (self._getTranslationCandidates(translationStr),
+            [(['Translation'], matchFunc)])
+
+    def _getSimilarReadingSearch(self, readingStr, **options):
+        strategy = self._dictionary.readingSimilarSearchStrategy
+        matchFunc = strategy.getMatchFunction(readingStr, **options)
+        searches = [(self._getReadingCandidates(strategy, readingStr,
+            **options), [(['Reading'], matchFunc)])]
+
+        searches.append(self._getMixedSearch(
+            self._dictionary.mixedSimilarReadingSearchStrategy, readingStr,
+            **options))
+
+        return self._unionSearches(searches)
+
+    def _getValueListSearch(self, strategy, searchArgs, filterColumns,
+        **options):
+        """
+        Gets the search for a strategy matching headwords against a list of
+        values.
+        """
+        matchFunc = strategy.getMatchFunction(*searchArgs, **options)
+        filters = [([column] + filterColumns, matchFunc)
+            for column in self._headwordColumns]
+
+        if not hasattr(strategy, 'getWhereClauseValues'):
+            return None, filters
+
+        headwords = strategy.getWhereClauseValues(*searchArgs, **options)[0]
+        candidates = set()
+        for headword in headwords:
+            candidates.update(self._headwordIndex.get(headword, []))
+        return candidates, filters
+
+    @staticmethod
+    def _unionSearches(searches):
+        """Combines the candidates and filters of the given searches."""
+        candidates = set()
+        filters = []
+        for searchCandidates, searchFilters in searches:
+            if candidates is not None:
+                if searchCandidates is None:
+                    candidates = None
+                else:
+                    candidates |= searchCandidates
+            filters.extend(searchFilters)
+        return candidates, filters
+
+    def _getSortKeys(self, orderBy):
+        """Gets the value lists giving the order of entries."""
+        if orderBy is None:
+            return []
+        elif type(orderBy) != type([]):
+            orderBy = [orderBy]
+
+        sortKeys = []
+        for column in orderBy:
+            if not isinstance(column, basestring):
+                column = getattr(column, 'name', None)
+            if column in ('Weight', 'SortWeight'):
+                if self._hasWeight and self._dictionary._dictionaryPrefer:
+                    sortKeys.append(self._sortWeights)
+            elif column in self._columnNames:
+                sortKeys.append(self._columns[self._columnNames.index(column)])
+        return sortKeys
+
+    def _search(self, candidates, filters, limit, orderBy):
+        """
+        Matches the candidate entries against the given filters and formats
+        the matching entries.
+
+        @param candidates: entry ids, C{None} to check all entries
+        @type filters: list
+        @param filters: list of columns and match functions, an entry matching
+            any of those is returned
+        @rtype: list
+        @return: entries
+        """
+        if candidates is None:
+            candidates = xrange(self._count)
+        else:
+            candidates = sorted(candidates)
+
+        functionList = [([self._columns[self._columnNames.index(column)]
+                for column in columns], function)
+            for columns, function in filters]
+
+        rowIds = []
+        for rowId in candidates:
+            for values, function in functionList:
+                if function(*[columnValues[rowId] for columnValues in values]):
+                    rowIds.append(rowId)
+                    break
+
+        sortKeys = self._getSortKeys(orderBy)
+        if sortKeys:
+            rowIds.sort(key=lambda rowId: [values[rowId] for values in sortKeys])
+        if limit is not None:
+            rowIds = rowIds[:limit]
+
+        rows = [self._getRow(rowId) for rowId in rowIds]
+        return list(self._dictionary._iterFormat(rows))
+
+    def getFor(self, searchStr, limit=None, orderBy=None, **options):
+        options.update(self._dictionary._getReadingOptions(searchStr))
+
+        searches = []
+        for searchFunc in (self._getHeadwordSearch, self._getReadingSearch,
+            self._getTranslationSearch):
+            try:
+                searches.append(searchFunc(searchStr, **options))
+            except exception.ConversionError:
+                pass
+        candidates, filters = self._unionSearches(searches)
+
+        return self._search(candidates, filters, limit, orderBy)
+
+    def getForHeadword(self, headwordStr, limit=None, orderBy=None,
+        **options):
+        candidates, filters = self._getHeadwordSearch(headwordStr)
+
+        return self._search(candidates, filters, limit, orderBy)
+
+    def getForReading(self, readingStr, limit=None, orderBy=None, **options):
+        options.update(self._dictionary._getReadingOptions(readingStr))
+        candidates, filters = self._getReadingSearch(readingStr, **options)
+
+        return self._search(candidates, filters, limit, orderBy)
+
+    def getForTranslation(self, translationStr, limit=None, orderBy=None,
+        **options):
+        candidates, filters = self._getTranslationSearch(translationStr)
+
+        return self._search(candidates, filters, limit, orderBy)
+
+    def getForSimilarReading(self, readingStr, limit=None, orderBy=None,
+        **options):
+        if self._dictionary.readingSimilarSearchStrategy is None:
+            return []
+
+        options.update(self._dictionary._getReadingOptions(readingStr))
+        candidates, filters = self._getSimilarReadingSearch(readingStr,
+            **options)
+
+        return self._search(candidates, filters, limit, orderBy)
+
+    def getEntitiesForHeadword(self, headwordStr, readingStr=None, limit=None,
+        orderBy=None, **options):
+        candidates, filters = self._getValueListSearch(
+            self._dictionary.headwordEntitiesSearchStrategy,
+            (headwordStr, readingStr), ['Reading'], **options)
+
+        return self._search(candidates, filters, limit, orderBy)
+
+    def getSubstringsForHeadword(self, headwordStr, limit=None, orderBy=None):
+        candidates, filters = self._getValueListSearch(
+            self._dictionary.headwordSubstringSearchStrategy, (headwordStr, ),
+            [])
+
+        return self._search(candidates, filters, limit, orderBy)
+
+    def getForHeadwords(self, headwords, limit=None, orderBy=None):
+        candidates, filters = self._getValueListSearch(
+            self._dictionary.headwordListSearchStrategy, (headwords, ), [])
+
+        return self._search(candidates, filters, limit, orderBy)
+
+    def getHeadwords(self):
+        headwords = set()
+        for column in self._headwordColumns:
+            headwords.update(self._columns[self._columnNames.index(column)])
+        return headwords
+
+    def iterFor(self, searchStr, **options):
+        return iter(self.getFor(searchStr, **options))
+
+    def iterForHeadword(self, headwordStr, **options):
+        return iter(self.getForHeadword(headwordStr, **options))
+
+    def iterForReading(self, readingStr, **options):
+        return iter(self.getForReading(readingStr, **options))
+
+    def iterForSimilarReading(self, readingStr, **options):
+        return iter(self.getForSimilarReading(readingStr, **options))
+
+    def iterEntitiesForHeadword(self, headwordStr, readingStr=None,
+        **options):
+        return iter(self.getEntitiesForHeadword(headwordStr, readingStr,
+            **options))
+
+    def iterSubstringsForHeadword(self, headwordStr, orderBy=None):
+        return iter(self.getSubstringsForHeadword(headwordStr,
+            orderBy=orderBy))
+
+    def iterForHeadwords(self, headwords, orderBy=None):
+        return iter(self.getForHeadwords(headwords, orderBy=orderBy))
@@ -18,10 +18,13 @@ along with this program; if not, write to the Free Software
 Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """
 
+import re
 import base64
 import os.path
+import threading
 
 from cjklib.util import getSearchPaths
+from cjklib import dbconnector
 
 # file paths
 
@@ -94,6 +97,64 @@ def encodeBase64(string):
 def decodeBase64(string):
     return base64.b64decode(string).decode('utf8')
 
+def encodePageKey(key):
+    """
+    Encodes a key of a result page for use in links, keeping the type of the
+    key's values.
+
+    @type key: tuple
+    @param key: key as returned by a paged dictionary search
+    @rtype: str
+    @return: base64 encoded key
+    """
+    parts = []
+    for value in key:
+        if value is None:
+            parts.append(u'n')
+        elif isinstance(value, (int, long)):
+            parts.append(u'i' + unicode(value))
+        else:
+            parts.append(u's' + value)
+    return encodeBase64(u'\x1f'.join(parts))
+
+def decodePageKey(string):
+    """
+    Decodes a key of a result page encoded with L{encodePageKey()}.
+
+    @type string: str
+    @param string: base64 encoded key
+    @rtype: tuple
+    @return: key
+    """
+    key = []
+    for part in decodeBase64(string).split(u'\x1f'):
+        if part == u'n':
+            key.append(None)
+        elif part.startswith(u'i'):
+            key.append(int(part[1:]))
+        else:
+            key.append(part[1:])
+    return tuple(key)
+
+# plain readings
+
+_toneNumberRegex = re.compile(r'^([^\d\s]+)[1-5]$')
+
+def getPlainReading(reading):
+    """
+    Gets the given reading in lower case with tones removed from each entity.
+    This is the form stored for toneless lookup by the dictionary builders.
+    Only readings giving tones as numbers are supported, e.g. Pinyin as found
+    in CEDICT.
+
+    @type reading: str
+    @param reading: reading with entities separated by spaces
+    @rtype: str
+    @return: plain reading
+    """
+    return ' '.join([_toneNumberRegex.sub(r'\1', entity)
+        for entity in reading.lower().split(' ')])
+
 # font availablitiy
 
 _hasQt = None
@@ -207,6 +268,14 @@ def getDatabaseConfiguration(databaseUrl=None):
         configuration['attach'] = getAttachableDatabases()
     return configuration
 
+def resetDatabaseConnector():
+    """
+    Drops the shared database connection, so that the next call to
+    C{getDBConnector()} connects anew, e.g. after the database file was
+    replaced.
+    """
+    dbconnector._dbconnectInst = None
+
 def getDatabaseUrl():
     try:
         from pkg_resources import Requirement, resource_filename
@@ -254,3 +323,86 @@ def cachedproperty(fget):
         try: del fget_wrapper._cached
         except AttributeError: pass
     return property(fget_wrapper, fdel=fdel, doc=fget.__doc__)
+
+# caching
+
+class LRUCache(object):
+    """
+    Mapping keeping only the most recently used items up to a given number.
+    Access is synchronised, so that the cache can be shared between threads.
+    """
+    def __init__(self, size):
+        """
+        Initialises the LRUCache instance.
+
+        @type size: int
+        @param size: maximum number of items kept
+        """
+        self.size = size
+        self._items = {}
+        # circular doubly linked list of [previous, next, key, value], the
+        #   root's next link being the least recently used
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def _unlink(self, link):
+        previousLink, nextLink, _, _ = link
+        previousLink[1] = nextLink
+        nextLink[0] = previousLink
+
+    def _append(self, link):
+        lastLink = self._root[0]
+        link[0] = lastLink
+        link[1] = self._root
+        lastLink[1] = self._root[0] = link
+
+    def get(self, key, default=None):
+        """
+        Gets the value for the given key, marking it as most recently used.
+
+        @param key: key
+        @param default: value returned if the key is not cached
+        @return: cached value or default
+        """
+        self._lock.acquire()
+        try:
+            link = self._items.get(key)
+            if link is None:
+                return default
+            self._unlink(link)
+            self._append(link)
+            return link[3]
+        finally:
+            self._lock.release()
+
+    def __setitem__(self, key, value):
+        self._lock.acquire()
+        try:
+            if key in self._items:
+                self._unlink(self._items[key])
+            link = [None, None, key, value]
+            self._append(link)
+            self._items[key] = link
+
+            while len(self._items) > self.size:
+                oldestLink = self._root[1]
+                self._unlink(oldestLink)
+                del self._items[oldestLink[2]]
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        """Removes all items."""
+        self._lock.acquire()
+        try:
+            self._items.clear()
+            self._root[:] = [self._root, self._root, None, None]
+        finally:
+            self._lock.release()